@@ -73,6 +73,19 @@ def create_app(config_class=DevelopmentConfig):
         get_hydrology_data_command,
         get_hydrology_data_latest_command,
         get_hydrology_data_gaps_command,
+        check_hydrology_transform_command,
+        convert_hydrology_archive_command,
+        benchmark_datetime_parsing_command,
+        seed_ingest_ledger_command,
+        resume_hydrology_readings_command,
+        set_readings_compression_command,
+        benchmark_readings_compression_command,
+        refresh_readings_rollups_command,
+        migrate_compact_readings_command,
+        benchmark_compact_readings_command,
+        benchmark_station_registry_command,
+        benchmark_ingest_command,
+        generate_synthetic_day_command,
         init_db_command
     )
     app.cli.add_command(load_hyd_station_data_command)
@@ -83,6 +96,19 @@ def create_app(config_class=DevelopmentConfig):
     app.cli.add_command(get_hydrology_data_command)
     app.cli.add_command(get_hydrology_data_latest_command)
     app.cli.add_command(get_hydrology_data_gaps_command)
+    app.cli.add_command(check_hydrology_transform_command)
+    app.cli.add_command(convert_hydrology_archive_command)
+    app.cli.add_command(benchmark_datetime_parsing_command)
+    app.cli.add_command(seed_ingest_ledger_command)
+    app.cli.add_command(resume_hydrology_readings_command)
+    app.cli.add_command(set_readings_compression_command)
+    app.cli.add_command(benchmark_readings_compression_command)
+    app.cli.add_command(refresh_readings_rollups_command)
+    app.cli.add_command(migrate_compact_readings_command)
+    app.cli.add_command(benchmark_compact_readings_command)
+    app.cli.add_command(benchmark_station_registry_command)
+    app.cli.add_command(benchmark_ingest_command)
+    app.cli.add_command(generate_synthetic_day_command)
     app.cli.add_command(init_db_command)
 
     #logger.info('CLIs registered')
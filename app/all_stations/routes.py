@@ -1,9 +1,16 @@
 #app\all_stations\routes.py
-from flask import render_template
+from flask import render_template, jsonify
 from . import bp
 from app.extensions import db
+from .services import get_station_registry
 
 @bp.route('/')
 def index():
     all_stations = []  #Hydstations.query.all()
-    return render_template('all_stations/index.html', stations=all_stations)
\ No newline at end of file
+    return render_template('all_stations/index.html', stations=all_stations)
+
+@bp.route('/api/stations')
+def api_stations():
+    """Every station in the shared registry (notation, label, coordinates, river, catchment)"""
+    snapshot = get_station_registry().snapshot()
+    return jsonify({'version': snapshot.version, 'stations': snapshot.to_records()})
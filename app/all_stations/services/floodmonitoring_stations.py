@@ -1,5 +1,5 @@
 # services/floodmonitoring_stations.py
-import requests
+from ...utils import ea_get, floodmonitoring_root_url as ea_root_url
 
 from sqlalchemy import text
 import time
@@ -12,11 +12,10 @@ from ..models import (FldStationMeta, FldStationJson, FldStation, FldStationMeas
 import logging
 logger = logging.getLogger('floodWatch3')
 
-ea_root_url = 'http://environment.data.gov.uk/flood-monitoring'
 
 def load_fld_station_data_from_ea(truncate_all=True):
     url = f'{ea_root_url}/id/stations?_limit=20000'
-    response = requests.get(url)
+    response = ea_get(url)
     data = response.json()
     #print (data['meta'])
     logger.info(f'Fetched {url}')
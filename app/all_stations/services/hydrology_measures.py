@@ -1,5 +1,5 @@
 # services/hydrology_measures.py
-import requests
+from ...utils import ea_get, hydrology_root_url as ea_root_url
 
 from sqlalchemy import text
 import time
@@ -11,11 +11,10 @@ from ..models import( HydMeasureMeta, HydMeasureJson, HydMeasure)
 import logging
 logger = logging.getLogger('floodWatch3')
 
-ea_root_url = 'http://environment.data.gov.uk/hydrology'          # source data for extended history
 
 def load_hyd_measure_data_from_ea(truncate_all=True):
     url = f'{ea_root_url}/id/measures?_limit=50000'
-    response = requests.get(url)
+    response = ea_get(url)
     data = response.json()
     #print (data['meta'])
     logger.info(f'Fetched {url}')
@@ -1,5 +1,5 @@
 # services/hydrology_stations.py
-import requests
+from ...utils import ea_get, hydrology_root_url as ea_root_url
 
 from sqlalchemy import text
 import time
@@ -8,6 +8,7 @@ from ...utils import get_geoms
 from ...utils import parse_date
 
 from app import db
+from .station_registry import get_station_registry
 from ..models import( HydStationMeta, HydStationJson,
                       HydStation, HydStationType, HydStationObservedProp,
                       HydStationStatus, HydStationMeasure, HydStationColocated
@@ -15,11 +16,10 @@ from ..models import( HydStationMeta, HydStationJson,
 import logging
 logger = logging.getLogger('floodWatch3')
 
-ea_root_url = 'http://environment.data.gov.uk/hydrology'          # source data for extended history
 
 def load_hyd_station_data_from_ea(truncate_all=True):
     url = f'{ea_root_url}/id/stations?_limit=20000'
-    response = requests.get(url)
+    response = ea_get(url)
     data = response.json()
     #print (data['meta'])
     logger.info(f'Fetched {url}')
@@ -43,6 +43,9 @@ def load_hyd_station_data_from_ea(truncate_all=True):
         logger.info(f'Loaded items: {station_count} stations, {station_measure_count} measures')
         logger.info(f'Elapsed= {int(time.time() - start_time)} seconds')
 
+    # New version of the in-memory station registry for everything already running in this process
+    get_station_registry().refresh()
+
 
 def load_hyd_stations_from_json(station_meta_id:int, items) -> int:
     count_items = 0
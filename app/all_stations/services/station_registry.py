@@ -0,0 +1,252 @@
+# services/station_registry.py
+# In-memory registry of the hydrology stations (notation, label, coordinates, river, catchment) held as
+# array columns, shared by readings ingest, the graph (GNN) code and the web API.
+# Readers get an immutable, versioned snapshot; a refresh builds a new snapshot and swaps it in.
+
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+from sqlalchemy import text
+
+from app import db
+from ..models import HydStation
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+TEXT_FIELDS = ['label', 'river_name', 'catchment_name']
+FLOAT_FIELDS = ['lat', 'long', 'easting', 'northing']
+
+
+class StationSnapshot:
+    """
+    One version of the station table: row i of every column is the station notations[i].
+    Never modified once built - hold on to it for a consistent view across many lookups.
+    """
+    def __init__(self, version: int, notations: np.ndarray, columns: dict[str, np.ndarray], loaded_at: float):
+        self.version = version
+        self.notations = notations
+        self.columns = columns
+        self.loaded_at = loaded_at
+        self._index = {notation: i for i, notation in enumerate(notations)}
+        self._labels = None
+
+    def __len__(self) -> int:
+        return len(self.notations)
+
+    def __contains__(self, notation: str) -> bool:
+        return notation in self._index
+
+    def index_of(self, notation: str) -> int|None:
+        return self._index.get(notation)
+
+    def label(self, notation: str) -> str|None:
+        i = self._index.get(notation)
+        return self.columns['label'][i] if i is not None else None
+
+    def lookup(self, notation: str) -> dict|None:
+        """Every registry field of one station"""
+        i = self._index.get(notation)
+        if i is None:
+            return None
+        return {'notation': notation, **{name: _scalar(column[i]) for name, column in self.columns.items()}}
+
+    def labels(self) -> dict[str, str]:
+        """notation -> label (built once per snapshot - the mapping the readings transform takes)"""
+        if self._labels is None:
+            self._labels = {notation: label for notation, label in zip(self.notations, self.columns['label'])
+                            if label is not None}
+        return self._labels
+
+    def known(self, notations) -> np.ndarray:
+        """Boolean mask of the notations in the snapshot - filter with it before indices() if some may be unknown"""
+        return np.fromiter((n in self._index for n in notations), dtype=bool, count=len(notations))
+
+    def indices(self, notations) -> np.ndarray:
+        """
+        Row of each notation - for vectorised column lookups.
+        Raises KeyError if any notation is unknown (there is no row to give it).
+        """
+        try:
+            return np.fromiter((self._index[n] for n in notations), dtype=np.int64, count=len(notations))
+        except KeyError as e:
+            raise KeyError(f'Station registry: unknown notation {e.args[0]!r} (version {self.version})') from None
+
+    def coords(self, crs: str = 'wgs84') -> np.ndarray:
+        """(n, 2) array of (lat, long), or of (easting, northing) for crs='bng' - NaN where unknown"""
+        if crs == 'bng':
+            return np.column_stack([self.columns['easting'], self.columns['northing']])
+        return np.column_stack([self.columns['lat'], self.columns['long']])
+
+    def to_records(self) -> list[dict]:
+        return [self.lookup(notation) for notation in self.notations]
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the snapshot, including the python strings and the notation index"""
+        total = sys.getsizeof(self._index) + self.notations.nbytes
+        total += sum(sys.getsizeof(n) for n in self.notations)
+        for column in self.columns.values():
+            total += column.nbytes
+            if column.dtype == object:
+                total += sum(sys.getsizeof(v) for v in column if v is not None)
+        return total
+
+
+def _scalar(value):
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+class StationRegistry:
+    """
+    Thread-safe holder of the current StationSnapshot.
+    Reads never lock - they take the current snapshot; refresh() (after a station reload) builds the next version
+    and swaps it in. If a refresh fails the previous snapshot stays; if the first load fails, the next access retries.
+    Changes made by another process are picked up by refresh_if_changed() (checked at most every check_interval s).
+    """
+    def __init__(self, check_interval: float = 300.0):
+        self._lock = threading.Lock()
+        self._snapshot = StationSnapshot(0, np.array([], dtype=object), _empty_columns(), 0.0)
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self.check_interval = check_interval
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def snapshot(self) -> StationSnapshot:
+        """The current snapshot (loaded on first use - needs an app context then)"""
+        snapshot = self._snapshot
+        if snapshot.version == 0:
+            self.refresh(only_if_unloaded=True)
+            snapshot = self._snapshot
+        return snapshot
+
+    def _db_fingerprint(self) -> tuple:
+        """
+        Station count and an md5 of the registry fields of every station - so an in-place update of a label,
+        river or coordinates changes it, as well as added or removed stations (hyd_station has no updated column)
+        """
+        fields = ', '.join(['notation', *TEXT_FIELDS, *FLOAT_FIELDS])
+        sql = text(f"""
+            SELECT count(*) AS stations,
+                   md5(coalesce(string_agg(ROW({fields})::text, ',' ORDER BY notation, id), '')) AS fields_md5
+              FROM {HydStation.__table__.schema}.{HydStation.__tablename__}
+             WHERE notation IS NOT NULL
+        """)
+        return db.session.execute(sql).one()
+
+    def refresh(self, only_if_unloaded: bool = False, worker_id: int = 0) -> int:
+        """
+        Reload the stations into a new snapshot. Needs an app context.
+        :return: the version now current
+        """
+        with self._lock:
+            if only_if_unloaded and self._snapshot.version > 0:
+                return self._snapshot.version
+            t0 = time.perf_counter()
+            try:
+                fingerprint = self._db_fingerprint()
+                rows = db.session.query(HydStation.notation,
+                                        *(getattr(HydStation, name) for name in TEXT_FIELDS + FLOAT_FIELDS))\
+                                 .filter(HydStation.notation.isnot(None)).order_by(HydStation.notation).all()
+            except Exception as e:
+                db.session.rollback()
+                logger.exception(f'(T{worker_id}):Station registry: load failed, keeping version '
+                                 f'{self._snapshot.version} ({len(self._snapshot)} stations): {e}')
+                return self._snapshot.version
+
+            notations = np.array([row[0] for row in rows], dtype=object)
+            columns = {}
+            for i, name in enumerate(TEXT_FIELDS, start=1):
+                columns[name] = np.array([row[i] for row in rows], dtype=object)
+            for i, name in enumerate(FLOAT_FIELDS, start=1 + len(TEXT_FIELDS)):
+                columns[name] = np.array([np.nan if row[i] is None else row[i] for row in rows], dtype=np.float64)
+            self._snapshot = StationSnapshot(self._snapshot.version + 1, notations, columns, time.time())
+            self._fingerprint = tuple(fingerprint)
+            self._checked_at = time.monotonic()
+            logger.info(f'(T{worker_id}):Station registry: version {self._snapshot.version} - '
+                        f'{len(notations)} stations in {time.perf_counter() - t0:.2f}s')
+            return self._snapshot.version
+
+    def refresh_if_changed(self) -> int:
+        """Refresh if the station table has changed since the last load (at most once every check_interval s)"""
+        if time.monotonic() - self._checked_at < self.check_interval and self._snapshot.version > 0:
+            return self._snapshot.version
+        try:
+            fingerprint = tuple(self._db_fingerprint())
+        except Exception as e:
+            logger.warning(f'Station registry: change check failed: {e}')
+            return self._snapshot.version
+        self._checked_at = time.monotonic()
+        if fingerprint != self._fingerprint:
+            return self.refresh()
+        return self._snapshot.version
+
+    def labels(self) -> dict[str, str]:
+        return self.snapshot().labels()
+
+    def label(self, notation: str) -> str|None:
+        return self.snapshot().label(notation)
+
+    def lookup(self, notation: str) -> dict|None:
+        return self.snapshot().lookup(notation)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {'version': snapshot.version, 'stations': len(snapshot), 'memory_kb': round(snapshot.memory_bytes() / 1024, 1)}
+
+
+def _empty_columns() -> dict[str, np.ndarray]:
+    return {**{name: np.array([], dtype=object) for name in TEXT_FIELDS},
+            **{name: np.array([], dtype=np.float64) for name in FLOAT_FIELDS}}
+
+
+_station_registry = StationRegistry()
+
+def get_station_registry() -> StationRegistry:
+    """The process-wide station registry"""
+    return _station_registry
+
+
+def benchmark_station_registry(lookups: int = 100000) -> dict:
+    """
+    Memory and lookup cost of the registry, against holding the stations as ORM rows.
+    Needs an app context.
+    """
+    registry = get_station_registry()
+    snapshot = registry.snapshot()
+    if not len(snapshot):
+        return {'stations': 0}
+    rng = np.random.default_rng(0)
+    sample = list(snapshot.notations[rng.integers(0, len(snapshot), size=lookups)])
+
+    tracemalloc.start()
+    orm_rows = db.session.query(HydStation).all()
+    orm_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.expunge_all()
+    del orm_rows
+
+    def per_lookup_ns(fn) -> float:
+        t0 = time.perf_counter()
+        fn()
+        return round(1e9 * (time.perf_counter() - t0) / lookups, 1)
+
+    labels = snapshot.labels()
+    label_column = snapshot.columns['label']
+    return {
+        'version': snapshot.version,
+        'stations': len(snapshot),
+        'registry_kb': round(snapshot.memory_bytes() / 1024, 1),
+        'orm_rows_kb': round(orm_bytes / 1024, 1),
+        'label_ns': per_lookup_ns(lambda: [snapshot.label(n) for n in sample]),
+        'labels_dict_ns': per_lookup_ns(lambda: [labels.get(n) for n in sample]),
+        'lookup_ns': per_lookup_ns(lambda: [snapshot.lookup(n) for n in sample]),
+        'vectorised_label_ns': per_lookup_ns(lambda: label_column[snapshot.indices(sample)]),
+    }
@@ -4,15 +4,26 @@ from flask.cli import with_appcontext
 from flask import current_app
 from app.extensions import db
 import datetime
+import functools
+import signal
+import threading
+from contextlib import contextmanager
 
 from .all_stations.services import load_hyd_station_data_from_ea, load_hyd_measure_data_from_ea
 from .all_stations.services import load_fld_station_data_from_ea, load_fld_measure_data_from_ea
+from .all_stations.services import benchmark_station_registry
 from .floodareas.services import load_floodarea_data_from_ea
-from .floodreadings.services import get_hydrology_readings_loop
+from .floodreadings.services import get_hydrology_readings_loop, check_hydrology_transform, convert_hydrology_archive
+from .floodreadings.services import benchmark_hydrology_datetime, seed_ledger_from_readings, incomplete_days
+from .floodreadings.services import (enable_compression, disable_compression_policy, compress_chunks,
+                                     benchmark_compression, refresh_rollups_range)
+from .floodreadings.services import migrate_to_compact, benchmark_compact
+from .floodreadings.services import run_ingest_benchmark, generate_day, write_day_file, benchmark_database_host
 from .floodreadings.models import ReadingHydro
 
 from sqlalchemy.sql import func
 from .utils import validate_date
+from .utils.profiling import profile_run
 
 import logging
 logger=logging.getLogger('floodWatch3')
@@ -21,6 +32,52 @@ logger=logging.getLogger('floodWatch3')
 from werkzeug.local import LocalProxy
 current_app: LocalProxy
 
+
+@contextmanager
+def stop_on_interrupt():
+    """
+    The first Ctrl-C sets the yielded event - loads stop at the next chunk boundary, with what was
+    committed checkpointed (see resume-hydrology-readings). A second Ctrl-C interrupts straight away.
+    """
+    stop_event = threading.Event()
+    previous = signal.getsignal(signal.SIGINT)
+
+    def handler(signum, frame):
+        if stop_event.is_set():
+            signal.signal(signal.SIGINT, previous)
+            raise KeyboardInterrupt
+        logger.warning("Stop requested - finishing the chunks in flight (Ctrl-C again to abort)")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handler)
+    try:
+        yield stop_event
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+def profiled(command):
+    """
+    Adds --profile and --profile-memory to a command: the run is profiled (cProfile of every thread, cpu time,
+    peak memory) into a timestamped directory under PROFILE_DIR. FLOODWATCH_PROFILE=1 (or =memory) turns it on
+    without the options. Goes under @with_appcontext.
+    """
+    @click.option('--profile', is_flag=True, default=False,
+                  help="Profile the run (cProfile of every thread, cpu time, peak RSS) into PROFILE_DIR")
+    @click.option('--profile-memory', is_flag=True, default=False,
+                  help="With --profile, also trace python allocations (slower)")
+    @functools.wraps(command)
+    def wrapper(*args, profile, profile_memory, **kwargs):
+        config = current_app.config
+        trace_memory = profile_memory or config.get('PROFILE_MEMORY', False)
+        enabled = profile or profile_memory or config.get('PROFILE_LOADERS', False)
+        with profile_run(click.get_current_context().info_name, enabled=enabled,
+                         output_root=config.get('PROFILE_DIR', 'profiles'),
+                         top=config.get('PROFILE_TOP', 20),
+                         trace_memory=trace_memory):
+            return command(*args, **kwargs)
+    return wrapper
+
+
 @click.command("init-db")
 @with_appcontext
 def init_db_command():
@@ -53,24 +110,28 @@ def init_db_command():
 
 @click.command("load-hyd-station-data")   # ← This is the CLI command name you will use in the terminal
 @with_appcontext
+@profiled
 def load_hyd_station_data_command():
     """Load EA station data into the database."""
     load_hyd_station_data_from_ea()
 
 @click.command("load-hyd-measure-data")   # ← This is the CLI command name you will use in the terminal
 @with_appcontext
+@profiled
 def load_hyd_measure_data_command():
     """Load EA measure data into the database."""
     load_hyd_measure_data_from_ea()
 
 @click.command("load-fld-station-data")   # ← This is the CLI command name you will use in the terminal
 @with_appcontext
+@profiled
 def load_fld_station_data_command():
     """Load EA station data into the database."""
     load_fld_station_data_from_ea()
 
 @click.command("load-fld-measure-data")   # ← This is the CLI command name you will use in the terminal
 @with_appcontext
+@profiled
 def load_fld_measure_data_command():
     """Load EA measure data into the database."""
     load_fld_measure_data_from_ea()
@@ -80,6 +141,7 @@ def load_fld_measure_data_command():
 
 @click.command("load-floodarea-data")   # ← This is the CLI command name you will use in the terminal
 @with_appcontext
+@profiled
 def load_floodarea_data_command():
     """Load EA flood area data into the database."""
     load_floodarea_data_from_ea()
@@ -105,39 +167,66 @@ def load_floodarea_metrics_command():
 @click.option('--force_replace',
               prompt='Force upload of EA data and replace existing file (Y/n)',
               default=False, show_default=True)
+@click.option('--streaming', is_flag=True, default=False, help="Load each day in batches while it downloads")
+@click.option('--archive-format', type=click.Choice(['csv', 'parquet']), default='csv', show_default=True,
+              help="parquet: also archive downloaded days as typed parquet files")
+@click.option('--prefetch-days', default=0, show_default=True,
+              help="Download up to this many days ahead while earlier days load (0 = download then load each day)")
+@click.option('--download-workers', default=1, show_default=True, help="Concurrent downloads when prefetching")
+@click.option('--transform-processes', default=0, show_default=True,
+              help="Transform readings in this many worker processes (0 = in the loader threads)")
 @with_appcontext
-def get_hydrology_data_command(force_start_date, force_end_date, force_replace):
+@profiled
+def get_hydrology_data_command(force_start_date, force_end_date, force_replace, streaming, archive_format,
+                               prefetch_days, download_workers, transform_processes):
     """Get 'reading' data from the hydrology API"""
     if not force_end_date:
         force_end_date = force_start_date
 
     # noinspection PyProtectedMember
     app = current_app._get_current_object()
-    with app.app_context():
+    with app.app_context(), stop_on_interrupt() as stop_event:
         get_hydrology_readings_loop(app=app,
                                     force_start_date=force_start_date,
                                     force_end_date=force_end_date,
-                                    force_replace=force_replace
+                                    force_replace=force_replace,
+                                    streaming=streaming,
+                                    archive_format=archive_format,
+                                    prefetch_days=prefetch_days,
+                                    download_workers=download_workers,
+                                    transform_processes=transform_processes,
+                                    stop_event=stop_event
                                    )
 
 
 @click.command('get-hydrology-readings-data-latest')
 # These command line options are set in PyCharm CLI run configuration parameters
-@click.option('--num_days_before_last_reading', default=14, help="Update changes, insert new data")
+@click.option('--num_days_before_last_reading', type=int, default=None,
+              help="Update changes, insert new data [default: INGEST_REFRESH_DAYS]")
+@click.option('--mode', type=click.Choice(['diff', 'merge', 'replace']), default='diff', show_default=True,
+              help="diff: apply only the rows changed since the archived file (a day with no usable archived "
+                   "file is replaced), merge: staged upsert of each day, replace: delete each day and reload it")
 @with_appcontext
-def get_hydrology_data_latest_command(num_days_before_last_reading):
+@profiled
+def get_hydrology_data_latest_command(num_days_before_last_reading, mode):
     """Get 'reading' data from the hydrology API"""
     # noinspection PyProtectedMember
     app = current_app._get_current_object()
     with app.app_context():
         #TODO This needs to start 14 days prior to latest r_date from ReadingHydro
         force_end_date = (datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=1))
-        force_start_date = db.session.query(func.max(ReadingHydro.r_datetime)).scalar().date()- datetime.timedelta(days=num_days_before_last_reading)
+        if num_days_before_last_reading is None:
+            num_days_before_last_reading = app.config.get('INGEST_REFRESH_DAYS', 14)
+        # (readings dated in the future - e.g. a benchmark's synthetic day - don't count as the last reading)
+        force_start_date = db.session.query(func.max(ReadingHydro.r_datetime))\
+                                     .filter(ReadingHydro.r_datetime <= func.now()).scalar().date()- datetime.timedelta(days=num_days_before_last_reading)
         get_hydrology_readings_loop(app=app,
                                     force_start_date=force_start_date,
                                     force_end_date=force_end_date,
                                     force_replace=True,
-                                    force_replace_at_db=True
+                                    force_replace_at_db=(mode == 'replace'),
+                                    upsert_method='merge',
+                                    incremental=(mode == 'diff')
                                    )
 
 
@@ -151,16 +240,268 @@ def get_hydrology_data_latest_command(num_days_before_last_reading):
               required=False, help="End date (YYYY-MM-DD)"
              )
 @click.option('--force-replace', is_flag=True, default=False, help="Force replace existing data files from source")
+@click.option('--streaming', is_flag=True, default=False, help="Load each day in batches while it downloads")
+@click.option('--prefetch-days', default=0, show_default=True,
+              help="Download up to this many days ahead while earlier days load (0 = download then load each day)")
+@click.option('--download-workers', default=1, show_default=True, help="Concurrent downloads when prefetching")
+@click.option('--transform-processes', default=0, show_default=True,
+              help="Transform readings in this many worker processes (0 = in the loader threads)")
 
 @with_appcontext
-def get_hydrology_data_gaps_command(gaps_only, force_start_date, force_end_date, force_replace):
+@profiled
+def get_hydrology_data_gaps_command(gaps_only, force_start_date, force_end_date, force_replace, streaming,
+                                    prefetch_days, download_workers, transform_processes):
     """Get 'reading' data from the hydrology API"""
     # noinspection PyProtectedMember
     app = current_app._get_current_object()
-    with app.app_context():
+    with app.app_context(), stop_on_interrupt() as stop_event:
         get_hydrology_readings_loop(app=app,
                                     gaps_only=gaps_only,
                                     force_start_date=force_start_date.date() if force_start_date is not None else None,
                                     force_end_date  =force_end_date.date() if force_end_date  is not None else None,
-                                    force_replace=force_replace
+                                    force_replace=force_replace,
+                                    streaming=streaming,
+                                    prefetch_days=prefetch_days,
+                                    download_workers=download_workers,
+                                    transform_processes=transform_processes,
+                                    stop_event=stop_event
                                    )
+
+
+@click.command('resume-hydrology-readings')
+@click.option('--transform-processes', default=0, show_default=True,
+              help="Transform readings in this many worker processes (0 = in the loader threads)")
+@with_appcontext
+@profiled
+def resume_hydrology_readings_command(transform_processes):
+    """Finish the days whose load was stopped part way (carrying on from their last committed chunk)"""
+    # noinspection PyProtectedMember
+    app = current_app._get_current_object()
+    days = incomplete_days()
+    if not days:
+        click.echo("✅ No unfinished days to resume.")
+        return
+    click.echo(f"Resuming {len(days)} days: {', '.join(d.isoformat() for d in days)}")
+    with app.app_context(), stop_on_interrupt() as stop_event:
+        get_hydrology_readings_loop(app=app,
+                                    days=days,
+                                    transform_processes=transform_processes,
+                                    stop_event=stop_event
+                                   )
+
+
+@click.command('check-hydrology-transform')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="First day file to check (YYYY-MM-DD)"
+             )
+@click.option('--end-date',   type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=False, help="Last day file to check (YYYY-MM-DD)"
+             )
+@click.option('--max-rows', default=0, show_default=True, help="Rows to check per day (0 = all)")
+@click.option('--processes', default=0, show_default=True,
+              help="Check the transform as run in this many worker processes (0 = in process)")
+@with_appcontext
+def check_hydrology_transform_command(start_date, end_date, max_rows, processes):
+    """Check the column-wise readings transform gives the same rows as the original per-row code"""
+    mismatched = check_hydrology_transform(start_date=start_date.date(), end_date=(end_date or start_date).date(), max_rows=max_rows,
+                                           processes=processes)
+    if mismatched:
+        raise click.ClickException(f"{mismatched} mismatched rows")
+    click.echo("✅ Column-wise transform matches the per-row transform.")
+
+
+@click.command('convert-hydrology-archive')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="First day file to convert (YYYY-MM-DD)"
+             )
+@click.option('--end-date',   type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=False, help="Last day file to convert (YYYY-MM-DD)"
+             )
+@click.option('--replace', is_flag=True, default=False, help="Rewrite existing parquet files")
+@click.option('--remove-csv', is_flag=True, default=False, help="Remove each csv file once converted")
+@with_appcontext
+def convert_hydrology_archive_command(start_date, end_date, replace, remove_csv):
+    """Convert archived hydrology csv day files to typed parquet files"""
+    converted = convert_hydrology_archive(start_date=start_date.date(), end_date=(end_date or start_date).date(),
+                                          replace=replace, remove_csv=remove_csv)
+    click.echo(f"✅ {converted} day files converted to parquet.")
+
+
+@click.command('seed-ingest-ledger')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="First day to seed (YYYY-MM-DD)"
+             )
+@click.option('--end-date',   type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=False, help="Last day to seed (YYYY-MM-DD)"
+             )
+@click.option('--replace', is_flag=True, default=False, help="Also overwrite days already in the ledger")
+@with_appcontext
+def seed_ingest_ledger_command(start_date, end_date, replace):
+    """
+    Record days loaded before the ingest ledger existed (row counts from the readings table).
+    Seed from the first day of readings - the gaps run only takes its date range from the ledger once it is seeded.
+    """
+    recorded = seed_ledger_from_readings(start_date=start_date.date(), end_date=(end_date or start_date).date(),
+                                         replace=replace)
+    click.echo(f"✅ {recorded} days recorded in the ingest ledger.")
+
+
+@click.command('benchmark-datetime-parsing')
+@click.option('--date', 'day', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="Archived day file to benchmark (YYYY-MM-DD)"
+             )
+@click.option('--max-rows', default=0, show_default=True, help="Rows to parse (0 = the whole day)")
+@click.option('--repeat', default=3, show_default=True, help="Timed runs of each method (the best is reported)")
+@with_appcontext
+def benchmark_datetime_parsing_command(day, max_rows, repeat):
+    """Time dateTime parsing of a real day file: dateutil per row vs the column parser"""
+    result = benchmark_hydrology_datetime(day.strftime('%Y-%m-%d'), max_rows=max_rows, repeat=repeat)
+    if result is None:
+        raise click.ClickException(f"No archived day file for {day}")
+    for name, value in result.items():
+        click.echo(f"{name:>22}: {value}")
+
+
+@click.command('set-readings-compression')
+@click.option('--compress-after-days', type=int, default=None,
+              help="Compress chunks older than this [default: COMPRESS_AFTER_DAYS] - must be beyond INGEST_REFRESH_DAYS")
+@click.option('--off', is_flag=True, default=False, help="Remove the compression policy (compressed chunks stay so)")
+@click.option('--compress-now', is_flag=True, default=False, help="Also compress every chunk already past the cut-off")
+@with_appcontext
+def set_readings_compression_command(compress_after_days, off, compress_now):
+    """Manage TimescaleDB compression of the readings hypertable (segmentby notation, orderby r_datetime)"""
+    if off:
+        disable_compression_policy()
+        click.echo("✅ Compression policy removed.")
+        return
+    try:
+        after_days = enable_compression(after_days=compress_after_days)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"✅ Chunks older than {after_days} days will be compressed.")
+    if compress_now:
+        end = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=after_days)
+        click.echo(f"✅ {compress_chunks(end=end)} chunks compressed.")
+
+
+@click.command('benchmark-readings-compression')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="First day (YYYY-MM-DD)"
+             )
+@click.option('--end-date',   type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=False, help="Last day (YYYY-MM-DD)"
+             )
+@click.option('--samples', default=20, show_default=True, help="Measures to range-scan")
+@click.option('--repeat', default=3, show_default=True, help="Runs of each scan (the best is reported)")
+@click.option('--restore', is_flag=True, default=False, help="Decompress the days again afterwards")
+@with_appcontext
+def benchmark_readings_compression_command(start_date, end_date, samples, repeat, restore):
+    """Disk footprint and per-measure range-scan time of a range of days, before and after compression"""
+    result = benchmark_compression(start_date=start_date.date(), end_date=(end_date or start_date).date(),
+                                   samples=samples, repeat=repeat, restore=restore)
+    for name, value in result.items():
+        click.echo(f"{name:>12}: {value}")
+
+
+@click.command('refresh-readings-rollups')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="First day (YYYY-MM-DD)"
+             )
+@click.option('--end-date',   type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=False, help="Last day (YYYY-MM-DD)"
+             )
+@click.option('--days-per-refresh', default=31, show_default=True, help="Days refreshed per call")
+@with_appcontext
+def refresh_readings_rollups_command(start_date, end_date, days_per_refresh):
+    """Build or rebuild the hourly and daily readings rollups for a range of days (new days refresh as they load)"""
+    failed = refresh_rollups_range(start_date.date(), (end_date or start_date).date(), days_per_refresh=days_per_refresh)
+    if failed:
+        raise click.ClickException(f"{failed} refreshes failed (see the log)")
+    click.echo("✅ Readings rollups refreshed.")
+
+
+@click.command('migrate-compact-readings')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="First day (YYYY-MM-DD)"
+             )
+@click.option('--end-date',   type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=False, help="Last day (YYYY-MM-DD)"
+             )
+@with_appcontext
+def migrate_compact_readings_command(start_date, end_date):
+    """Copy days of hyd_reading_ht into the compact layout (measure dimension + narrow fact table)"""
+    days, rows = migrate_to_compact(start_date.date(), (end_date or start_date).date())
+    click.echo(f"✅ {days} days ({rows} readings) migrated to the compact layout.")
+
+
+@click.command('benchmark-compact-readings')
+@click.option('--start-date', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=True, help="First day (YYYY-MM-DD)"
+             )
+@click.option('--end-date',   type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              required=False, help="Last day (YYYY-MM-DD)"
+             )
+@click.option('--samples', default=20, show_default=True, help="Measures to range-scan")
+@click.option('--repeat', default=3, show_default=True, help="Runs of each query (the best is reported)")
+@with_appcontext
+def benchmark_compact_readings_command(start_date, end_date, samples, repeat):
+    """Storage and scan times of migrated days: hyd_reading_ht vs the compact layout (via hyd_reading_v)"""
+    result = benchmark_compact(start_date.date(), (end_date or start_date).date(), samples=samples, repeat=repeat)
+    for name, value in result.items():
+        click.echo(f"{name:>12}: {value}")
+
+
+@click.command('benchmark-station-registry')
+@click.option('--lookups', default=100000, show_default=True, help="Lookups timed per method")
+@with_appcontext
+def benchmark_station_registry_command(lookups):
+    """Memory and lookup cost of the in-memory station registry (vs the stations as ORM rows)"""
+    for name, value in benchmark_station_registry(lookups=lookups).items():
+        click.echo(f"{name:>20}: {value}")
+
+
+@click.command('benchmark-ingest')
+@click.option('--rows', default=1000000, show_default=True, help="Rows in the synthetic day")
+@click.option('--measures', default=5000, show_default=True, help="Measures (notations) in the synthetic day")
+@click.option('--with-db', is_flag=True, default=False,
+              help="Also time threaded_insert against the configured database - a local one only, unless "
+                   "--yes-i-mean-it (the synthetic day is dated 2099 and removed afterwards)")
+@click.option('--method', 'methods', multiple=True, default=['copy', 'merge'], show_default=True,
+              type=click.Choice(['copy', 'orm', 'merge', 'values']), help="threaded_insert load methods to time")
+@click.option('--loop', is_flag=True, default=False, help="With --with-db, also time the full per-day loop")
+@click.option('--history', 'history_file', default="benchmark_history/ingest.json", show_default=True,
+              help="JSON history the run is appended to")
+@click.option('--seed', default=0, show_default=True)
+@click.option('--yes-i-mean-it', 'allow_remote_db', is_flag=True, default=False,
+              help="Let --with-db write to a database that is not local (e.g. production)")
+@with_appcontext
+def benchmark_ingest_command(rows, measures, with_db, methods, loop, history_file, seed, allow_remote_db):
+    """Time each ingest stage on a synthetic day file (parse, transform, load, full loop)"""
+    if with_db:
+        host, local = benchmark_database_host()
+        click.echo(f"Writing benchmark rows to {host}{'' if local else ' (NOT a local database)'}")
+    try:
+        run = run_ingest_benchmark(rows=rows, measures=measures, with_db=with_db, methods=list(methods), loop=loop,
+                                   history_file=history_file, seed=seed, allow_remote_db=allow_remote_db)
+    except ValueError as e:
+        raise click.ClickException(f"{e} (or pass --yes-i-mean-it)")
+    for stage, results in run['results'].items():
+        click.echo(f"{stage:>15}: {results}")
+    if run['regressions']:
+        raise click.ClickException("Slower than the previous run: " + "; ".join(run['regressions']))
+    click.echo(f"✅ Recorded in {history_file}")
+
+
+@click.command('generate-synthetic-day')
+@click.option('--date', 'day', type=click.DateTime(formats=["%Y-%m-%d"]), callback=validate_date,
+              default="2099-01-01", show_default=True, help="Day to generate (YYYY-MM-DD)"
+             )
+@click.option('--rows', default=1000000, show_default=True, help="Rows in the day")
+@click.option('--measures', default=5000, show_default=True, help="Measures (notations) in the day")
+@click.option('--seed', default=0, show_default=True)
+@with_appcontext
+def generate_synthetic_day_command(day, rows, measures, seed):
+    """Write a synthetic HYDROLOGY API day file into the readings archive (for offline runs of the loop)"""
+    datestr = day.strftime('%Y-%m-%d')
+    filepath = write_day_file(generate_day(datestr, rows=rows, measures=measures, seed=seed), datestr)
+    click.echo(f"✅ {rows} rows written to {filepath}")
@@ -1,6 +1,6 @@
 # scripts/fetch_ea_floodareas.py
 import pandas as pd
-import requests
+from ...utils import ea_get, floodmonitoring_root_url as ea_root_url
 import json
 
 from sqlalchemy import text
@@ -22,11 +22,10 @@ from ..models import (
 import logging
 logger = logging.getLogger('floodWatch3')
 
-ea_root_url = 'http://environment.data.gov.uk/flood-monitoring'
 
 def load_floodarea_data_from_ea(truncate_all=True):
     url = f'{ea_root_url}/id/floodAreas?_limit=10000'
-    response = requests.get(url)
+    response = ea_get(url)
     data = response.json()
     logger.info(f'Fetched {url}')
     logger.info(f'Response {response.status_code}')
@@ -71,7 +70,7 @@ def load_floodarea_data_from_ea(truncate_all=True):
             db.session.add(save_floodarea)
 
             url = floodarea.get('polygon')
-            response = requests.get(url)
+            response = ea_get(url)
             poly = response.json()
             poly = validate_polygon_json (poly)
 
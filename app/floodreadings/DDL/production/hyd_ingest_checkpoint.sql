@@ -0,0 +1,17 @@
+-- Table: hyd_ingest_checkpoint
+-- Committed row ranges of day loads still in progress (removed when the day completes) - lets a load resume
+CREATE TABLE IF NOT EXISTS production.hyd_ingest_checkpoint (
+    created         TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NULL,
+    r_date          date NOT NULL,
+    row_start       INT NOT NULL,    -- first row of the range (position in the day file)
+    row_end         INT,             -- one past the last row
+    file_hash       TEXT,            -- sha256 of the day file the offsets refer to
+    total_rows      INT,
+    bulk_load       BOOLEAN,
+    status_summary  JSONB,
+    action_summary  JSONB,
+    PRIMARY KEY (r_date, row_start)
+);
+
+alter table production.hyd_ingest_checkpoint
+    owner to wmon;
@@ -0,0 +1,22 @@
+-- Table: hyd_ingest_ledger
+-- What was loaded into hyd_reading_ht: one row per day (the latest load of that day)
+CREATE TABLE IF NOT EXISTS production.hyd_ingest_ledger (
+    created         TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NULL,
+    r_date          date PRIMARY KEY,
+    "source"        TEXT,
+    file_name       TEXT,
+    file_hash       TEXT,            -- sha256 of the archived day file
+    file_size       BIGINT,
+    "rows"          INT,
+    "mode"          TEXT,            -- copy | orm | merge | values, prefixed 'replace+' when the day was deleted first
+    duration_s      numeric(10, 1),
+    status          TEXT,            -- loaded | failed | partial
+    status_summary  JSONB,
+    action_summary  JSONB,
+    updated         TIMESTAMPTZ
+);
+
+alter table production.hyd_ingest_ledger
+    owner to wmon;
+
+create index if not exists hyd_ingest_ledger_status_idx on production.hyd_ingest_ledger (status, r_date);
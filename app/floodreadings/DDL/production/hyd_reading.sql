@@ -43,3 +43,13 @@ SELECT create_hypertable('production.hyd_reading_ht', 'r_datetime', chunk_time_i
 
 -- create index if not exists hyd_reading_ht_r_date_idx on hyd_reading_ht (r_date desc);
 -- create index if not exists hyd_reading_ht_source_idx on hyd_reading_ht (source);
+
+-- Native compression: one compressed segment per measure, ordered by time (matches the per-measure range scans)
+-- Chunks are compressed once older than COMPRESS_AFTER_DAYS (config.py) - beyond the INGEST_REFRESH_DAYS
+-- re-fetched by get-hydrology-readings-data-latest. Change with: flask set-readings-compression
+ALTER TABLE production.hyd_reading_ht SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'notation',
+    timescaledb.compress_orderby = 'r_datetime'
+);
+SELECT add_compression_policy('production.hyd_reading_ht', INTERVAL '21 days', if_not_exists => TRUE);
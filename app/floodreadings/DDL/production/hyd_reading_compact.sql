@@ -0,0 +1,101 @@
+-- Compact readings layout: a measure dimension and a narrow fact table, with hyd_reading_v presenting them
+-- as the columns of hyd_reading_ht. Filled from hyd_reading_ht by: flask migrate-compact-readings
+-- (and kept in step by the readings loop when READINGS_COMPACT_SYNC is set - see readings_compact.py).
+-- A shadow copy: the ingest still writes hyd_reading_ht, the table of record
+
+-- Table: hyd_reading_measure
+-- Everything in a reading that is fixed by its measure (notation), once per measure
+CREATE TABLE IF NOT EXISTS production.hyd_reading_measure (
+    measure_id       SERIAL PRIMARY KEY,
+    created          TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NULL,
+    measure          TEXT NOT NULL UNIQUE,
+    notation         TEXT NOT NULL UNIQUE,
+
+    station_id       TEXT,
+    parameter_name   TEXT,
+    "parameter"      TEXT,
+    qualifier        TEXT,
+    value_type       TEXT,
+    period_name      TEXT,
+    unit_name        TEXT,
+    observation_type TEXT,
+    datum_type       TEXT,
+    "label"          TEXT,
+    stationreference TEXT
+);
+
+alter table production.hyd_reading_measure
+    owner to wmon;
+
+create index if not exists hyd_reading_measure_station_idx on production.hyd_reading_measure (station_id);
+
+-- Table: hyd_reading_fact
+-- One row per reading: the measure's id, time, value and quality flags
+-- (source is 'hydro-' || r_date and r_month is the month of r_date, so neither is stored)
+CREATE TABLE IF NOT EXISTS production.hyd_reading_fact (
+    measure_id   INT NOT NULL,
+    r_datetime   TIMESTAMPTZ NOT NULL,
+    r_date       date,
+    period       int,
+    value        numeric(15, 3),
+
+    completeness TEXT,
+    quality      TEXT,
+    qcode        TEXT,
+    valid        TEXT,
+    invalid      TEXT,
+    missing      TEXT,
+    updated      TIMESTAMPTZ,
+    CONSTRAINT hyd_reading_fact_pk PRIMARY KEY (measure_id, r_datetime)
+);
+
+alter table production.hyd_reading_fact
+    owner to wmon;
+
+create index if not exists hyd_reading_fact_r_datetime_idx on production.hyd_reading_fact (r_datetime desc);
+
+SELECT create_hypertable('production.hyd_reading_fact', 'r_datetime', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+
+ALTER TABLE production.hyd_reading_fact SET (
+    timescaledb.compress,
+    timescaledb.compress_segmentby = 'measure_id',
+    timescaledb.compress_orderby = 'r_datetime'
+);
+SELECT add_compression_policy('production.hyd_reading_fact', INTERVAL '21 days', if_not_exists => TRUE);
+
+-- View: hyd_reading_v
+-- The columns of hyd_reading_ht, so existing queries can read the compact layout (filters on notation or
+-- station_id are resolved against the small dimension table first)
+CREATE OR REPLACE VIEW production.hyd_reading_v AS
+SELECT CAST(NULL AS TIMESTAMPTZ)                AS created,
+       'hydro-' || to_char(f.r_date, 'YYYY-MM-DD') AS "source",
+       f.r_datetime,
+       CAST(date_trunc('month', f.r_date) AS date) AS r_month,
+       f.r_date,
+       m.measure,
+       m.notation,
+       m.station_id,
+       m.parameter_name,
+       m."parameter",
+       m.qualifier,
+       m.value_type,
+       m.period_name,
+       f.period,
+       m.unit_name,
+       m.observation_type,
+       m.datum_type,
+       m."label",
+       m.stationreference,
+       f.value,
+       f.completeness,
+       f.quality,
+       f.qcode,
+       f.valid,
+       f.invalid,
+       f.missing,
+       f.updated
+  FROM production.hyd_reading_fact f
+  JOIN production.hyd_reading_measure m ON m.measure_id = f.measure_id;
+
+alter view production.hyd_reading_v
+    owner to wmon;
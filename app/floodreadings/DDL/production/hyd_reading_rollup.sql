@@ -0,0 +1,54 @@
+-- Continuous aggregates: hourly and daily rollups of hyd_reading_ht per measure (notation)
+-- Refreshed for each day as it is loaded (see readings_rollups.py) - build the history once with
+-- flask refresh-readings-rollups --start-date ... --end-date ...
+-- Quality counts are of the EA quality flags: Good, Estimated, Suspect, Unchecked, Missing
+
+-- Hourly, from the readings
+CREATE MATERIALIZED VIEW IF NOT EXISTS production.hyd_reading_hourly
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', r_datetime)           AS bucket,
+       notation,
+       count(*)                                              AS readings,
+       count(value)                                          AS value_count,
+       min(value)                                            AS value_min,
+       max(value)                                            AS value_max,
+       sum(value)                                            AS value_sum,
+       avg(value)                                            AS value_mean,
+       last(value, r_datetime)                               AS value_last,
+       max(r_datetime)                                       AS last_r_datetime,
+       count(*) FILTER (WHERE quality = 'Good')              AS quality_good,
+       count(*) FILTER (WHERE quality = 'Estimated')         AS quality_estimated,
+       count(*) FILTER (WHERE quality = 'Suspect')           AS quality_suspect,
+       count(*) FILTER (WHERE quality = 'Unchecked')         AS quality_unchecked,
+       count(*) FILTER (WHERE quality = 'Missing')           AS quality_missing
+  FROM production.hyd_reading_ht
+ GROUP BY bucket, notation
+WITH NO DATA;
+
+alter materialized view production.hyd_reading_hourly
+    owner to wmon;
+
+-- Daily, from the hourly rollup (a hierarchical continuous aggregate - TimescaleDB 2.9 or later)
+CREATE MATERIALIZED VIEW IF NOT EXISTS production.hyd_reading_daily
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 day', bucket)                 AS bucket,
+       notation,
+       sum(readings)                                         AS readings,
+       sum(value_count)                                      AS value_count,
+       min(value_min)                                        AS value_min,
+       max(value_max)                                        AS value_max,
+       sum(value_sum)                                        AS value_sum,
+       sum(value_sum) / nullif(sum(value_count), 0)          AS value_mean,
+       last(value_last, last_r_datetime)                     AS value_last,
+       max(last_r_datetime)                                  AS last_r_datetime,
+       sum(quality_good)                                     AS quality_good,
+       sum(quality_estimated)                                AS quality_estimated,
+       sum(quality_suspect)                                  AS quality_suspect,
+       sum(quality_unchecked)                                AS quality_unchecked,
+       sum(quality_missing)                                  AS quality_missing
+  FROM production.hyd_reading_hourly
+ GROUP BY 1, notation
+WITH NO DATA;
+
+alter materialized view production.hyd_reading_daily
+    owner to wmon;
@@ -1,2 +1,5 @@
 # app/floodreadings/models/__init__.py
 from .hyd_reading import ReadingHydro
+from .hyd_ingest_ledger import HydIngestLedger
+from .hyd_ingest_checkpoint import HydIngestCheckpoint
+from .hyd_reading_compact import HydReadingMeasure, ReadingHydroFact
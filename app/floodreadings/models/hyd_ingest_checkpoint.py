@@ -0,0 +1,18 @@
+from app.extensions import db
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class HydIngestCheckpoint(db.Model):
+    """A committed range of rows (by position in the day file) of a day load that has not finished yet"""
+    __tablename__ = 'hyd_ingest_checkpoint'
+    __table_args__ = {'schema': 'production'}
+
+    created        = db.Column(db.DateTime(timezone=True), server_default=db.text('CURRENT_TIMESTAMP'))
+    r_date         = db.Column(db.Date, primary_key=True)
+    row_start      = db.Column(db.Integer, primary_key=True)   # first row of the range
+    row_end        = db.Column(db.Integer)                     # one past the last row
+    file_hash      = db.Column(db.String)                      # sha256 of the day file the offsets refer to
+    total_rows     = db.Column(db.Integer)                     # rows in that day file
+    bulk_load      = db.Column(db.Boolean)                     # plain insert (True) or insert/update
+    status_summary = db.Column(JSONB)
+    action_summary = db.Column(JSONB)
@@ -0,0 +1,22 @@
+from app.extensions import db
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+class HydIngestLedger(db.Model):
+    """One row per day of HYDROLOGY API readings loaded into hyd_reading_ht (the latest load of that day)"""
+    __tablename__ = 'hyd_ingest_ledger'
+    __table_args__ = {'schema': 'production'}
+
+    created        = db.Column(db.DateTime(timezone=True), server_default=db.text('CURRENT_TIMESTAMP'))
+    r_date         = db.Column(db.Date, primary_key=True)
+    source         = db.Column(db.String)                  # e.g. hydro-2025-01-31
+    file_name      = db.Column(db.String)                  # archived day file the load was made from
+    file_hash      = db.Column(db.String)                  # sha256 of that file
+    file_size      = db.Column(db.BigInteger)
+    rows           = db.Column(db.Integer)                 # source rows in the day file
+    mode           = db.Column(db.String)                  # e.g. copy, merge, values, replace+copy
+    duration_s     = db.Column(db.Numeric(10, 1))
+    status         = db.Column(db.String)                  # loaded | failed
+    status_summary = db.Column(JSONB)                      # parse_float_safe status code counts
+    action_summary = db.Column(JSONB)                      # inserted/updated/copied/... counts
+    updated        = db.Column(db.DateTime(timezone=True))
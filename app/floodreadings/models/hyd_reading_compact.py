@@ -0,0 +1,51 @@
+from app.extensions import db
+from sqlalchemy import PrimaryKeyConstraint
+
+
+class HydReadingMeasure(db.Model):
+    """Measure dimension of the compact readings layout - the per-measure text of hyd_reading_ht, once per measure"""
+    __tablename__ = 'hyd_reading_measure'
+    __table_args__ = {'schema': 'production'}
+
+    measure_id       = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    created          = db.Column(db.DateTime(timezone=True), server_default=db.text('CURRENT_TIMESTAMP'))
+    measure          = db.Column(db.String, nullable=False, unique=True)   # full measure URL
+    notation         = db.Column(db.String, nullable=False, unique=True)
+
+    station_id       = db.Column(db.String)
+    parameter_name   = db.Column(db.String)
+    parameter        = db.Column(db.String)
+    qualifier        = db.Column(db.String)
+    value_type       = db.Column(db.String)
+    period_name      = db.Column(db.String)
+    unit_name        = db.Column(db.String)
+    observation_type = db.Column(db.String)
+    datum_type       = db.Column(db.String)
+    label            = db.Column(db.String)
+    stationreference = db.Column(db.String)
+
+
+class ReadingHydroFact(db.Model):
+    """
+    Narrow readings fact table (hypertable on r_datetime) - hyd_reading_v joins it back to the hyd_reading_ht columns.
+    source and r_month are derived from r_date in the view.
+    """
+    __tablename__ = 'hyd_reading_fact'
+    __table_args__ = (
+        PrimaryKeyConstraint('measure_id', 'r_datetime', name='hyd_reading_fact_pk'),
+        {'schema': 'production'}
+    )
+
+    measure_id   = db.Column(db.Integer, nullable=False)
+    r_datetime   = db.Column(db.DateTime(timezone=True), nullable=False)  # Timescale hypertable column
+    r_date       = db.Column(db.Date)
+    period       = db.Column(db.Integer)
+    value        = db.Column(db.Numeric(15, 3))
+
+    completeness = db.Column(db.String)
+    quality      = db.Column(db.String)
+    qcode        = db.Column(db.String)
+    valid        = db.Column(db.String)
+    invalid      = db.Column(db.String)
+    missing      = db.Column(db.String)
+    updated      = db.Column(db.DateTime(timezone=True))
@@ -1,4 +1,11 @@
-from .hydrology_readings import get_hydrology_readings_loop
+from .hydrology_readings import get_hydrology_readings_loop, check_hydrology_transform, convert_hydrology_archive
+from .hydrology_readings import benchmark_hydrology_datetime
+from .ingest_ledger import seed_ledger_from_readings
+from .ingest_checkpoint import incomplete_days
+from .ingest_benchmark import run_ingest_benchmark, generate_day, write_day_file, benchmark_database_host
+from .readings_compact import migrate_to_compact, benchmark_compact
+from .readings_rollups import refresh_rollups_range, read_rollup
+from .readings_compression import enable_compression, disable_compression_policy, compress_chunks, benchmark_compression
 
 #from .string_maps import get_datumtype_for_db, get_period_for_db, get_valuetype_for_db, get_qualifier_for_db
 from .string_maps import get_fieldvalue_for_db
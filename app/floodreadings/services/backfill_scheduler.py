@@ -0,0 +1,139 @@
+# app/floodreadings/services/backfill_scheduler.py
+# Pipelined (download -> load) scheduling of multi-day backfills, with a bounded prefetch queue between the stages
+
+import threading
+import time
+from contextlib import nullcontext
+from queue import Queue, Empty
+from typing import Any, Callable
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+
+class StageStats:
+    """Busy and blocked time of one pipeline stage (all its workers)"""
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0      # doing the stage's work
+        self.blocked = 0.0   # download: waiting for queue space; load: waiting for a downloaded day
+        self._lock = threading.Lock()
+
+    def add(self, busy: float = 0.0, blocked: float = 0.0, items: int = 0):
+        with self._lock:
+            self.busy += busy
+            self.blocked += blocked
+            self.items += items
+
+    def summary(self, wall: float) -> dict:
+        capacity = wall * self.workers
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'busy_s': round(self.busy, 1),
+            'blocked_s': round(self.blocked, 1),
+            'utilisation': round(self.busy / capacity, 3) if capacity > 0 else None,
+        }
+
+
+_END = object()
+
+class PrefetchScheduler:
+    """
+    Runs download(item) and load(item, payload, worker_id) as separate stages connected by a bounded queue,
+    so up to queue_depth items are downloaded ahead while earlier ones load.
+    Per-stage utilisation shows which side is the bottleneck: a busy load stage with a blocked download stage
+    means the database is the limit, and the reverse means the network is.
+    """
+    def __init__(self,
+                 download: Callable[[Any], Any],
+                 load: Callable[[Any, Any, int], None],
+                 download_workers: int = 1,
+                 load_workers: int = 1,
+                 queue_depth: int = 2,
+                 load_context: Callable = None,
+                 stop_event: threading.Event = None
+                ):
+        """
+        :param download: item -> payload (e.g. day -> DataFrame, or None)
+        :param load: (item, payload, worker_id) -> None
+        :param queue_depth: downloaded items allowed to wait for a loader (the prefetch depth)
+        :param load_context: context manager factory entered by each load worker (e.g. app.app_context)
+        :param stop_event: once set, no further item is downloaded or loaded (items in hand finish)
+        """
+        self.download = download
+        self.load = load
+        self.download_workers = max(1, download_workers)
+        self.load_workers = max(1, load_workers)
+        self.queue_depth = max(1, queue_depth)
+        self.load_context = load_context or nullcontext
+        self.stop_event = stop_event or threading.Event()
+
+    def run(self, items: list) -> dict:
+        """Process all items. :return: per-stage utilisation summary"""
+        todo = Queue()
+        for item in items:
+            todo.put(item)
+        ready = Queue(maxsize=self.queue_depth)
+        download_stats = StageStats('download', self.download_workers)
+        load_stats = StageStats('load', self.load_workers)
+
+        def download_worker():
+            while not self.stop_event.is_set():
+                try:
+                    item = todo.get_nowait()
+                except Empty:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    payload = self.download(item)
+                except Exception as e:
+                    logger.exception(f"Download failed for {item}: {e}")
+                    payload = None
+                t1 = time.perf_counter()
+                ready.put((item, payload))
+                download_stats.add(busy=t1 - t0, blocked=time.perf_counter() - t1, items=1)
+
+        def load_worker(worker_id: int):
+            with self.load_context():
+                while True:
+                    t0 = time.perf_counter()
+                    entry = ready.get()
+                    t1 = time.perf_counter()
+                    if entry is _END:
+                        load_stats.add(blocked=t1 - t0)
+                        return
+                    item, payload = entry
+                    if self.stop_event.is_set():
+                        logger.info(f"Stopping - {item} not loaded")
+                        continue
+                    try:
+                        self.load(item, payload, worker_id)
+                    except Exception as e:
+                        logger.exception(f"Load failed for {item}: {e}")
+                    load_stats.add(busy=time.perf_counter() - t1, blocked=t1 - t0, items=1)
+
+        t_start = time.perf_counter()
+        downloaders = [threading.Thread(target=download_worker, name=f'backfill-dl-{i}', daemon=True)
+                       for i in range(self.download_workers)]
+        loaders = [threading.Thread(target=load_worker, args=(i,), name=f'backfill-load-{i}', daemon=True)
+                   for i in range(self.load_workers)]
+        for t in downloaders + loaders:
+            t.start()
+        for t in downloaders:
+            t.join()
+        for _ in loaders:
+            ready.put(_END)
+        for t in loaders:
+            t.join()
+        wall = time.perf_counter() - t_start
+
+        summary = {
+            'wall_s': round(wall, 1),
+            'download': download_stats.summary(wall),
+            'load': load_stats.summary(wall),
+        }
+        logger.info(f"Backfill pipeline: {summary}")
+        return summary
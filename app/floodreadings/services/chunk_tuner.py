@@ -0,0 +1,149 @@
+# app/floodreadings/services/chunk_tuner.py
+# Adaptive chunk size and in-flight chunk count for the chunked (orm / per-chunk upsert) loads in threaded_insert,
+# tuned from the latency and throughput measured as the load runs
+
+import threading
+import time
+from collections import deque
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+
+class ChunkTuner:
+    """
+    Chunk size follows the measured time per row, so a chunk takes about target_chunk_s: long enough to amortise
+    the round trips, short enough to spread a day over the workers and make a failed chunk cheap.
+    The in-flight count hill-climbs on overall rows/sec: it steps up while each step raises throughput by at least
+    `gain`, steps back down when it doesn't, and drops when chunks spend most of their time waiting for a database
+    slot (the connection budget, not the chunk count, is then the limit). It re-probes upwards every `hold` windows.
+    Shared by every day worker of a load mode, so later days start from what earlier days learned.
+    """
+    def __init__(self,
+                 name: str,
+                 chunk_rows: int = 20000,
+                 min_chunk_rows: int = 1000,
+                 max_chunk_rows: int = 100000,
+                 in_flight: int = 4,
+                 target_chunk_s: float = 2.0,
+                 window: int = 8,
+                 gain: float = 0.05,
+                 hold: int = 4
+                ):
+        """
+        :param chunk_rows: starting chunk size
+        :param in_flight: starting number of chunks in flight (capped by the ceiling passed to plan)
+        :param target_chunk_s: time a chunk should take
+        :param window: completed chunks per throughput measurement
+        :param gain: relative throughput increase that justifies one more chunk in flight
+        :param hold: windows to stay at a level before probing one higher again
+        """
+        self.name = name
+        self.min_chunk_rows = min_chunk_rows
+        self.max_chunk_rows = max_chunk_rows
+        self.chunk_rows = self._clamp(chunk_rows)
+        self.in_flight = max(1, in_flight)
+        self.target_chunk_s = target_chunk_s
+        self.window = max(1, window)
+        self.gain = gain
+        self.hold = max(1, hold)
+        self._lock = threading.Lock()
+        self._seconds_per_row = None          # moving average, excluding time waiting for a slot
+        self._samples = deque()               # (completed at, rows, seconds, wait) at the current level
+        self._window_start = time.perf_counter()
+        self._previous = None                 # (in_flight, rows/sec) of the last completed window
+        self._direction = 1                   # +1 probing upwards, 0 holding
+        self._held = 0
+        self.chunks = 0
+        self.rows = 0
+        self.last_rate = None
+
+    def _clamp(self, rows: float) -> int:
+        rows = int(min(self.max_chunk_rows, max(self.min_chunk_rows, rows)))
+        return max(self.min_chunk_rows, rows - rows % 1000) if rows >= 1000 else rows
+
+    def plan(self, ceiling: int) -> (int, int):
+        """:return: (rows for the next chunk, chunks to keep in flight - at most ceiling)"""
+        with self._lock:
+            self.in_flight = max(1, min(self.in_flight, ceiling))
+            return self.chunk_rows, self.in_flight
+
+    def record(self, rows: int, seconds: float, wait: float = 0.0):
+        """
+        One completed chunk.
+        :param seconds: wall time of the chunk, including wait
+        :param wait: part of seconds spent waiting for a database slot
+        """
+        if rows <= 0:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            self.chunks += 1
+            self.rows += rows
+            work = max(seconds - wait, 1e-6)
+            per_row = work / rows
+            self._seconds_per_row = per_row if self._seconds_per_row is None \
+                                    else 0.7 * self._seconds_per_row + 0.3 * per_row
+            self.chunk_rows = self._clamp(self.target_chunk_s / self._seconds_per_row)
+
+            self._samples.append((now, rows, seconds, wait))
+            if len(self._samples) >= self.window:
+                self._adjust(now)
+
+    def _adjust(self, now: float):
+        """End of a measurement window: move the in-flight count (called with the lock held)"""
+        elapsed = now - self._window_start
+        rows = sum(sample[1] for sample in self._samples)
+        busy = sum(sample[2] for sample in self._samples)
+        waited = sum(sample[3] for sample in self._samples)
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        self.last_rate = rate
+        level = self.in_flight
+
+        if busy > 0 and waited / busy > 0.5:
+            # Chunks mostly queue for a connection - more in flight only adds waiting
+            self.in_flight = max(1, level - 1)
+            self._direction, self._held = 0, 0
+        elif self._previous is None:
+            self.in_flight = level + 1
+        else:
+            previous_level, previous_rate = self._previous
+            if self._direction > 0 and level > previous_level:
+                if rate >= previous_rate * (1 + self.gain):
+                    self.in_flight = level + 1
+                else:
+                    self.in_flight = previous_level       # the step up didn't pay - back to where it did
+                    self._direction, self._held = 0, 0
+            else:
+                self._held += 1
+                if self._held >= self.hold:
+                    self.in_flight = level + 1            # probe again (conditions change during a backfill)
+                    self._direction, self._held = 1, 0
+
+        if self.in_flight != level:
+            logger.debug(f"Chunk tuner ({self.name}): {level} -> {self.in_flight} in flight, "
+                         f"{self.chunk_rows} rows/chunk, {int(rate)} rows/sec")
+        self._previous = (level, rate)
+        self._samples.clear()
+        self._window_start = now
+
+    def settings(self) -> dict:
+        with self._lock:
+            return {
+                'chunk_rows': self.chunk_rows,
+                'in_flight': self.in_flight,
+                'chunk_ms_per_krow': round(1e6 * self._seconds_per_row, 1) if self._seconds_per_row else None,
+                'rows/sec': int(self.last_rate) if self.last_rate is not None else None,
+                'chunks': self.chunks,
+            }
+
+
+_tuners: dict[str, ChunkTuner] = {}
+_tuners_lock = threading.Lock()
+
+def get_chunk_tuner(name: str, **kwargs) -> ChunkTuner:
+    """The process-wide tuner for a load mode (e.g. 'bulk' or 'upsert'); kwargs only apply when it is created"""
+    with _tuners_lock:
+        if name not in _tuners:
+            _tuners[name] = ChunkTuner(name, **kwargs)
+        return _tuners[name]
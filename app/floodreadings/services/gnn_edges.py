@@ -1,4 +1,15 @@
 #/app/floodreadings/services/gnn_edges.py
 
+import numpy as np
 
-#station_coords: list of (lat, lon) tuples for each station
\ No newline at end of file
+from app.all_stations.services.station_registry import get_station_registry
+
+
+#station_coords: list of (lat, lon) tuples for each station
+def station_coords() -> (np.ndarray, np.ndarray):
+    """
+    Station notations and their (lat, lon), from one snapshot of the shared station registry
+    (rows line up; NaN where a station has no coordinates). Needs an app context on first use.
+    """
+    snapshot = get_station_registry().snapshot()
+    return snapshot.notations, snapshot.coords()
@@ -3,34 +3,54 @@
 
 # API documentation: https://environment.data.gov.uk/hydrology/doc/reference
 
-import requests
+from app.utils import ea_get, get_ea_client, get_db_budget, get_datetime_parser, hydrology_root_url as ea_root_url
+from app.utils.utils_date import benchmark_datetime_parsing
+from app.utils.profiling import current_rss_mb, reset_peak_rss, peak_rss_since_reset_mb
 import os
 
 import pandas as pd
-import math
+import threading
 import time
-from collections import Counter
+from collections import Counter, deque
+from contextlib import contextmanager
 
 #from pynput import keyboard
 #import threading
 
 from flask import current_app
-from sqlalchemy import Date
+from sqlalchemy import text
 from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy.sql import func, distinct, exists, literal_column
-from sqlalchemy.sql.expression import cast
+from sqlalchemy.sql import func, exists, literal_column
 from sqlalchemy.dialects.postgresql import insert
 #from sqlalchemy import text
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
 
 #from datetime import date, datetime, timedelta, timezone
 import datetime
-from dateutil.parser import parse
 
 from app import db
 from ..models import ReadingHydro
-from app.all_stations.models import HydStation   # to get station labels - just a nice to have
+from .readings_transform import (parse_float_safe, parse_notation,            # noqa (re-exported)
+                                 transform_readings_chunk, readings_to_records, check_transform_parity)
+from .readings_copy import copy_insert, merge_insert, readings_table_name, clear_day, replace_day
+from .notation_registry import get_notation_registry, preload_notation_registry
+from .readings_stream import stream_hydrology_readings, hydrology_readings_filepath
+from .ingest_ledger import (file_sha256, day_file_unchanged, record_day_load,
+                            ledger_start_date, ledger_seeded, ledger_min_max_dates, ledger_missing_dates)
+from .backfill_scheduler import PrefetchScheduler
+from .readings_procpool import TransformPool
+from .readings_diff import previous_filepath, apply_day_diff
+from .ingest_checkpoint import DayCheckpoint, IngestCancelled, cancelled
+from .chunk_tuner import get_chunk_tuner
+from .readings_compression import decompress_day
+from .readings_rollups import refresh_rollups
+from .readings_compact import compact_sync_enabled, migrate_day
+from .ingest_metrics import (stage_seconds, stage_bytes, stage_rows, chunk_seconds, chunk_results, day_peak_rss,
+                             record_load_summary, stage_summary, write_ingest_metrics)
+from .readings_archive import (parquet_available, parquet_filepath, read_parquet_day, read_csv_day,
+                               write_parquet_day, convert_csv_to_parquet, SOURCE_COLUMNS)
+from app.all_stations.services.station_registry import get_station_registry   # station labels - just a nice to have
 
 import logging
 logger = logging.getLogger('floodWatch3')
@@ -39,9 +59,6 @@ logger = logging.getLogger('floodWatch3')
 from werkzeug.local import LocalProxy
 current_app: LocalProxy
 
-#ea_root_url = 'http://environment.data.gov.uk/flood-monitoring'  # original source data (superseded)
-ea_root_url = 'http://environment.data.gov.uk/hydrology'          # source data for extended history
-
 # Define stop_event globally
 #stop_event = threading.Event()
 
@@ -54,34 +71,37 @@ ea_root_url = 'http://environment.data.gov.uk/hydrology'          # source data
 #        pass  # Handles special keys like shift, ctrl, etc.
 
 
-station_labels = None
-def get_station_labels(worker_id:int=0):
-    """Lazily load station labels on first access."""
-    global station_labels
-    if station_labels is None:
-        #logger.debug(f'(T{worker_id}):Lazy loading station labels')
-        try:
-            station_labels = {
-                row.notation: row.label
-                for row in db.session.query(HydStation.notation, HydStation.label).all()
-            }
-        except Exception as e:
-            logger.exception(f'(T{worker_id}):get_station_labels: failed with error: {e}')
-        logger.info(f'(T{worker_id}):Loaded {len(station_labels)} station labels into memory cache')
-    return station_labels
+def get_station_labels(worker_id:int=0) -> dict:
+    """Station notation -> label, from the shared station registry (loaded on first access)"""
+    return get_station_registry().snapshot().labels()
+
+
+def read_day_file(filepath: str, all_columns: bool = False) -> pd.DataFrame:
+    """Read an archived csv day file (the columns the transform uses, compactly - see read_csv_day), recording the parse stage metrics"""
+    with stage_seconds.time(stage='parse'):
+        df = read_csv_day(filepath, all_columns=all_columns)
+    stage_bytes.inc(os.path.getsize(filepath), stage='parse')
+    stage_rows.inc(len(df), stage='parse')
+    return df
 
 
 # for local machine working
 # save_basefolder: str = "data/archive",
 def get_hydrology_readings (datestr: str,
                             save_basefolder: str = "readings_hydrology",
-                            force_replace:bool = False
+                            force_replace:bool = False,
+                            archive_format:str = 'csv',
+                            prefer_parquet:bool = True,
+                            keep_previous:bool = False
                            ) -> pd.DataFrame|None:
     """
     Retrieve a file from the EA HYDROLOGY API corresponding to all readings for one day.
     :param datestr:
     :param save_basefolder:
     :param force_replace:
+    :param archive_format: 'csv' or 'parquet' - also write a typed parquet copy of a downloaded day
+    :param prefer_parquet: use an existing parquet archive file (typed columns) in preference to the csv
+    :param keep_previous: with force_replace, keep the existing csv as hydro-YYYY-MM-DD.prev.csv (for a diff load)
     :return:
     """
 
@@ -114,9 +134,25 @@ def get_hydrology_readings (datestr: str,
 
     os.makedirs(save_folder, exist_ok=True)  # Ensure the folder exists
     filepath = os.path.join(save_folder, filename)
+    parquet_path = parquet_filepath(filepath)
 
-    if os.path.exists(filepath):
+    if os.path.exists(parquet_path):
         if force_replace:
+            os.remove(parquet_path)
+            logger.info(f"Removed existing file: {parquet_path}")
+        elif prefer_parquet and parquet_available():
+            logger.info(f"Using existing local file: {parquet_path}")
+            with stage_seconds.time(stage='parse'):
+                df = read_parquet_day(parquet_path)
+            stage_bytes.inc(os.path.getsize(parquet_path), stage='parse')
+            stage_rows.inc(len(df), stage='parse')
+            return df
+
+    if os.path.exists(filepath):
+        if force_replace and keep_previous:
+            os.replace(filepath, previous_filepath(filepath))
+            logger.info(f"Kept existing file as: {previous_filepath(filepath)}")
+        elif force_replace:
             os.remove(filepath)
             logger.info(f"Removed existing file: {filepath}")
         else:
@@ -125,7 +161,7 @@ def get_hydrology_readings (datestr: str,
                 os.remove(filepath)
                 logger.info(f"Removed existing file: {filepath}")
             else:
-                df = pd.read_csv(filepath, low_memory=False, dtype=str)
+                df = read_day_file(filepath)
                 if df.empty or df.shape[1] == 0:
                     logger.warning(f"File exists, but has no data or columns: {filepath}")
                     os.remove(filepath)
@@ -135,7 +171,8 @@ def get_hydrology_readings (datestr: str,
                     return df
 
     # Download if the file doesn't exist after optional deletion
-    response = requests.get(url, stream=True, timeout=60)
+    t0 = time.perf_counter()
+    response = ea_get(url, stream=True, timeout=60)
     if response.status_code == 200:
         logger.info(f'Fetched {url}')
 
@@ -144,13 +181,50 @@ def get_hydrology_readings (datestr: str,
             #for chunk in response.iter_content(chunk_size=8192):          # 8k chunk writes
             for chunk in response.iter_content(chunk_size=1024 * 1024):   # 1Mb chunks reduces syscalls and i/o overhead
                 f.write(chunk)
+                stage_bytes.inc(len(chunk), stage='download')
+        stage_seconds.observe(time.perf_counter() - t0, stage='download')
         logger.info(f"Saved: {filepath}")
     else:
         logger.warning(f'Response {response.status_code}: Failed to fetch data from {url}')
+        if keep_previous and os.path.exists(previous_filepath(filepath)):
+            os.replace(previous_filepath(filepath), filepath)   # put the archived copy back
         return None
 
-    df = pd.read_csv(filepath, low_memory=False, dtype=str)
-    return df
+    if archive_format == 'parquet':
+        # parsed once: every column of the file goes to the parquet archive, just those read to load it are kept
+        df = read_day_file(filepath, all_columns=True)
+        write_parquet_day(df, parquet_filepath(filepath))
+        return df[[name for name in SOURCE_COLUMNS if name in df.columns]]
+    return read_day_file(filepath)
+
+
+def convert_hydrology_archive(start_date: datetime.date,
+                              end_date: datetime.date = None,
+                              save_basefolder: str = "readings_hydrology",
+                              replace: bool = False,
+                              remove_csv: bool = False
+                             ) -> int:
+    """
+    Backfill the parquet archive from the archived csv day files between start_date and end_date.
+    :return: number of days converted
+    """
+    if not parquet_available():
+        logger.error("pyarrow is not installed - cannot convert the archive to parquet")
+        return 0
+    end_date = end_date or start_date
+    converted = 0
+    current_date = start_date
+    while current_date <= end_date:
+        datestr = current_date.strftime('%Y-%m-%d')
+        csv_filepath = os.path.join(save_basefolder, datestr[:4], f'hydro-{datestr}.csv')
+        try:
+            if convert_csv_to_parquet(csv_filepath, replace=replace, remove_csv=remove_csv) is not None:
+                converted += 1
+        except Exception as e:
+            logger.exception(f"Failed to convert {csv_filepath}: {e}")
+        current_date += datetime.timedelta(days=1)
+    logger.info(f"Converted {converted} day files to parquet")
+    return converted
 
 
 def get_hydrology_readings_loop(upto:int = 3,
@@ -160,14 +234,30 @@ def get_hydrology_readings_loop(upto:int = 3,
                                 force_start_date: datetime.date = None,
                                 force_end_date: datetime.date = None,
                                 force_replace:bool = False,
-                                force_replace_at_db:bool = False
+                                force_replace_at_db:bool = False,
+                                bulk_method:str = 'copy',
+                                upsert_method:str = 'values',
+                                streaming:bool = False,
+                                stream_batch_rows:int = 100000,
+                                archive_format:str = 'csv',
+                                prefetch_days:int = 0,
+                                download_workers:int = 1,
+                                transform_processes:int = 0,
+                                incremental:bool = False,
+                                stop_event:threading.Event = None,
+                                days:list[datetime.date] = None,
+                                refresh_rollups_after_load:bool = True
                                ):
     #import torch
     #logger.info(f"torch version:   {torch.__version__}")
     #logger.info(f"torch available: {torch.cuda.is_available()}")
     #logger.info(f"torch device:    {torch.cuda.get_device_name(0)}")
 
-    if gaps_only:
+    if days:
+        # Just these days (e.g. those with an unfinished load)
+        start_date, end_date = min(days), max(days)
+        logger.info(f"(hydro) Processing {len(days)} days between {start_date} and {end_date}")
+    elif gaps_only:
         db_start_date, db_end_date = get_db_min_max_dates()
         # If force_start_date is provided, pick the latest of the two
         if force_start_date:
@@ -198,103 +288,312 @@ def get_hydrology_readings_loop(upto:int = 3,
                 logger.info(f"(hydro) No new days to fetch")
 
     def date_in_db(d_date) -> bool:
-        """Check if a specific date exists in the ReadingHydro table."""
-        return db.session.query(exists().where(cast(ReadingHydro.r_date, Date) == d_date)).scalar()
+        """Check if a specific date exists in the ReadingHydro table (an r_datetime range, so the index is used)."""
+        if isinstance(d_date, str):
+            d_date = datetime.date.fromisoformat(d_date)
+        return db.session.query(exists().where(ReadingHydro.r_datetime >= date_to_utc_datetime(d_date),
+                                               ReadingHydro.r_datetime < date_to_utc_datetime(d_date + datetime.timedelta(days=1))
+                                              )).scalar()
 
-    def delete_for_date(d_date):
+    def delete_for_date(d_date) -> str:
         """
-        Delete all rows from ReadingHydro where the DATE(r_datetime) = d_date.
+        Empty the readings table for one (UTC) day - its chunk is dropped where possible, rather than deleting rows.
+        (Before the chunk drop, the day was the session time zone's day.)
         Note: It is much quicker to replace a whole days data than to update/insert from a more recent file
         Args:
             d_date (date): The date to delete for.
+        :return: what was done, for the log
         """
-        #logger.info(f"(T):delete_for_date {d_date}:  BEGIN")
-
         if isinstance(d_date, datetime.datetime):
             d_date = d_date.date()
         elif isinstance(d_date, str):
             d_date = datetime.date.fromisoformat(d_date)
+        method, count = clear_day(d_date)
+        return f"{count} chunks dropped" if method == 'drop_chunks' else f"{count} rows deleted"
 
-        xstart = datetime.datetime.combine(d_date, datetime.datetime.min.time())
-        xend = xstart + datetime.timedelta(days=1)
-
-        #logger.info(f"(T):{xstart} to {xend}")
-        #count = (
-        #    db.session.query(ReadingHydro)
-        #    .filter(ReadingHydro.r_datetime >= xstart,
-        #            ReadingHydro.r_datetime < xend)
-        #    .count()
-        #)
-        #print(f"Would delete {count} rows")
-
-        ## Begin a transaction
-        #trans = db.session.begin_nested()
-
-        rows_deleted = (
-            db.session.query(ReadingHydro)
-            .filter(ReadingHydro.r_datetime >= xstart,
-                    ReadingHydro.r_datetime < xend)
-            .delete(synchronize_session=False)
-        )
+    # Station labels as they are now (picks up a station reload made by another process since the last run)
+    get_station_registry().refresh_if_changed()
 
-        #logger.info(f"(T):delete_for_date {d_date}:  {rows_deleted} rows")
-        ## Rollback to undo the delete
-        #trans.rollback()
+    # Parse every known measure notation once, up front (shared by all the workers below)
+    if not get_notation_registry().preloaded:
+        preload_notation_registry()
 
-        db.session.commit()
-        return rows_deleted
+    # Optionally transform in worker processes (shared by all the workers below) - threads alone are GIL-bound
+    transform_pool = None
+    if transform_processes > 0:
+        transform_pool = TransformPool(processes=transform_processes, stn_labels=get_station_labels())
+
+    # Every missing day in one query, rather than a query per day
+    missing_dates = set(get_db_missing_dates(start_date, end_date)) if gaps_only and start_date <= end_date else set()
+    if gaps_only:
+        logger.info(f"(hydro) {len(missing_dates)} days missing between {start_date} and {end_date}")
 
-    all_ranges = []
+    all_ranges = [(d, d) for d in sorted(days)] if days else []
     # Build a list of eligible dates to process
     current = start_date
-    while current <= end_date:
+    while current <= end_date and not days:
         chunk_end = min(current + datetime.timedelta(days=days_per_task - 1), end_date)
 
-        if gaps_only and date_in_db(current):
+        if gaps_only and current not in missing_dates:
             current = chunk_end + datetime.timedelta(days=1)
             continue
 
         all_ranges.append((current, chunk_end))
         current = chunk_end + datetime.timedelta(days=1)
 
+    def day_archive_file(datestr) -> str:
+        """The archived day file a load is made from (csv, or the parquet copy if the csv has gone)"""
+        filepath = hydrology_readings_filepath(datestr)
+        return filepath if os.path.exists(filepath) else parquet_filepath(filepath)
+
+    def load_mode(bulk_load, replace=force_replace_at_db) -> str:
+        return ('replace+' if replace else '') + (bulk_method if bulk_load else upsert_method)
+
+    def day_loaded(r_date, *args, **kwargs):
+        """Record the day's load in the ledger, and bring the compact layout (if in use) and the rollups up to date"""
+        record_day_load(r_date, *args, **kwargs)
+        if compact_sync_enabled():
+            try:
+                migrate_day(r_date)
+            except Exception as e:
+                logger.exception(f"Compact readings: {r_date} not copied: {e}")
+        if refresh_rollups_after_load:
+            refresh_rollups(r_date)
+
+    def chunking(bulk_load) -> dict|None:
+        """Chunk size and chunks in flight the tuner has settled on (for the chunked load methods)"""
+        if (bulk_load and bulk_method == 'copy') or (not bulk_load and upsert_method == 'merge'):
+            return None
+        return get_chunk_tuner('bulk' if bulk_load else 'upsert').settings()
+
+    def log_day_summary(p_worker_id, datestr, status_summary, insupd_summary, rows, elapsed, chunk_settings=None):
+        logger.info(f"(T{p_worker_id}):Status summary for {datestr}: {dict(sorted(status_summary.items()))}")
+        logger.info(f"(T{p_worker_id}):Action summary for {datestr}: {dict(sorted(insupd_summary.items()))}")
+        if chunk_settings:
+            logger.info(f"(T{p_worker_id}):Chunking       for {datestr}: {chunk_settings}")
+        logger.info(f"(T{p_worker_id}):Process time   for {datestr}: {elapsed:.1f}s - {int(rows / elapsed)} rows/sec")
+
+    # Days read/loaded at the same time share the process's memory - the peak is then the process peak over the day
+    days_overlap = max_workers > 1 or (prefetch_days > 0 and not streaming)
+
+    @contextmanager
+    def day_memory(datestr, p_worker_id):
+        """Log the peak RSS while a day is read and loaded"""
+        if not days_overlap:
+            reset_peak_rss()
+        rss_start = current_rss_mb()
+        try:
+            yield
+        finally:
+            peak = peak_rss_since_reset_mb()
+            if peak is not None:
+                day_peak_rss.set(peak * 2**20)
+            logger.info(f"(T{p_worker_id}):Memory         for {datestr}: peak RSS {peak} MB (from {rss_start} MB)"
+                        f"{' - process peak, days overlap' if days_overlap else ''}")
+
+    def load_day_streaming(datestr, p_worker_id):
+        """
+        Download, parse and load one day in overlapping batches (see readings_stream).
+        The day is only cleared (force_replace_at_db) once its first batch has arrived, so a failed download leaves
+        it as it was. There are no chunk checkpoints (the file's rows and hash are only known at the end) - a day
+        stopped part way is recorded 'partial' in the ledger, and resume-hydrology-readings loads it again.
+        """
+        r_date = datetime.date.fromisoformat(datestr)
+        filepath = day_archive_file(datestr)
+        if not (force_replace or force_replace_at_db) and os.path.exists(filepath) and day_file_unchanged(r_date, filepath):
+            logger.info(f"(T{p_worker_id}):Unchanged since last load, skipped: {datestr}")
+            return
+        day = {'bulk_load': None, 'status': Counter(), 'insupd': Counter(), 'rows': 0}
+
+        def load_batch(batch_df):
+            if cancelled(stop_event):
+                day['insupd']['cancelled'] += len(batch_df)   # and the rest of the day is not downloaded
+                raise IngestCancelled()
+            if day['bulk_load'] is None:
+                # first batch - the day has data, so it is safe to clear it now
+                if force_replace_at_db:
+                    cleared = delete_for_date(datestr)
+                    logger.info(f"(T{p_worker_id}):Cleared readings table for {datestr}:  {cleared}")
+                day['bulk_load'] = not date_in_db(datestr)
+                if not day['bulk_load']:
+                    decompress_day(r_date)
+                logger.info(f"(T{p_worker_id}):Streaming hydrology data for {datestr} "
+                            f"({'bulk load' if day['bulk_load'] else 'ins/upd'})")
+            status, insupd = threaded_insert(batch_df,
+                                             chunk_size=20000, max_workers=32,
+                                             ea_datasource=f"hydro-{datestr}",
+                                             app=app,
+                                             worker_id=p_worker_id,
+                                             bulk_load=day['bulk_load'],
+                                             bulk_method=bulk_method,
+                                             upsert_method=upsert_method,
+                                             transform_pool=transform_pool,
+                                             stop_event=stop_event)
+            day['status'].update(status)
+            day['insupd'].update({k: v for k, v in insupd.items() if k != 'rows/sec'})
+            day['rows'] += len(batch_df)
+            return status, insupd
+
+        t0 = time.perf_counter()
+        try:
+            result = stream_hydrology_readings(datestr, load_batch=load_batch,
+                                               force_replace=force_replace, batch_rows=stream_batch_rows,
+                                               archive_format=archive_format)
+        except IngestCancelled:
+            result = (day['status'], day['insupd'], day['rows']) if day['rows'] else None
+            logger.warning(f"(T{p_worker_id}):Stopped part way through {datestr} - {day['rows']} rows streamed "
+                           f"(resume-hydrology-readings loads the day again)")
+            if result is None:
+                return
+        t1 = time.perf_counter()
+        if result is None:
+            logger.warning(f"(T{p_worker_id}):No hydrology data available for {datestr}")
+            return
+        status_summary, insupd_summary, rows = result
+        insupd_summary['rows/sec'] = int(rows / (t1 - t0))
+        log_day_summary(p_worker_id, datestr, status_summary, insupd_summary, rows, t1 - t0, chunking(day['bulk_load']))
+        filepath = day_archive_file(datestr)
+        day_loaded(r_date, filepath, rows=rows,
+                   mode=load_mode(day['bulk_load']), duration_s=t1 - t0,
+                   status_summary=status_summary, action_summary=insupd_summary,
+                   file_hash=file_sha256(filepath) if os.path.exists(filepath) else None)
+
+    def load_day_diff(datestr, df, previous, filepath, file_hash, p_worker_id) -> bool:
+        """
+        Apply only the differences from the previous copy of the day file - if the ledger shows the day was loaded
+        from exactly that copy. :return: False if the day needs a full load instead
+        """
+        r_date = datetime.date.fromisoformat(datestr)
+        if not day_file_unchanged(r_date, previous):
+            logger.info(f"(T{p_worker_id}):Previous file for {datestr} is not what was loaded - full load")
+            return False
+        old_df = read_csv_day(previous)
+        logger.info(f"(T{p_worker_id}):Diff loading hydrology data for {datestr} - {len(df)} rows ({len(old_df)} before)")
+        t0 = time.perf_counter()
+        with app.app_context():
+            stn_labels = get_station_labels(worker_id=p_worker_id)
+        with stage_seconds.time(stage='diff'):
+            status_summary, insupd_summary = apply_day_diff(old_df, df, ea_datasource=f"hydro-{datestr}",
+                                                            stn_labels=stn_labels, worker_id=p_worker_id,
+                                                            transform_pool=transform_pool)
+        t1 = time.perf_counter()
+        stage_rows.inc(len(df), stage='diff')
+        record_load_summary(status_summary, insupd_summary)
+        log_day_summary(p_worker_id, datestr, status_summary, insupd_summary, len(df), t1 - t0)
+        day_loaded(r_date, filepath, rows=len(df), mode='diff', duration_s=t1 - t0,
+                   status_summary=status_summary, action_summary=insupd_summary, file_hash=file_hash)
+        return True
+
+    def load_day(datestr, df, p_worker_id):
+        """Load one downloaded day (df is None if there was no data)"""
+        if df is not None:
+            # Skip a day already loaded from an identical file (unless it is to be replaced regardless)
+            filepath = day_archive_file(datestr)
+            file_hash = file_sha256(filepath) if os.path.exists(filepath) else None
+            previous = previous_filepath(hydrology_readings_filepath(datestr))
+            if not force_replace_at_db and file_hash and day_file_unchanged(datetime.date.fromisoformat(datestr),
+                                                                              filepath, file_hash=file_hash):
+                logger.info(f"(T{p_worker_id}):Unchanged since last load, skipped: {datestr}")
+                if os.path.exists(previous):
+                    os.remove(previous)
+                return
+            if not (force_replace_at_db and bulk_method == 'copy'):
+                # rows are about to be upserted, deleted or diffed into the day - not possible in a compressed chunk
+                decompress_day(datetime.date.fromisoformat(datestr))
+            replace = force_replace_at_db
+            if incremental and not replace:
+                if os.path.exists(previous):
+                    try:
+                        if load_day_diff(datestr, df, previous, filepath, file_hash, p_worker_id):
+                            return
+                    finally:
+                        os.remove(previous)
+                # no usable previous copy - replace the day, so rows gone from the source go from the table too
+                logger.info(f"(T{p_worker_id}):No diff possible for {datestr} - replacing the day")
+                replace = True
+            if replace and bulk_method == 'copy':
+                # Whole day swap: COPY the day into a staging table, then drop the day's chunk and swap it in
+                logger.info(f"(T{p_worker_id}):Replacing hydrology data for {datestr} - {len(df)} rows")
+                t0 = time.perf_counter()
+                with app.app_context(), stage_seconds.time(stage='replace'):
+                    status_summary, insupd_summary = replace_day(df, datetime.date.fromisoformat(datestr),
+                                                                 ea_datasource=f"hydro-{datestr}",
+                                                                 stn_labels=get_station_labels(worker_id=p_worker_id),
+                                                                 worker_id=p_worker_id, transform_pool=transform_pool)
+                t1 = time.perf_counter()
+                stage_rows.inc(insupd_summary['copied'], stage='replace')
+                record_load_summary(status_summary, insupd_summary)
+                log_day_summary(p_worker_id, datestr, status_summary, insupd_summary, len(df), t1 - t0)
+                day_loaded(datetime.date.fromisoformat(datestr), filepath, rows=len(df),
+                           mode='replace+copy', duration_s=t1 - t0,
+                           status_summary=status_summary, action_summary=insupd_summary, file_hash=file_hash)
+                return
+            # Chunk checkpoints - a day left unfinished by an earlier run carries on from its committed chunks
+            checkpoint = DayCheckpoint(datetime.date.fromisoformat(datestr), file_hash, len(df),
+                                       bulk_load=replace or not date_in_db(datestr))
+            if replace and not checkpoint.resumed:
+                cleared = delete_for_date(datestr)
+                logger.info(
+                    f"(T{p_worker_id}):Cleared readings table for {datestr}:  {cleared}")
+            logger.info(
+                f"(T{p_worker_id}):Loading hydrology data for {datestr} - {len(df)} rows")
+            t0 = time.perf_counter()
+            # if the date does not exist in the database then it's safe to perform a (much faster) bulk load
+            bulk_load = checkpoint.bulk_load
+            status_summary, insupd_summary = threaded_insert(
+                                              df,
+                                              chunk_size=20000, max_workers=32,
+                                              ea_datasource=f"hydro-{datestr}",
+                                              app=app,
+                                              worker_id=p_worker_id,
+                                              bulk_load=bulk_load,
+                                              bulk_method=bulk_method,
+                                              upsert_method=upsert_method,
+                                              transform_pool=transform_pool,
+                                              checkpoint=checkpoint,
+                                              stop_event=stop_event
+                                             )
+            t1 = time.perf_counter()
+            log_day_summary(p_worker_id, datestr, status_summary, insupd_summary, len(df), t1 - t0, chunking(bulk_load))
+            if checkpoint.complete or (not bulk_load and upsert_method == 'merge' and not insupd_summary.get('failed')):
+                checkpoint.clear()
+            elif insupd_summary.get('cancelled'):
+                logger.warning(f"(T{p_worker_id}):Stopped part way through {datestr} - "
+                               f"{checkpoint.rows_done} of {len(df)} rows loaded (resume-hydrology-readings carries on)")
+            day_loaded(datetime.date.fromisoformat(datestr), filepath, rows=len(df),
+                       mode=load_mode(bulk_load, replace), duration_s=t1 - t0,
+                       status_summary=status_summary, action_summary=insupd_summary, file_hash=file_hash)
+            # logger.debug('Test load only')
+        else:
+            logger.warning(
+                f"(T{p_worker_id}):No hydrology data available for {datestr}")
+
+    def load_day_measured(datestr, df, p_worker_id):
+        with day_memory(datestr, p_worker_id):
+            load_day(datestr, df, p_worker_id)
+
     def worker(p_start_date, p_end_date, p_worker_id, xapp=None):
         with (xapp.app_context()):
             current_date = p_start_date
             while current_date <= p_end_date:
-                #if stop_event.is_set():
-                #    #logger.warning(f"(T{p_worker_id}): Stop signal received — exiting early at {current_date}")
-                #    return  # Exit cleanly
+                if cancelled(stop_event):
+                    logger.warning(f"(T{p_worker_id}): Stop signal received — exiting early at {current_date}")
+                    return  # Exit cleanly
 
                 datestr = current_date.strftime('%Y-%m-%d')
                 #logger.debug(f"++++ Loading data for {datestr}")
-                df = get_hydrology_readings(datestr, force_replace=force_replace)
-                #logger.debug(f"Obtained {len(df)} rows")
-
-                if df is not None:
-                    if force_replace_at_db:
-                        deleted_rows = delete_for_date(datestr)
-                        logger.info(
-                            f"(T{p_worker_id}):Deleted from readings table for {datestr}:  {deleted_rows} rows")
-                    logger.info(
-                        f"(T{p_worker_id}):Loading hydrology data for {datestr} - {len(df)} rows")
-                    t0 = time.perf_counter()
-                    # if the date does not exist in the database then it's safe to perform a (much faster) bulk load
-                    status_summary, insupd_summary = threaded_insert(
-                                                      df,
-                                                      chunk_size=20000, max_workers=32,
-                                                      ea_datasource=f"hydro-{datestr}",
-                                                      app=app,
-                                                      worker_id=p_worker_id,
-                                                      bulk_load= not date_in_db(datestr)
-                                                     )
-                    t1 = time.perf_counter()
-                    logger.info(f"(T{p_worker_id}):Status summary for {datestr}: {dict(sorted(status_summary.items()))}")
-                    logger.info(f"(T{p_worker_id}):Action summary for {datestr}: {dict(sorted(insupd_summary.items()))}")
-                    logger.info(f"(T{p_worker_id}):Process time   for {datestr}: {(t1 - t0):.1f}s - {int(len(df) / (t1 - t0))} rows/sec")
-                    # logger.debug('Test load only')
-                else:
-                    logger.warning(
-                        f"(T{p_worker_id}):No hydrology data available for {datestr}")
+                if streaming:
+                    with day_memory(datestr, p_worker_id):
+                        load_day_streaming(datestr, p_worker_id)
+                    current_date += datetime.timedelta(days=1)
+                    continue
+
+                with day_memory(datestr, p_worker_id):
+                    df = get_hydrology_readings(datestr, force_replace=force_replace, archive_format=archive_format,
+                                                keep_previous=incremental)
+                    #logger.debug(f"Obtained {len(df)} rows")
+                    load_day(datestr, df, p_worker_id)
+                    del df   # not held while the next day is read
                 current_date += datetime.timedelta(days=1)
 
 
@@ -302,17 +601,45 @@ def get_hydrology_readings_loop(upto:int = 3,
     #listener = keyboard.Listener(on_press=on_press)
     #listener.start()
 
-    if len(all_ranges) > 0:
+    if len(all_ranges) > 0 and prefetch_days > 0 and not streaming:
+        # Pipelined: download up to prefetch_days ahead while earlier days load
+        days = [start + datetime.timedelta(days=n)
+                for start, end in all_ranges for n in range((end - start).days + 1)]
+        logger.info(f"Kicking off {len(days)} days: {download_workers} download / {max_workers} load workers, "
+                    f"prefetch {prefetch_days}")
+        scheduler = PrefetchScheduler(
+            download=lambda d: get_hydrology_readings(d.strftime('%Y-%m-%d'), force_replace=force_replace,
+                                                      archive_format=archive_format, keep_previous=incremental),
+            load=lambda d, df, wid: load_day_measured(d.strftime('%Y-%m-%d'), df, wid),
+            download_workers=download_workers,
+            load_workers=max_workers,
+            queue_depth=prefetch_days,
+            load_context=app.app_context,
+            stop_event=stop_event
+        )
+        scheduler.run(days)
+    elif len(all_ranges) > 0:
         logger.info(f"Kicking off {len(all_ranges)} parallel tasks")
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             for worker_id, (start, end) in enumerate(all_ranges):
-                #print ('True' if stop_event.is_set() else 'False')
-                #if stop_event.is_set():
-                #    logger.warning("User requested stop — no more tasks will be submitted.")
-                #    break  # stop submitting new tasks
+                if cancelled(stop_event):
+                    logger.warning("User requested stop — no more tasks will be submitted.")
+                    break  # stop submitting new tasks
                 executor.submit(worker, start, end, worker_id, xapp=app)
                 #time.sleep(0.2)  #TEMP: allows time for 'q' to be detected
     #listener.stop()
+    if transform_pool is not None:
+        transform_pool.close()
+        logger.info(f"Transform pool: {transform_pool.stats()}")
+    logger.info(f"Notation registry: {get_notation_registry().stats()}")
+    logger.info(f"dateTime parsing: {get_datetime_parser().stats()}")
+    logger.info(f"EA API requests: {get_ea_client().timing_summary()}")
+    logger.info(f"Ingest stages: {stage_summary()}")
+    with app.app_context():
+        logger.info(f"Ingest database budget: {get_db_budget().stats()}")
+        write_ingest_metrics()
+    if cancelled(stop_event):
+        logger.warning("Stopped before completion - unfinished days resume with resume-hydrology-readings")
     logger.info("Completed processing")
 
 
@@ -326,30 +653,58 @@ def get_db_max_datetime() -> datetime.datetime:
 
 
 def get_db_min_max_dates() -> [datetime.date, datetime.date]:
+    """
+    First and last days loaded - from the ingest ledger once it has been seeded (see ledger_seeded), otherwise from
+    the readings table (an index lookup at each end of the hypertable)
+    """
     logger.debug(f"(hydro) Checking readings in db")
     db.session.remove()
-    # Get min r_date in the DB
-    min_r_date = db.session.query(func.min(ReadingHydro.r_datetime)).scalar().date()
-    #logger.debug(f"(hydro) min_r_date : {min_r_date}")
-
-    # Get max r_date in the DB
-    max_r_date = db.session.query(func.max(ReadingHydro.r_datetime)).scalar().date()
-    #logger.debug(f"(hydro) max_r_date : {max_r_date}")
-
-    # Total days in the range (inclusive)
-    num_dates = (max_r_date - min_r_date).days +1   #???
-    #logger.debug(f"(hydro) num_dates : {num_dates}")
-
-    # Count unique days present in the DB
-    present_dates = db.session.query(func.count(distinct(func.date(ReadingHydro.r_date)))).scalar()
-    #logger.debug(f"(hydro) present_dates : {present_dates}")
+    min_r_date, max_r_date = ledger_min_max_dates() if ledger_seeded() else (None, None)
+    source = 'Ledger has loads'
+    if min_r_date is None:
+        # Get min and max r_date in the DB
+        min_r_date = db.session.query(func.min(ReadingHydro.r_datetime)).scalar().date()
+        max_r_date = db.session.query(func.max(ReadingHydro.r_datetime)).scalar().date()
+        source = 'Db has readings'
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # Total days in the range (inclusive), and the number of missing dates
+        num_dates = (max_r_date - min_r_date).days + 1
+        missing_dates = len(get_db_missing_dates(min_r_date, max_r_date))
+        logger.debug(f"(hydro) {source} between {min_r_date} and {max_r_date} - {num_dates} days range ({missing_dates} missing)")
+    return [min_r_date, max_r_date]
 
-    # Calc the number of missing dates
-    missing_dates = num_dates - present_dates
-    #logger.debug(f"(hydro) missing_dates : {missing_dates}")
 
-    logger.debug(f"(hydro) Db has readings between {min_r_date} and {max_r_date} - {num_dates} days range ({missing_dates} missing)")
-    return [min_r_date, max_r_date]
+def get_db_missing_dates(start_date: datetime.date, end_date: datetime.date) -> list[datetime.date]:
+    """
+    Every day between start_date and end_date (inclusive, UTC days) with no readings, in one round trip per source.
+    From the first day in the ingest ledger on, read from the ledger (days without a successful load); before it
+    (days loaded before the ledger existed and not seeded), each calendar day is probed with an r_datetime range
+    (NOT EXISTS), so only the index of that day's chunk is touched.
+    """
+    ledger_start = ledger_start_date()
+    if ledger_start is None or ledger_start > end_date:
+        return readings_missing_dates(start_date, end_date)
+    if ledger_start <= start_date:
+        return ledger_missing_dates(start_date, end_date)
+    return (readings_missing_dates(start_date, ledger_start - datetime.timedelta(days=1))
+            + ledger_missing_dates(ledger_start, end_date))
+
+
+def readings_missing_dates(start_date: datetime.date, end_date: datetime.date) -> list[datetime.date]:
+    """Days between start_date and end_date (inclusive, UTC days) with no readings in the readings table"""
+    sql = text(f"""
+        SELECT d::date AS day
+          FROM generate_series(CAST(:start_date AS timestamp), CAST(:end_date AS timestamp), interval '1 day') AS d
+         WHERE NOT EXISTS (
+               SELECT 1
+                 FROM {readings_table_name()} r
+                WHERE r.r_datetime >= (d AT TIME ZONE 'UTC')
+                  AND r.r_datetime <  ((d + interval '1 day') AT TIME ZONE 'UTC'))
+         ORDER BY d
+    """)
+    rows = db.session.execute(sql, {'start_date': start_date, 'end_date': end_date}).fetchall()
+    return [row.day for row in rows]
 
 
 def get_start_end_dates(upto:int = 7) -> [datetime.date, datetime.date]:
@@ -374,24 +729,21 @@ def get_start_end_dates(upto:int = 7) -> [datetime.date, datetime.date]:
     return [start_date, end_date]
 
 def delete_readings_by_r_datetime(start_date, end_date):
-    # the beginning of the day at start_date, UTC aware
-    start_dt = date_to_utc_datetime(start_date, end_of_day=False)
-    # the end of the day at end_date, UTC aware
-    end_dt = date_to_utc_datetime(end_date, end_of_day=True)
-
     date_range = start_date if end_date == start_date else f"{start_date} to {end_date}"
     model = ReadingHydro
 
     try:
+        # A day at a time, so each day's chunk can be dropped rather than its rows deleted (see clear_day)
         logger.info(f"Deleting rows from {model.__name__} for {date_range}")
-        deleted = db.session.query(model).filter(
-            model.r_datetime >= start_dt,
-            model.r_datetime <= end_dt
-        ).delete(synchronize_session=False)
-        db.session.commit()
-        logger.info(f"Deleted {deleted} rows from {model.__name__} for {date_range}")
+        cleared = Counter()
+        current = start_date
+        while current <= end_date:
+            method, count = clear_day(current)
+            cleared[method] += count
+            current += datetime.timedelta(days=1)
+        logger.info(f"Deleted from {model.__name__} for {date_range}: "
+                    f"{cleared['drop_chunks']} chunks dropped, {cleared['delete']} rows deleted")
     except Exception as e:
-        db.session.rollback()
         logger.info(f"Error deleting rows from {model.__name__} for {date_range}: {e}")
 
 def date_to_utc_datetime(d: datetime.date, end_of_day:bool = False) -> datetime.datetime|None:
@@ -410,41 +762,116 @@ def threaded_insert(df:pd.DataFrame,
                     chunk_size:int = 500, max_workers:int = 16,
                     ea_datasource:str = 'EA',
                     app = None, worker_id = 0,
-                    bulk_load:bool = False
+                    bulk_load:bool = False,
+                    bulk_method:str = 'orm',
+                    upsert_method:str = 'values',
+                    transform_pool:TransformPool = None,
+                    checkpoint:DayCheckpoint = None,
+                    stop_event:threading.Event = None,
+                    adaptive:bool = True
                    ) -> (int, int):
+    """
+    Load a day of source readings into the readings table.
+    :param bulk_load: plain insert (the day must not already be in the table), otherwise insert/update
+    :param bulk_method: for bulk_load - 'copy' (COPY FROM STDIN, see readings_copy) or 'orm' (bulk_insert_mappings)
+    :param upsert_method: for ins/upd - 'merge' (staging table + one upsert, see readings_copy) or 'values' (per chunk)
+    :param transform_pool: transform in these worker processes (None = in the loader threads)
+    :param checkpoint: load only the rows it has pending, recording each committed chunk (not for 'merge')
+    :param stop_event: once set, no further chunk is started - the rows left are counted as 'cancelled'
+    :param adaptive: for the chunked (orm / 'values') loads - tune the chunk size and the chunks in flight as the
+                     load runs (see chunk_tuner), starting from chunk_size and at most max_workers (and the db budget)
+    :return: (status summary, action summary)
+    """
     logmark = f"(T{worker_id}):f{ea_datasource[-10:].replace('-', '')}"
-    chunks = [df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
-    logger.info(f'{logmark}: {len(chunks)} chunks to be processed ({"bulk load" if bulk_load else "ins/upd"})')
+    if bulk_load and bulk_method == 'copy':
+        with (app or current_app).app_context(), stage_seconds.time(stage='copy'):
+            total_status, total_insupd = copy_insert(df, ea_datasource=ea_datasource,
+                                                     stn_labels=get_station_labels(worker_id=worker_id),
+                                                     worker_id=worker_id,
+                                                     transform_pool=transform_pool,
+                                                     checkpoint=checkpoint,
+                                                     stop_event=stop_event)
+        stage_rows.inc(total_insupd['copied'], stage='copy')
+        record_load_summary(total_status, total_insupd)
+        return total_status, total_insupd
+    if not bulk_load and upsert_method == 'merge':
+        with (app or current_app).app_context(), stage_seconds.time(stage='merge'):
+            total_status, total_insupd = merge_insert(df, ea_datasource=ea_datasource,
+                                                      stn_labels=get_station_labels(worker_id=worker_id),
+                                                      worker_id=worker_id,
+                                                      transform_pool=transform_pool)
+        stage_rows.inc(total_insupd['inserted'] + total_insupd['updated'] + total_insupd['unchanged'], stage='merge')
+        record_load_summary(total_status, total_insupd)
+        return total_status, total_insupd
+
+    # [start, end) row ranges - all of the day, or what a checkpoint still has pending - cut into chunks as they go
+    ranges = deque(checkpoint.pending_ranges() if checkpoint is not None else [(0, len(df))])
+    total_rows = sum(end - start for start, end in ranges)
+
+    def take_chunk(rows:int) -> (int, int):
+        start, end = ranges[0]
+        stop = min(start + rows, end)
+        if stop == end:
+            ranges.popleft()
+        else:
+            ranges[0] = (stop, end)
+        return start, stop
 
     # Save the current app context
     if app is None:
         # noinspection PyProtectedMember
         app = current_app._get_current_object()
-    status_res = [None] * len(chunks)
-    insupd_res = [None] * len(chunks)
+    status_res = []
+    insupd_res = []
 
     with app.app_context():
         stn_labels = get_station_labels(worker_id=worker_id)  # load once
-
-    def run_in_app_context(chunk, chunk_num, labels, source:str = 'EA'):
-        with app.app_context():
+        db_budget = get_db_budget()   # shared with every other day worker - caps total db concurrency
+    ceiling = max(1, min(max_workers, db_budget.limit))
+    tuner = get_chunk_tuner('bulk' if bulk_load else 'upsert', chunk_rows=chunk_size) if adaptive else None
+    chunk_rows, in_flight = tuner.plan(ceiling) if tuner is not None else (chunk_size, ceiling)
+    mode = 'bulk' if bulk_load else 'upsert'
+    logger.info(f'{logmark}: {total_rows} rows to be processed ({"bulk load" if bulk_load else "ins/upd"}) - '
+                f'{"adaptive, from " if adaptive else ""}{chunk_rows} rows/chunk, {in_flight} in flight')
+
+    def run_in_app_context(start, end, chunk_num, labels, source:str = 'EA') -> int:
+        chunk = df.iloc[start:end]
+        if cancelled(stop_event):
+            insupd_res.append(Counter({'cancelled': len(chunk)}))
+            chunk_results.inc(mode=mode, result='cancelled')
+            return len(chunk)
+        t0 = time.perf_counter()
+        with app.app_context(), db_budget.slot() as slot_wait:
             #logger.debug(f'{logmark}: Going to insert_chunk({chunk_num})')
-            status_res[chunk_num], insupd_res[chunk_num] = insert_chunk(chunk, chunk_num, stn_labels=labels, ea_datasource=source, bulk_load=bulk_load)
-            #if status_results[0] != 500:
-            #    logger.info(f'{logmark}: chunk {chunk_num} status= {status_results}')
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        with tqdm(total=len(chunks), desc="Processing chunks", unit="chunk", ncols=133) as pbar:
-            futures = [
-                executor.submit(run_in_app_context, chunk, i, stn_labels, ea_datasource)
-                for i, chunk in enumerate(chunks)
-            ]
-            for future in futures:
-                future.result()
-                #logger.info(f'{logmark}: chunk {i} to be inserted')
-                #executor.submit(insert_chunk_full, chunk, i)
-                pbar.update(1)
-        logger.info(f"{logmark}: All parallel tasks have completed.")
+            status, insupd = insert_chunk(chunk, chunk_num, stn_labels=labels, ea_datasource=source, bulk_load=bulk_load,
+                                          transform_pool=transform_pool,
+                                          checkpoint=checkpoint, row_range=(start, end))
+        elapsed = time.perf_counter() - t0
+        status_res.append(status)
+        insupd_res.append(insupd)
+        chunk_seconds.observe(elapsed, mode=mode)
+        chunk_results.inc(mode=mode, result='failed' if insupd.get('failed') else 'ok')
+        if tuner is not None and not insupd.get('failed'):
+            tuner.record(len(chunk), elapsed, slot_wait)
+        return len(chunk)
+
+    chunk_num = 0
+    with ThreadPoolExecutor(max_workers=ceiling) as executor:
+        with tqdm(total=total_rows, desc="Processing chunks", unit="row", ncols=133) as pbar:
+            running = set()
+            while ranges or running:
+                if cancelled(stop_event) and ranges:
+                    insupd_res.append(Counter({'cancelled': sum(end - start for start, end in ranges)}))
+                    ranges.clear()
+                chunk_rows, in_flight = tuner.plan(ceiling) if tuner is not None else (chunk_size, ceiling)
+                while ranges and len(running) < in_flight:
+                    start, end = take_chunk(chunk_rows)
+                    running.add(executor.submit(run_in_app_context, start, end, chunk_num, stn_labels, ea_datasource))
+                    chunk_num += 1
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pbar.update(future.result())
+        logger.info(f"{logmark}: All {chunk_num} parallel tasks have completed.")
 
     # Aggregate all counters
     total_status = Counter()
@@ -457,10 +884,79 @@ def threaded_insert(df:pd.DataFrame,
         if status:
             total_insupd.update(status)
 
+    record_load_summary(total_status, total_insupd)
     return total_status, total_insupd
 
 
-
+def check_hydrology_transform(start_date: datetime.date,
+                              end_date: datetime.date = None,
+                              chunk_size: int = 20000,
+                              max_rows: int = 0,
+                              processes: int = 0
+                             ) -> int:
+    """
+    Parity check of the column-wise readings transform against the original per-row code, using archived day files.
+    :param start_date: first day to check
+    :param end_date: last day to check (defaults to start_date)
+    :param chunk_size: rows per compared chunk (as threaded_insert)
+    :param max_rows: only check the first max_rows of each day (0 = the whole day)
+    :param processes: check the transform as run in a TransformPool of this many processes (0 = in process)
+    :return: total number of mismatched rows
+    """
+    end_date = end_date or start_date
+    stn_labels = get_station_labels()
+    total_mismatched = 0
+    if not get_notation_registry().preloaded:
+        preload_notation_registry()
+    transform_pool = TransformPool(processes=processes, stn_labels=stn_labels) if processes > 0 else None
+
+    current_date = start_date
+    while current_date <= end_date:
+        datestr = current_date.strftime('%Y-%m-%d')
+        df = get_hydrology_readings(datestr, prefer_parquet=False)   # the per-row code expects csv strings
+        if df is None:
+            logger.warning(f"No hydrology data available for {datestr}")
+        else:
+            if max_rows:
+                df = df.iloc[:max_rows]
+            rows = mismatched = 0
+            status_ok = True
+            for i in range(0, len(df), chunk_size):
+                result = check_transform_parity(df.iloc[i:i + chunk_size], stn_labels=stn_labels, ea_datasource=f"hydro-{datestr}",
+                                                transform_pool=transform_pool)
+                rows += result['rows']
+                mismatched += result['mismatched_rows']
+                status_ok = status_ok and result['status_match']
+                for example in result['examples']:
+                    logger.warning(f"Transform mismatch for {datestr} (chunk row {i + example['row']}): {example['diffs']}")
+            logger.info(f"Transform parity for {datestr}: {rows} rows, {mismatched} mismatched, status counts {'match' if status_ok else 'DIFFER'}")
+            total_mismatched += mismatched + (0 if status_ok else 1)
+        current_date += datetime.timedelta(days=1)
+
+    if transform_pool is not None:
+        transform_pool.close()
+    return total_mismatched
+
+
+def benchmark_hydrology_datetime(datestr: str,
+                                 save_basefolder: str = "readings_hydrology",
+                                 max_rows: int = 0,
+                                 repeat: int = 3
+                                ) -> dict|None:
+    """
+    Benchmark parsing the dateTime column of an archived day file - dateutil per row, pandas ISO8601
+    and the DatetimeColumnParser used by the transform (see utils_date.benchmark_datetime_parsing).
+    :param max_rows: only use the first max_rows of the file (0 = the whole day)
+    :return: timings, or None if the day file is not in the archive
+    """
+    filepath = os.path.join(save_basefolder, datestr[:4], f'hydro-{datestr}.csv')
+    if not os.path.exists(filepath):
+        logger.warning(f"No archived hydrology file for {datestr}: {filepath}")
+        return None
+    values = pd.read_csv(filepath, usecols=['dateTime'], dtype=str, nrows=max_rows or None)['dateTime']
+    result = benchmark_datetime_parsing(values, repeat=repeat)
+    logger.info(f"dateTime parsing benchmark for {datestr}: {result}")
+    return result
 
 
 def get_scoped_session():
@@ -468,53 +964,19 @@ def get_scoped_session():
     return scoped_session(session_factory)
 
 
-def parse_float_safe(val: str, min_val: float =-9999999.0, max_val:float =9999999.0) -> (float|None, int) :
-    try:
-        # Catch actual NaN objects (e.g., from pandas, float('nan'), numpy.nan)
-        if pd.isna(val):
-            return None, 1  # actual NaN detected
-
-        # Handle string "nan" explicitly
-        if isinstance(val, str):
-            val = val.strip()
-            if val.lower() == "nan":
-                return None, 2
-
-        f = float(val)
-        if math.isnan(f):
-            return None, 3  # float('nan') slipped through
-
-        # noinspection PyUnreachableCode
-        if 1==1:  #min_val <= f <= max_val:
-            return f, 0     # normal - the vast majority will return from here
-        else:
-            logger.error(f"Out-of-range value: {val}")
-            return None, 4  # Out-of-range value
-    except (TypeError, ValueError):
-        try:
-            if isinstance(val, str) and "|" in val:
-                val = val.split("|")[-1]  # get last part after '|'
-            else:
-                logger.error(f"Invalid float value: {val}")
-                return None, 5  # Invalid float value
-
-            f = float(val)
-            if min_val <= f <= max_val:
-                return f, 6    # split: normal
-            else:
-                logger.error(f"Out-of-range value: {val}")
-                return None, 7  # split: Out-of-range value
-        except (TypeError, ValueError):
-            logger.exception(f"Invalid float value: {val}")
-            return None, 8      # split: Out-of-range value
-
-
 def insert_chunk(chunk_df: pd.DataFrame,
                  chunk_num: int,
                  stn_labels = None,
                  ea_datasource:str = 'EA',
-                 bulk_load:bool = False
+                 bulk_load:bool = False,
+                 transform_pool:TransformPool = None,
+                 checkpoint:DayCheckpoint = None,
+                 row_range:tuple[int, int] = None
                 ) -> (dict, dict):
+    """
+    Transform and write one chunk in one transaction.
+    :param checkpoint: DayCheckpoint - the chunk's row_range (in the day file) is recorded in the same transaction
+    """
     #from . import get_fieldvalue_for_db  # string converter
 
     session = get_scoped_session()
@@ -522,74 +984,17 @@ def insert_chunk(chunk_df: pd.DataFrame,
     status_counter = Counter()
     insupd_counter = Counter()
     try:
-        readings = []
-        for _, row in chunk_df.iterrows():
-
-            dtm = row.get("dateTime")
-            if isinstance(dtm, str):  # a string (as it is when read from a csv file)
-                r_datetime = parse(dtm)
-            elif pd.notnull(dtm):
-                r_datetime = dtm  # already a datetime (as it is when read from a database table)
-            else:
-                r_datetime = None
-
-            r_month = r_datetime.replace(day=1).date() if r_datetime else None
-            #r_date  = r_datetime.date() if r_datetime else None
-
-            measure = row.get("measure", '')
-            notation = measure.replace(f'{ea_root_url}/id/measures/', '').strip() if isinstance(measure, str) else None
-
-            parsed = parse_notation(notation)
-            label = stn_labels.get(parsed.get("station_id")) if stn_labels else None
-
-            val, status = parse_float_safe(row.get("value"))
-            status_counter[status] += 1
-
-            # handles missing or None/NaN values in period column - sets all of these to 0
-            period_str = row.get("period", 0)
-            try:
-                # handle NaN or missing
-                if pd.isna(period_str):
-                    period = 0
-                else:
-                    period = int(float(period_str))
-            except (ValueError, TypeError):
-                period = 0
-
-            reading = {
-                'source' : ea_datasource,
-                'r_datetime' : r_datetime,
-                'r_month' : r_month,
-                'r_date' : row.get("date"),
-
-                'measure' : measure,
-                'notation' : notation,
-                'label' : label,
-
-                # Value
-                'value' : val,
-
-                # Data quality attributes
-                'completeness' : row.get("completeness"),
-                'quality' : row.get("quality"),
-                'qcode' : row.get("qcode"),
-                'valid' : row.get("valid"),
-                'invalid' : row.get("invalid"),
-                'missing' : row.get("missing"),
-
-                # Parsed "notation" fields (from "measure" in sources data)
-                'station_id': parsed.get("station_id") if parsed else None,
-                'parameter_name': parsed.get("parameter_name") if parsed else None,
-                'parameter': parsed.get("parameter") if parsed else None,
-                'qualifier': parsed.get("qualifier") if parsed else None,
-                'value_type': parsed.get("value_type") if parsed else None,
-                'period_name': parsed.get("period_name") if parsed else None,
-                'unit_name': parsed.get("unit_name") if parsed else None,
-                'observation_type': parsed.get("observation_type") if parsed else None,
-                'updated': None
-            }
-
-            readings.append(reading)
+        # Column-wise transform of the whole chunk (replaces the original iterrows loop)
+        t0 = time.perf_counter()
+        if transform_pool is not None:
+            frame, value_status = transform_pool.transform(chunk_df, ea_datasource=ea_datasource)
+        else:
+            frame, value_status = transform_readings_chunk(chunk_df, stn_labels=stn_labels, ea_datasource=ea_datasource)
+        status_counter.update(value_status)
+        readings = readings_to_records(frame)
+        stage_seconds.observe(time.perf_counter() - t0, stage='transform')
+        stage_rows.inc(len(readings), stage='transform')
+        t0 = time.perf_counter()
 
         #logger.info(f'Chunk {chunk_num}: generated - {len(readings)} records')
         #logger.debug(f"Readings generated: {readings[:2]}")  # Print first two for inspection
@@ -635,85 +1040,23 @@ def insert_chunk(chunk_df: pd.DataFrame,
             insupd_counter['updated']  = sum(1 for row in rows if row.xmax != 0)  # Updated rows
             #logger.debug(f"Chunk {chunk_num}: Inserted rows: {insupd_counter['inserted']}, Updated rows: {insupd_counter['updated']}")
 
+        if checkpoint is not None:
+            checkpoint.record(session, *row_range, status_counter, insupd_counter)
         session.commit()
+        if checkpoint is not None:
+            checkpoint.mark_done(*row_range)
+        stage_seconds.observe(time.perf_counter() - t0, stage='write')
+        stage_rows.inc(len(readings), stage='write')
         #t1 = time.perf_counter()
         #logger.info(f"DB insert time for chunk {chunk_num}: {t1 - t0:.2f}s")
         #logger.info(f"Chunk {chunk_num}: inserted {len(readings)} records")
     except Exception as e:
         session.rollback()
         logger.exception(f"Chunk {chunk_num}: failed with error: {e}")
+        insupd_counter['failed'] = len(chunk_df)
     finally:
         session.remove()
         #logger.info(f"Chunk {chunk_num} value statuses: {dict(status_counter)}")
         return status_counter, insupd_counter
 
 
-
-def parse_notation(notation):
-    if not notation or not isinstance(notation, str):
-        logger.debug(f"Skipping invalid notation: {notation!r}")
-        return None
-
-    parts = notation.rsplit('-', 10)
-    n_dashes = len(parts) - 1
-    try:
-        if n_dashes == 3:
-            # example
-            # E01591A-ph-i-subdaily
-            return {
-                'station_id': parts[0],
-                'parameter': parts[1],
-                'value_type': parts[2],
-                'period_name': parts[3]
-            }
-        elif n_dashes == 4:
-            # example
-            # E02763A-bga-i-subdaily-rfu
-            return {
-                'station_id': parts[0],
-                'parameter': parts[1],
-                'value_type': parts[2],
-                'period_name': parts[3],
-                'unit_name': parts[4]
-            }
-        elif n_dashes == 9:
-            # example
-            # ac462a74-4fe2-41d7-a35b-e51ffd6c9a0f-level-i-900-m-qualified
-            # 2c14fcb6-21f3-47ca-8e50-14c68d23e5fb_SE52HCL1SS-gw-dipped-i-mAOD-qualified
-            if '-'.join(parts[5:7]) == 'gw-dipped':
-                return {
-                    'station_id': '-'.join(parts[:5]),
-                    'parameter': parts[5],
-                    'qualifier': parts[6],
-                    'value_type': parts[7],
-                    'unit_name': parts[8],
-                    'observation_type': parts[9]
-            }
-            else:
-                return {
-                    'station_id': '-'.join(parts[:5]),
-                    'parameter': parts[5],
-                    'value_type': parts[6],
-                    'period_name': parts[7],
-                    'unit_name': parts[8],
-                    'observation_type': parts[9]
-                }
-        elif n_dashes == 10:
-            # example
-            # 1cdd6e48-7bcb-4f32-b8a8-3500a8a352b0-gw-logged-i-subdaily-mAOD-qualified
-            return {
-                'station_id': '-'.join(parts[:5]),
-                'parameter': parts[5],
-                'qualifier': parts[6],
-                'value_type': parts[7],
-                'period_name': parts[8],
-                'unit_name': parts[9],
-                'observation_type': parts[10]
-            }
-
-        # if it gets this far and has not yet returned a dict, then
-        logger.warning(f"Unrecognized notation format: '{notation}' ({n_dashes} dashes)")
-
-    except Exception as e:
-        logger.debug(f"Error parsing notation '{notation}': {e}")
-    return None  # fallback for unknown format or error
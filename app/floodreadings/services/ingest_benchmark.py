@@ -0,0 +1,343 @@
+# app/floodreadings/services/ingest_benchmark.py
+# Offline ingest benchmark: synthetic HYDROLOGY API day files (every notation shape parse_notation handles,
+# 'a|b' values, NaNs, millions of rows) and timings of each ingest stage, appended to a JSON history
+
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.engine import make_url
+
+from app import db
+from app.utils.ea_client import hydrology_root_url as ea_root_url
+from ..models import HydIngestLedger, HydIngestCheckpoint
+from .readings_transform import (parse_float_safe, parse_float_column, transform_readings_chunk,
+                                 readings_to_records)
+from .notation_registry import parse_notation, NotationRegistry
+from .readings_copy import clear_day
+from .readings_stream import hydrology_readings_filepath
+from .readings_archive import read_csv_day, parquet_filepath
+from .readings_rollups import refresh_rollups
+from .hydrology_readings import threaded_insert, get_hydrology_readings_loop, get_station_labels
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# annotate the proxy so the IDE knows its real type
+from werkzeug.local import LocalProxy
+current_app: LocalProxy
+
+# Synthetic days are dated in this year so they can never overlap real readings (and are cleared afterwards)
+BENCHMARK_YEAR = 2099
+
+# Database hosts taken to be a local stand-in (None / '' = a unix socket)
+LOCAL_DB_HOSTS = (None, '', 'localhost', '127.0.0.1', '::1')
+
+
+def benchmark_database_host() -> (str, bool):
+    """Host (and database) of the configured database, and whether it is local - the only kind written to by default"""
+    url = make_url(current_app.config['SQLALCHEMY_DATABASE_URI'])
+    return f"{url.host or 'local socket'}/{url.database}", url.host in LOCAL_DB_HOSTS
+
+# (share of measures, notation template) - one of each shape parse_notation handles, and a few it doesn't
+NOTATION_SHAPES = [
+    (0.40, '{station}-level-i-900-m-qualified'),                   # 9 dashes (guid station)
+    (0.20, '{code}-flow-i-900-m3s'),                               # 4 dashes
+    (0.15, '{code}-rainfall-t-900-mm'),                            # 4 dashes
+    (0.10, '{code}-ph-i-subdaily'),                                # 3 dashes
+    (0.07, '{station}-gw-logged-i-subdaily-mAOD-qualified'),       # 10 dashes
+    (0.07, '{station}_{code}-gw-dipped-i-mAOD-qualified'),         # 9 dashes, gw-dipped
+    (0.01, '{code}-unknown'),                                      # unrecognised
+]
+QUALITY = ['Good', 'Good', 'Good', 'Good', 'Estimated', 'Suspect', 'Unchecked', 'Missing']
+COMPLETENESS = ['Complete', 'Complete', 'Complete', 'Incomplete']
+
+
+def synthetic_notations(measures: int, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    shares = np.array([share for share, _ in NOTATION_SHAPES])
+    shapes = rng.choice(len(NOTATION_SHAPES), size=measures, p=shares / shares.sum())
+    notations = []
+    for i, shape in enumerate(shapes):
+        station = '-'.join(f'{rng.integers(0, 16 ** n):0{n}x}' for n in (8, 4, 4, 4, 12))
+        notations.append(NOTATION_SHAPES[shape][1].format(station=station, code=f'E{i:05d}A'))
+    return notations
+
+
+def generate_day(datestr: str,
+                 rows: int = 1000000,
+                 measures: int = 5000,
+                 nan_share: float = 0.02,
+                 pipe_share: float = 0.01,
+                 seed: int = 0
+                ) -> pd.DataFrame:
+    """
+    A synthetic day file, as read from the csv (all strings): each measure has a regular series across the day.
+    :param nan_share: values left empty or written as 'nan'
+    :param pipe_share: values written 'a|b' (as the API does for some multi-valued readings)
+    """
+    rng = np.random.default_rng(seed)
+    notations = synthetic_notations(measures, seed)
+    per_measure = max(1, -(-rows // measures))
+    interval = max(1, 86400 // per_measure)
+    # per measure and per time step values, then repeated out to the rows (formatting millions of strings is slow)
+    measure_idx = np.repeat(np.arange(measures), per_measure)[:rows]
+    step_idx = np.tile(np.arange(per_measure), measures)[:rows]
+    stamps = (pd.Timestamp(datestr) + pd.to_timedelta((np.arange(per_measure) * interval) % 86400, unit='s'))\
+             .strftime('%Y-%m-%dT%H:%M:%S').to_numpy(dtype=object)
+    urls = np.array([f'{ea_root_url}/id/measures/{n}' for n in notations], dtype=object)
+    periods = np.array([None if 'subdaily' in n else '900' for n in notations], dtype=object)
+
+    values = np.round(rng.normal(10, 5, size=rows), 3).astype(str).astype(object)
+    special = rng.random(rows)
+    values[special < nan_share / 2] = np.nan
+    values[(special >= nan_share / 2) & (special < nan_share)] = 'nan'
+    pipes = (special >= nan_share) & (special < nan_share + pipe_share)
+    values[pipes] = [f'{v}|{v}' for v in values[pipes]]
+
+    return pd.DataFrame({
+        'measure': urls[measure_idx],
+        'date': datestr,
+        'dateTime': stamps[step_idx],
+        'value': values,
+        'completeness': np.array(COMPLETENESS, dtype=object)[rng.integers(0, len(COMPLETENESS), size=rows)],
+        'quality': np.array(QUALITY, dtype=object)[rng.integers(0, len(QUALITY), size=rows)],
+        'qcode': None,
+        'valid': '1',
+        'invalid': '0',
+        'missing': '0',
+        'period': periods[measure_idx],
+    })
+
+
+def write_day_file(df: pd.DataFrame, datestr: str, save_basefolder: str = "readings_hydrology") -> str:
+    """Write a synthetic day where the readings loop looks for the archived day file. :return: its path"""
+    filepath = hydrology_readings_filepath(datestr, save_basefolder)
+    df.to_csv(filepath, index=False)
+    return filepath
+
+
+def _rate(rows: int, seconds: float) -> dict:
+    return {'s': round(seconds, 3), 'rows/sec': int(rows / seconds) if seconds > 0 else None}
+
+
+def bench_parse_notation(notations: list[str], calls: int = 200000) -> dict:
+    """parse_notation per call, and the memoized NotationRegistry (as ingest uses it)"""
+    sample = [notations[i % len(notations)] for i in range(calls)]
+    level = logger.level
+    logger.setLevel(logging.ERROR)   # not a warning per call for the unrecognised shapes (the registry logs once)
+    try:
+        t0 = time.perf_counter()
+        for notation in sample:
+            parse_notation(notation)
+        parse_s = time.perf_counter() - t0
+    finally:
+        logger.setLevel(level)
+    registry = NotationRegistry()
+    t0 = time.perf_counter()
+    for notation in sample:
+        registry.lookup(notation)
+    registry_s = time.perf_counter() - t0
+    return {'calls': calls, 'parse_notation': _rate(calls, parse_s), 'registry': _rate(calls, registry_s)}
+
+
+def bench_parse_float(values: pd.Series, rowwise_rows: int = 200000) -> dict:
+    """parse_float_safe per value (on a sample) and parse_float_column on the whole column"""
+    sample = values.iloc[:rowwise_rows]
+    t0 = time.perf_counter()
+    for value in sample:
+        parse_float_safe(value)
+    rowwise_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    parse_float_column(values)
+    column_s = time.perf_counter() - t0
+    return {'parse_float_safe': _rate(len(sample), rowwise_s), 'parse_float_column': _rate(len(values), column_s)}
+
+
+def bench_transform(df: pd.DataFrame, stn_labels: dict|None, chunk_size: int = 20000) -> dict:
+    """The transform done by insert_chunk: transform_readings_chunk then readings_to_records, chunk by chunk"""
+    transform_s = records_s = 0.0
+    for i in range(0, len(df), chunk_size):
+        t0 = time.perf_counter()
+        frame, _ = transform_readings_chunk(df.iloc[i:i + chunk_size], stn_labels=stn_labels, ea_datasource='bench')
+        t1 = time.perf_counter()
+        readings_to_records(frame)
+        records_s += time.perf_counter() - t1
+        transform_s += t1 - t0
+    return {'transform_readings_chunk': _rate(len(df), transform_s), 'readings_to_records': _rate(len(df), records_s)}
+
+
+def bench_read(df: pd.DataFrame) -> dict:
+    """Reading the day back from csv: all columns as strings (as before) against read_csv_day"""
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        filepath = os.path.join(folder, 'day.csv')
+        df.to_csv(filepath, index=False)
+        for name, read in (('read_csv_str', lambda: pd.read_csv(filepath, low_memory=False, dtype=str)),
+                           ('read_csv_day', lambda: read_csv_day(filepath))):
+            t0 = time.perf_counter()
+            frame = read()
+            results[name] = {**_rate(len(frame), time.perf_counter() - t0),
+                             'frame_mb': round(float(frame.memory_usage(deep=True).sum()) / 2**20, 1)}
+            del frame
+    return results
+
+
+def _clear_benchmark_day(day: datetime.date):
+    """Remove every trace of a synthetic day from the database"""
+    clear_day(day)
+    db.session.execute(delete(HydIngestLedger).where(HydIngestLedger.r_date == day))
+    db.session.execute(delete(HydIngestCheckpoint).where(HydIngestCheckpoint.r_date == day))
+    db.session.commit()
+    refresh_rollups(day)
+
+
+def bench_database(df: pd.DataFrame, day: datetime.date, methods: list[str], max_workers: int = 32) -> dict:
+    """
+    threaded_insert into the configured database, per method: 'copy' / 'orm' (bulk load of an empty day)
+    and 'merge' / 'values' (upsert over the day as loaded - every row unchanged). The day is cleared afterwards.
+    """
+    app = current_app._get_current_object()
+    datestr = day.isoformat()
+    results = {}
+    _clear_benchmark_day(day)
+    try:
+        for method in methods:
+            bulk_load = method in ('copy', 'orm')
+            if bulk_load:
+                _clear_benchmark_day(day)
+            t0 = time.perf_counter()
+            _, insupd = threaded_insert(df, chunk_size=20000, max_workers=max_workers,
+                                        ea_datasource=f"hydro-{datestr}", app=app,
+                                        bulk_load=bulk_load,
+                                        bulk_method=method if bulk_load else 'copy',
+                                        upsert_method=method if not bulk_load else 'merge')
+            results[f'threaded_insert_{method}'] = {**_rate(len(df), time.perf_counter() - t0),
+                                                    'failed': int(insupd.get('failed', 0))}
+    finally:
+        _clear_benchmark_day(day)
+    return results
+
+
+def bench_loop(df: pd.DataFrame, day: datetime.date, save_basefolder: str = "readings_hydrology") -> dict:
+    """The full per-day loop (archived file read, bulk load, ledger, rollups) on the synthetic day file"""
+    app = current_app._get_current_object()
+    filepath = write_day_file(df, day.isoformat(), save_basefolder)
+    _clear_benchmark_day(day)
+    try:
+        t0 = time.perf_counter()
+        get_hydrology_readings_loop(app=app, days=[day], bulk_method='copy')
+        return {'loop': _rate(len(df), time.perf_counter() - t0)}
+    finally:
+        _clear_benchmark_day(day)
+        for path in (filepath, parquet_filepath(filepath)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _git_commit() -> str|None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _flatten(results: dict, prefix: str = '') -> dict:
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{name}.'))
+        else:
+            flat[f'{prefix}{name}'] = value
+    return flat
+
+
+def compare_runs(current: dict, previous: dict, threshold: float = 0.10) -> list[str]:
+    """rows/sec figures more than threshold lower than in the previous comparable run"""
+    now, before = _flatten(current['results']), _flatten(previous['results'])
+    regressions = []
+    for name, value in now.items():
+        old = before.get(name)
+        if name.endswith('rows/sec') and value and old and value < old * (1 - threshold):
+            regressions.append(f"{name}: {old} -> {value} ({100 * (value / old - 1):+.0f}%)")
+    return regressions
+
+
+def run_ingest_benchmark(rows: int = 1000000,
+                         measures: int = 5000,
+                         with_db: bool = False,
+                         methods: list[str] = ('copy', 'merge'),
+                         loop: bool = False,
+                         history_file: str = "benchmark_history/ingest.json",
+                         seed: int = 0,
+                         allow_remote_db: bool = False
+                        ) -> dict:
+    """
+    Generate a synthetic day and time each ingest stage; the run is appended to history_file.
+    :param with_db: also time threaded_insert (per method) against the configured database - a local
+                    Postgres/Timescale stand-in; the synthetic day (in BENCHMARK_YEAR) is removed afterwards
+    :param loop: with with_db, also time the full per-day loop
+    :param allow_remote_db: with_db even though the database is not local. While the benchmark runs, the
+                            readings table's latest day is in BENCHMARK_YEAR (a concurrent -latest run sees it),
+                            and the ledger, checkpoints and rollups of that day are written and removed
+    :return: the run record, with 'regressions' against the previous run of the same size
+    """
+    if with_db:
+        host, local = benchmark_database_host()
+        if not (local or allow_remote_db):
+            raise ValueError(f"{host} is not a local database - the benchmark writes to the readings, ledger and "
+                             f"rollup tables; point SQLALCHEMY_DATABASE_URI at a local stand-in")
+    day = datetime.date(BENCHMARK_YEAR, 1, 1)
+    t0 = time.perf_counter()
+    df = generate_day(day.isoformat(), rows=rows, measures=measures, seed=seed)
+    generate_s = time.perf_counter() - t0
+    logger.info(f"Ingest benchmark: synthetic day of {len(df)} rows, {measures} measures in {generate_s:.1f}s")
+
+    notations = df['measure'].drop_duplicates().str.replace(f'{ea_root_url}/id/measures/', '', regex=False).tolist()
+    stn_labels = get_station_labels() if with_db else None
+    results = {
+        'parse_notation': bench_parse_notation(notations),
+        'parse_float': bench_parse_float(df['value']),
+        'read': bench_read(df),
+        'transform': bench_transform(df, stn_labels),
+    }
+    if with_db:
+        results['database'] = bench_database(df, day, list(methods))
+        if loop:
+            results['database'].update(bench_loop(df, day))
+
+    run = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'params': {'rows': len(df), 'measures': measures, 'with_db': with_db, 'methods': list(methods),
+                   'loop': loop, 'seed': seed},
+        'results': results,
+    }
+
+    history = []
+    if os.path.exists(history_file):
+        with open(history_file) as f:
+            history = json.load(f)
+    previous = next((r for r in reversed(history) if r.get('params') == run['params']), None)
+    run['regressions'] = compare_runs(run, previous) if previous else []
+    for regression in run['regressions']:
+        logger.warning(f"Ingest benchmark regression since {previous['commit'] or previous['timestamp']}: {regression}")
+
+    history.append(run)
+    os.makedirs(os.path.dirname(history_file) or '.', exist_ok=True)
+    with open(f'{history_file}.part', 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(f'{history_file}.part', history_file)
+    return run
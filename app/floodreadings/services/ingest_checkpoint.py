@@ -0,0 +1,134 @@
+# app/floodreadings/services/ingest_checkpoint.py
+# Chunk-level checkpoints of day loads (so an interrupted backfill resumes where it stopped)
+# and the cooperative cancel signal checked between chunks
+
+import datetime
+import json
+import threading
+
+from sqlalchemy import delete, select, distinct
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from ..models import HydIngestCheckpoint, HydIngestLedger
+from .ingest_ledger import PARTIAL
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+
+class IngestCancelled(Exception):
+    """Raised inside a load when the stop signal is seen (the work in hand is rolled back, not checkpointed)"""
+
+
+def cancelled(stop_event: threading.Event|None) -> bool:
+    return stop_event is not None and stop_event.is_set()
+
+
+class DayCheckpoint:
+    """
+    The row ranges of a day file already committed to the readings table.
+    Checkpoints are only reused for the same file (by hash); ranges are marked done from any thread, without
+    needing an app context. Construct in an app context.
+    """
+    def __init__(self, r_date: datetime.date, file_hash: str|None, total_rows: int, bulk_load: bool):
+        """
+        :param bulk_load: the load mode for a fresh day - a resumed day keeps the mode it was started with
+        """
+        self.r_date = r_date
+        self.file_hash = file_hash
+        self.total_rows = total_rows
+        self.bulk_load = bulk_load
+        self._engine = db.engine
+        self._lock = threading.Lock()
+        self.done: list[tuple[int, int]] = []
+        self._load()
+
+    def _load(self):
+        table = HydIngestCheckpoint.__table__
+        with self._engine.begin() as conn:
+            rows = conn.execute(select(table).where(table.c.r_date == self.r_date)).fetchall()
+            if rows and any(r.file_hash != self.file_hash or r.total_rows != self.total_rows for r in rows):
+                logger.info(f"Checkpoints for {self.r_date} are for a different day file - starting the day again")
+                conn.execute(delete(table).where(table.c.r_date == self.r_date))
+                rows = []
+        self.done = sorted((r.row_start, r.row_end) for r in rows)
+        if rows:
+            self.bulk_load = rows[0].bulk_load
+            logger.info(f"Resuming {self.r_date}: {self.rows_done} of {self.total_rows} rows already loaded")
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.done)
+
+    @property
+    def rows_done(self) -> int:
+        with self._lock:
+            return sum(end - start for start, end in self.done)
+
+    @property
+    def complete(self) -> bool:
+        return self.rows_done >= self.total_rows
+
+    def pending_ranges(self) -> list[tuple[int, int]]:
+        """[start, end) row ranges still to load"""
+        pending = []
+        position = 0
+        with self._lock:
+            for start, end in sorted(self.done):
+                if start > position:
+                    pending.append((position, start))
+                position = max(position, end)
+        if position < self.total_rows:
+            pending.append((position, self.total_rows))
+        return pending
+
+    def _row(self, row_start: int, row_end: int, status_summary: dict = None, action_summary: dict = None) -> dict:
+        return {'r_date': self.r_date, 'row_start': row_start, 'row_end': row_end,
+                'file_hash': self.file_hash, 'total_rows': self.total_rows, 'bulk_load': self.bulk_load,
+                'status_summary': {str(k): int(v) for k, v in (status_summary or {}).items()},
+                'action_summary': {k: int(v) for k, v in (action_summary or {}).items()}}
+
+    def record(self, session, row_start: int, row_end: int, status_summary: dict = None, action_summary: dict = None):
+        """
+        Write the checkpoint row of a range in the open transaction that loads its rows, so the two commit
+        (or roll back) together - then call mark_done once that transaction has committed.
+        :param session: ORM session or SQLAlchemy connection
+        """
+        session.execute(insert(HydIngestCheckpoint.__table__)
+                        .values(**self._row(row_start, row_end, status_summary, action_summary))
+                        .on_conflict_do_nothing())
+
+    def record_with_cursor(self, cur, row_start: int, row_end: int, status_summary: dict = None,
+                           action_summary: dict = None):
+        """As record(), on a DB-API cursor (the raw connection of a COPY)"""
+        table = HydIngestCheckpoint.__table__
+        row = self._row(row_start, row_end, status_summary, action_summary)
+        row['status_summary'] = json.dumps(row['status_summary'])
+        row['action_summary'] = json.dumps(row['action_summary'])
+        cur.execute(f"INSERT INTO {table.schema}.{table.name} ({', '.join(row)}) "
+                    f"VALUES ({', '.join(f'%({name})s' for name in row)}) ON CONFLICT DO NOTHING", row)
+
+    def mark_done(self, row_start: int, row_end: int):
+        """Note a range as done - once the transaction that loaded it (and wrote its checkpoint row) has committed"""
+        with self._lock:
+            self.done.append((row_start, row_end))
+
+    def clear(self):
+        """Forget the day's checkpoints (once the whole day is loaded)"""
+        table = HydIngestCheckpoint.__table__
+        with self._engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.r_date == self.r_date))
+        with self._lock:
+            self.done = []
+
+
+def incomplete_days() -> list[datetime.date]:
+    """
+    Days with a load that was started but not finished - those with chunk checkpoints, and those the ledger
+    records as stopped part way (streamed loads keep no checkpoints)
+    """
+    checkpointed = db.session.execute(select(distinct(HydIngestCheckpoint.r_date))).scalars().all()
+    partial = db.session.execute(select(HydIngestLedger.r_date)
+                                 .where(HydIngestLedger.status == PARTIAL)).scalars().all()
+    return sorted(set(checkpointed) | set(partial))
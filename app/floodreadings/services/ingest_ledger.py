@@ -0,0 +1,166 @@
+# app/floodreadings/services/ingest_ledger.py
+# Ledger of what was loaded into hyd_reading_ht - per day: source file hash and size, rows, load mode,
+# duration and the status/action summaries from threaded_insert
+
+import datetime
+import hashlib
+import os
+
+from sqlalchemy import text, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from ..models import HydIngestLedger, ReadingHydro
+from .readings_archive import parquet_filepath
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+LOADED = 'loaded'
+FAILED = 'failed'
+PARTIAL = 'partial'     # stopped part way (see ingest_checkpoint)
+
+SEEDED = 'seeded'       # load mode of the days recorded by seed_ledger_from_readings
+
+
+def file_sha256(filepath: str, block_size: int = 1024 * 1024) -> str:
+    """sha256 hex digest of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_ledger_entry(r_date: datetime.date) -> HydIngestLedger|None:
+    return db.session.get(HydIngestLedger, r_date)
+
+
+def day_file_unchanged(r_date: datetime.date, filepath: str, file_hash: str = None) -> bool:
+    """
+    True if the day was loaded successfully from a file with the same content as filepath.
+    :param file_hash: sha256 of filepath, if already known
+    """
+    entry = get_ledger_entry(r_date)
+    if entry is None or entry.status != LOADED or not entry.file_hash or not os.path.exists(filepath):
+        return False
+    if entry.file_size is not None and entry.file_size != os.path.getsize(filepath):
+        return False
+    return entry.file_hash == (file_hash or file_sha256(filepath))
+
+
+def record_day_load(r_date: datetime.date,
+                    filepath: str|None,
+                    rows: int,
+                    mode: str,
+                    duration_s: float,
+                    status_summary: dict = None,
+                    action_summary: dict = None,
+                    source: str = None,
+                    file_hash: str = None
+                   ) -> HydIngestLedger|None:
+    """
+    Record (insert or replace) the ledger row for a day just loaded.
+    The status is 'failed' if any rows failed to load, 'partial' if the load was stopped, otherwise 'loaded'.
+    :param filepath: the archived day file loaded (None if there isn't one)
+    :param file_hash: sha256 of filepath, if already known
+    """
+    action_summary = {k: int(v) for k, v in (action_summary or {}).items()}
+    status_summary = {str(k): int(v) for k, v in (status_summary or {}).items()}
+    has_file = bool(filepath) and os.path.exists(filepath)
+    values = {
+        'r_date': r_date,
+        'source': source or f"hydro-{r_date.isoformat()}",
+        'file_name': os.path.basename(filepath) if has_file else None,
+        'file_hash': (file_hash or file_sha256(filepath)) if has_file else None,
+        'file_size': os.path.getsize(filepath) if has_file else None,
+        'rows': int(rows),
+        'mode': mode,
+        'duration_s': round(duration_s, 1),
+        'status': FAILED if action_summary.get('failed') else PARTIAL if action_summary.get('cancelled') else LOADED,
+        'status_summary': status_summary,
+        'action_summary': action_summary,
+    }
+    stmt = insert(HydIngestLedger).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['r_date'],
+        set_={**{k: stmt.excluded[k] for k in values if k != 'r_date'}, 'updated': func.now()}
+    )
+    try:
+        db.session.execute(stmt)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Ingest ledger: failed to record {r_date}: {e}")
+        return None
+    return get_ledger_entry(r_date)
+
+
+def ledger_start_date() -> datetime.date|None:
+    """
+    The first day in the ledger (None while it is empty). Days before it were loaded before the ledger existed
+    and are only in the ledger once seed-ingest-ledger has covered them - gap queries use the readings table there.
+    """
+    return db.session.query(func.min(HydIngestLedger.r_date)).scalar()
+
+
+def ledger_seeded() -> bool:
+    """
+    The ledger's first day was recorded by seed_ledger_from_readings - so (seeded from the first day of readings)
+    it covers the days loaded before it existed, and date range queries can use it alone
+    """
+    return db.session.query(HydIngestLedger.mode).order_by(HydIngestLedger.r_date).limit(1).scalar() == SEEDED
+
+
+def ledger_min_max_dates() -> (datetime.date|None, datetime.date|None):
+    """First and last successfully loaded days"""
+    return db.session.query(func.min(HydIngestLedger.r_date), func.max(HydIngestLedger.r_date))\
+                     .filter(HydIngestLedger.status == LOADED).one()
+
+
+def ledger_missing_dates(start_date: datetime.date, end_date: datetime.date) -> list[datetime.date]:
+    """Days between start_date and end_date (inclusive) with no successful load in the ledger"""
+    sql = text(f"""
+        SELECT d::date AS day
+          FROM generate_series(CAST(:start_date AS date), CAST(:end_date AS date), interval '1 day') AS d
+         WHERE NOT EXISTS (
+               SELECT 1
+                 FROM {HydIngestLedger.__table__.schema}.{HydIngestLedger.__tablename__} l
+                WHERE l.r_date = d::date
+                  AND l.status = :loaded)
+         ORDER BY d
+    """)
+    rows = db.session.execute(sql, {'start_date': start_date, 'end_date': end_date, 'loaded': LOADED}).fetchall()
+    return [row.day for row in rows]
+
+
+def seed_ledger_from_readings(start_date: datetime.date,
+                              end_date: datetime.date,
+                              save_basefolder: str = "readings_hydrology",
+                              replace: bool = False
+                             ) -> int:
+    """
+    Seed the ledger for days loaded before it existed: every day in the range with readings gets a row
+    (mode 'seeded', rows = readings in the table), with the hash of its archived day file if there is one.
+    :param replace: also overwrite days already in the ledger
+    :return: days recorded
+    """
+    recorded = 0
+    current = start_date
+    while current <= end_date:
+        if replace or get_ledger_entry(current) is None:
+            day_start = datetime.datetime.combine(current, datetime.time.min, tzinfo=datetime.timezone.utc)
+            rows = db.session.query(func.count(ReadingHydro.r_datetime)).filter(ReadingHydro.r_datetime >= day_start,
+                                                                         ReadingHydro.r_datetime < day_start + datetime.timedelta(days=1)
+                                                                        ).scalar()
+            if rows:
+                datestr = current.strftime('%Y-%m-%d')
+                filepath = os.path.join(save_basefolder, datestr[:4], f'hydro-{datestr}.csv')
+                if not os.path.exists(filepath):
+                    filepath = parquet_filepath(filepath)
+                if record_day_load(current, filepath, rows=rows, mode=SEEDED, duration_s=0.0,
+                                   action_summary={'existing': rows}) is not None:
+                    recorded += 1
+                    logger.info(f"Ingest ledger: seeded {current} ({rows} rows)")
+        current += datetime.timedelta(days=1)
+    return recorded
@@ -0,0 +1,78 @@
+# app/floodreadings/services/ingest_metrics.py
+# Per-stage metrics of the readings ingest (in the process-wide registry, see app/utils/metrics.py):
+# download, csv parse, row transform and db write times, bytes and rows, chunk latency, chunk outcomes
+# and parse_float_safe status codes. The database budget wait and the EA API request times, errors and
+# retries are recorded by db_budget.py and ea_client.py.
+
+from flask import current_app
+
+from app.utils.metrics import get_metrics, write_metrics_file
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# annotate the proxy so the IDE knows its real type
+from werkzeug.local import LocalProxy
+current_app: LocalProxy
+
+STAGES = ('download', 'parse', 'transform', 'write', 'copy', 'merge', 'diff', 'replace')
+
+stage_seconds = get_metrics().histogram(
+    'ingest_stage_seconds',
+    "Time per ingest step: download (a day file), parse (read a day file), transform and write (a chunk), "
+    "copy, merge, diff and replace (a day, transform included)",
+    ('stage',))
+stage_bytes = get_metrics().counter('ingest_bytes_total', "Bytes downloaded or parsed", ('stage',))
+stage_rows = get_metrics().counter('ingest_rows_total', "Rows through each ingest stage", ('stage',))
+chunk_seconds = get_metrics().histogram('ingest_chunk_seconds',
+                                        "threaded_insert chunk latency, budget wait included", ('mode',))
+chunk_results = get_metrics().counter('ingest_chunks_total', "threaded_insert chunks by outcome", ('mode', 'result'))
+readings_actions = get_metrics().counter('ingest_readings_total',
+                                         "Readings by load action (inserted, updated, copied, failed, ...)", ('action',))
+day_peak_rss = get_metrics().gauge('ingest_day_peak_rss_bytes',
+                                   "Peak resident memory while the last day was read and loaded")
+value_status = get_metrics().counter('ingest_value_status_total', "parse_float_safe status codes of reading values",
+                                     ('code',))
+
+
+def record_load_summary(status_summary, insupd_summary):
+    """Value status codes and load actions of one load (threaded_insert, a day diff or a day replace)"""
+    for code, n in (status_summary or {}).items():
+        value_status.inc(n, code=code)
+    for action, n in (insupd_summary or {}).items():
+        if action not in ('rows/sec', 'dropped_chunks') and n:     # rates and chunk counts are not readings
+            readings_actions.inc(n, action=action)
+
+
+def stage_summary() -> dict:
+    """Per stage: count, total and mean seconds (and rows, bytes) - with the database budget wait, for the logs"""
+    rows = stage_rows.totals()
+    nbytes = stage_bytes.totals()
+    summary = {}
+    for stage, series in stage_seconds.series().items():
+        summary[stage] = {'count': series['count'],
+                          'total_s': round(series['sum'], 1),
+                          'mean_s': round(series['sum'] / series['count'], 3) if series['count'] else None}
+        if rows.get(stage):
+            summary[stage]['rows'] = int(rows[stage])
+        if nbytes.get(stage):
+            summary[stage]['mb'] = round(nbytes[stage] / 2**20, 1)
+    wait = get_metrics().get('ingest_db_slot_wait_seconds')
+    if wait is not None:
+        series = wait.series().get((), None)
+        if series and series['count']:
+            summary['db_wait'] = {'count': series['count'], 'total_s': round(series['sum'], 1),
+                                  'mean_s': round(series['sum'] / series['count'], 3)}
+    return summary
+
+
+def write_ingest_metrics() -> str|None:
+    """Write the metrics to METRICS_FILE, if configured (needs an app context)"""
+    filepath = current_app.config.get('METRICS_FILE')
+    if not filepath:
+        return None
+    try:
+        return write_metrics_file(filepath)
+    except OSError as e:
+        logger.warning(f"Metrics not written to {filepath}: {e}")
+        return None
@@ -0,0 +1,180 @@
+# app/floodreadings/services/notation_registry.py
+# Measure notation parsing, memoized in a registry shared by all ingest workers
+
+import threading
+
+from app.utils.ea_client import hydrology_root_url as ea_root_url
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+
+def parse_notation(notation):
+    if not notation or not isinstance(notation, str):
+        logger.debug(f"Skipping invalid notation: {notation!r}")
+        return None
+
+    parts = notation.rsplit('-', 10)
+    n_dashes = len(parts) - 1
+    try:
+        if n_dashes == 3:
+            # example
+            # E01591A-ph-i-subdaily
+            return {
+                'station_id': parts[0],
+                'parameter': parts[1],
+                'value_type': parts[2],
+                'period_name': parts[3]
+            }
+        elif n_dashes == 4:
+            # example
+            # E02763A-bga-i-subdaily-rfu
+            return {
+                'station_id': parts[0],
+                'parameter': parts[1],
+                'value_type': parts[2],
+                'period_name': parts[3],
+                'unit_name': parts[4]
+            }
+        elif n_dashes == 9:
+            # example
+            # ac462a74-4fe2-41d7-a35b-e51ffd6c9a0f-level-i-900-m-qualified
+            # 2c14fcb6-21f3-47ca-8e50-14c68d23e5fb_SE52HCL1SS-gw-dipped-i-mAOD-qualified
+            if '-'.join(parts[5:7]) == 'gw-dipped':
+                return {
+                    'station_id': '-'.join(parts[:5]),
+                    'parameter': parts[5],
+                    'qualifier': parts[6],
+                    'value_type': parts[7],
+                    'unit_name': parts[8],
+                    'observation_type': parts[9]
+            }
+            else:
+                return {
+                    'station_id': '-'.join(parts[:5]),
+                    'parameter': parts[5],
+                    'value_type': parts[6],
+                    'period_name': parts[7],
+                    'unit_name': parts[8],
+                    'observation_type': parts[9]
+                }
+        elif n_dashes == 10:
+            # example
+            # 1cdd6e48-7bcb-4f32-b8a8-3500a8a352b0-gw-logged-i-subdaily-mAOD-qualified
+            return {
+                'station_id': '-'.join(parts[:5]),
+                'parameter': parts[5],
+                'qualifier': parts[6],
+                'value_type': parts[7],
+                'period_name': parts[8],
+                'unit_name': parts[9],
+                'observation_type': parts[10]
+            }
+
+        # if it gets this far and has not yet returned a dict, then
+        logger.warning(f"Unrecognized notation format: '{notation}' ({n_dashes} dashes)")
+
+    except Exception as e:
+        logger.debug(f"Error parsing notation '{notation}': {e}")
+    return None  # fallback for unknown format or error
+
+
+class NotationRegistry:
+    """
+    Thread-safe memo of parse_notation results.
+    Each distinct notation is parsed once and given a small integer code; later lookups are a dict access.
+    Unknown notations (not preloaded from the measure tables) fall back to parse_notation on first sight.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codes: dict[str, int] = {}
+        self._parsed: list[dict|None] = []
+        self.hits = 0
+        self.misses = 0
+        self.preloaded = 0
+
+    def __len__(self) -> int:
+        return len(self._parsed)
+
+    def _add(self, notation: str) -> int:
+        """Parse and register a notation (caller holds the lock)."""
+        code = self._codes.get(notation)
+        if code is None:
+            code = len(self._parsed)
+            self._parsed.append(parse_notation(notation))
+            self._codes[notation] = code
+        return code
+
+    def code(self, notation: str) -> int|None:
+        """Integer code of a notation (registered on first sight), None for an invalid notation."""
+        if not notation or not isinstance(notation, str):
+            return None
+        with self._lock:
+            code = self._codes.get(notation)
+            if code is not None:
+                self.hits += 1
+                return code
+            self.misses += 1
+            return self._add(notation)
+
+    def lookup(self, notation: str) -> dict|None:
+        """Parsed notation fields, as parse_notation (the returned dict is shared - do not modify it)."""
+        code = self.code(notation)
+        return self._parsed[code] if code is not None else None
+
+    def parsed_for_code(self, code: int) -> dict|None:
+        return self._parsed[code]
+
+    def preload(self, notations) -> int:
+        """Register (parse) a batch of notations up front. :return: number of new notations"""
+        with self._lock:
+            before = len(self._parsed)
+            for notation in notations:
+                if notation and isinstance(notation, str):
+                    self._add(notation.strip())
+            added = len(self._parsed) - before
+            self.preloaded += added
+        return added
+
+    def notations(self) -> list[str]:
+        """Every registered notation (e.g. to preload another process' registry)"""
+        with self._lock:
+            return list(self._codes)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'notations': len(self._parsed),
+            'preloaded': self.preloaded,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+_notation_registry = NotationRegistry()
+
+def get_notation_registry() -> NotationRegistry:
+    """The process-wide registry shared by all ingest workers."""
+    return _notation_registry
+
+
+def preload_notation_registry(registry: NotationRegistry = None) -> NotationRegistry:
+    """
+    Register every notation known from the hydrology measure tables (production.hyd_measure
+    and production.hyd_station_measure), so readings ingest rarely has to parse one.
+    Needs an app context.
+    """
+    from app import db      # here, not at module level - parsing notations needs no app (tests/conftest.py)
+    from app.all_stations.models import HydMeasure, HydStationMeasure
+
+    registry = registry or get_notation_registry()
+    try:
+        notations = [row.notation for row in db.session.query(HydMeasure.notation).distinct()]
+        measure_ids = [row.measure_id for row in db.session.query(HydStationMeasure.measure_id).distinct()]
+        notations += [m.replace(f'{ea_root_url}/id/measures/', '') for m in measure_ids if isinstance(m, str)]
+        added = registry.preload(notations)
+        logger.info(f'Notation registry: preloaded {added} notations ({len(registry)} in total)')
+    except Exception as e:
+        logger.exception(f'preload_notation_registry: failed with error: {e}')
+    return registry
@@ -0,0 +1,162 @@
+# app/floodreadings/services/readings_archive.py
+# Typed, compressed (Parquet) archive of HYDROLOGY API day files - readings_hydrology/YYYY/hydro-YYYY-MM-DD.parquet
+# and the compact, batch parsed reading of the csv day files (bounded memory is the streaming path - readings_stream)
+
+import os
+from collections import defaultdict
+from typing import Iterator
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .readings_transform import parse_datetime_column, parse_float_column, QUALITY_FIELDS
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:   # optional dependency - without it the archive stays csv only
+    pq = None
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# Repetitive text columns - stored dictionary encoded (pandas category)
+CATEGORY_COLUMNS = ['measure', 'date', 'completeness', 'quality', 'qcode', 'valid', 'invalid', 'missing', 'period']
+
+# csv columns the readings transform uses - the rest of the file is never parsed
+SOURCE_COLUMNS = ['measure', 'date', 'dateTime', 'value', 'period', *QUALITY_FIELDS]
+
+# Read from the csv as categories - dateTime too (a day has a few hundred distinct timestamps);
+# value stays a string column (pyarrow backed with pandas 3)
+CSV_CATEGORY_COLUMNS = [*CATEGORY_COLUMNS, 'dateTime']
+
+# Rows parsed at a time - the parser's working memory is bounded by this, not by the size of the day
+CSV_BATCH_ROWS = 100000
+
+
+def parquet_available() -> bool:
+    return pq is not None
+
+
+def parquet_filepath(csv_filepath: str) -> str:
+    """The parquet archive file alongside a csv day file"""
+    return f'{os.path.splitext(csv_filepath)[0]}.parquet'
+
+
+def to_typed_readings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Source readings (all strings, as read from the csv) -> typed columns for the parquet archive.
+    dateTime is parsed, value becomes float64 plus the parse_float_safe status code in 'value_status',
+    and the repetitive text columns become categories.
+    """
+    typed = pd.DataFrame(index=df.index)
+    for name in df.columns:
+        if name == 'dateTime':
+            dtm = parse_datetime_column(df[name])
+            # mixed utc offsets in one file can't be one parquet column - keep the source strings
+            typed[name] = dtm if pd.api.types.is_datetime64_any_dtype(dtm) else df[name]
+        elif name == 'value':
+            typed['value'], status = parse_float_column(df[name])
+            typed['value_status'] = status.astype('int8')
+        elif name in CATEGORY_COLUMNS:
+            typed[name] = df[name].astype('category')
+        else:
+            typed[name] = df[name]
+    return typed.reset_index(drop=True)
+
+
+def write_parquet_day(df: pd.DataFrame, filepath: str) -> int|None:
+    """
+    Write a day of source readings as a typed, zstd compressed parquet file (via '<file>.part').
+    :return: bytes written, or None if pyarrow is not installed
+    """
+    if not parquet_available():
+        logger.warning("pyarrow is not installed - parquet archive not written")
+        return None
+    partpath = f'{filepath}.part'
+    try:
+        to_typed_readings(df).to_parquet(partpath, engine='pyarrow', compression='zstd', index=False)
+        os.replace(partpath, filepath)
+    finally:
+        if os.path.exists(partpath):
+            os.remove(partpath)
+    size = os.path.getsize(filepath)
+    logger.info(f"Saved: {filepath} ({size} bytes)")
+    return size
+
+
+def csv_read_options(all_columns: bool = False) -> dict:
+    """
+    read_csv arguments for a day file: just the SOURCE_COLUMNS (unless all_columns), the repetitive ones as categories
+    and the rest as strings. A column missing from the file is not an error (the transform defaults it).
+    """
+    dtype = defaultdict(lambda: str, {name: 'category' for name in CSV_CATEGORY_COLUMNS})
+    if all_columns:
+        return {'dtype': dtype}
+    return {'usecols': lambda name: name in SOURCE_COLUMNS, 'dtype': dtype}
+
+
+def iter_csv_day(filepath_or_buffer, batch_rows: int = CSV_BATCH_ROWS, all_columns: bool = False) -> Iterator[pd.DataFrame]:
+    """A csv day of readings in batches of at most batch_rows rows, read with csv_read_options"""
+    yield from pd.read_csv(filepath_or_buffer, chunksize=batch_rows, **csv_read_options(all_columns))
+
+
+def _concat_column(parts: list[pd.Series]) -> pd.Series:
+    if isinstance(parts[0].dtype, pd.CategoricalDtype):
+        try:
+            return pd.Series(union_categoricals(parts), name=parts[0].name)
+        except TypeError:   # categories of different dtypes (e.g. a column empty in some batches)
+            return pd.concat([p.astype(object) for p in parts], ignore_index=True).astype('category')
+    return pd.concat(parts, ignore_index=True)
+
+
+def read_csv_day(filepath: str, batch_rows: int = CSV_BATCH_ROWS, all_columns: bool = False) -> pd.DataFrame:
+    """
+    A csv day of readings as one compact DataFrame: parsed in batches (see iter_csv_day), each batch's columns
+    joined onto the day so far (categories merged) and the batch dropped, so memory peaks at the compact day plus
+    one batch and the copy of the column being joined. That still grows with the day - for memory bounded
+    regardless of day size, process the batches from iter_csv_day (or stream_hydrology_readings) one at a time.
+    """
+    columns = None
+    for batch in iter_csv_day(filepath, batch_rows=batch_rows, all_columns=all_columns):
+        if columns is None:
+            columns = {name: batch[name] for name in batch.columns}
+        else:
+            for name in columns:
+                columns[name] = _concat_column([columns[name], batch[name]])
+        del batch
+    if columns is None:
+        return pd.DataFrame(columns=SOURCE_COLUMNS)
+    return pd.DataFrame(columns)
+
+
+def read_parquet_day(filepath: str, columns: list[str] = None) -> pd.DataFrame:
+    """A typed day of readings from the parquet archive (the transform accepts these as-is)"""
+    return pd.read_parquet(filepath, engine='pyarrow', columns=columns)
+
+
+def iter_parquet_day(filepath: str, batch_rows: int = 100000, columns: list[str] = None) -> Iterator[pd.DataFrame]:
+    """A typed day of readings in batches of at most batch_rows rows"""
+    parquet_file = pq.ParquetFile(filepath)
+    for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def convert_csv_to_parquet(csv_filepath: str, replace: bool = False, remove_csv: bool = False) -> int|None:
+    """
+    Backfill conversion of one archived csv day file to parquet.
+    :return: bytes written, or None if nothing was converted
+    """
+    filepath = parquet_filepath(csv_filepath)
+    if not os.path.exists(csv_filepath) or os.path.getsize(csv_filepath) == 0:
+        return None
+    if os.path.exists(filepath) and not replace:
+        logger.debug(f"Parquet file already exists: {filepath}")
+        return None
+    df = read_csv_day(csv_filepath, all_columns=True)
+    size = write_parquet_day(df, filepath)
+    if size is not None:
+        logger.info(f"Converted {csv_filepath}: {os.path.getsize(csv_filepath)} -> {size} bytes")
+        if remove_csv:
+            os.remove(csv_filepath)
+            logger.info(f"Removed existing file: {csv_filepath}")
+    return size
@@ -0,0 +1,178 @@
+# app/floodreadings/services/readings_compact.py
+# Compact readings layout (DDL/production/hyd_reading_compact.sql): a measure dimension keyed by a small integer
+# and a narrow fact table, filled day by day from hyd_reading_ht, and a benchmark of the two layouts.
+# It is a shadow copy: the ingest still writes hyd_reading_ht, which stays the table of record, so keeping the
+# copy in step (READINGS_COMPACT_SYNC) adds its storage rather than saving any - until readers move to
+# hyd_reading_v and hyd_reading_ht is retired.
+
+import datetime
+import statistics
+import time
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from ..models import ReadingHydro, HydReadingMeasure, ReadingHydroFact
+# noinspection PyProtectedMember
+from .readings_copy import readings_table_name, day_bounds, _clear_day
+from .readings_compression import footprint
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# annotate the proxy so the IDE knows its real type
+from werkzeug.local import LocalProxy
+current_app: LocalProxy
+
+COMPAT_VIEW = 'production.hyd_reading_v'
+
+# hyd_reading_ht columns held once per measure in the dimension table
+# (datum_type and stationreference are not populated by the readings ingest, so are left NULL)
+MEASURE_COLUMNS = ['station_id', 'parameter_name', 'parameter', 'qualifier', 'value_type', 'period_name',
+                   'unit_name', 'observation_type', 'label']
+
+# hyd_reading_ht columns kept per reading in the fact table
+FACT_COLUMNS = ['r_datetime', 'r_date', 'period', 'value',
+                'completeness', 'quality', 'qcode', 'valid', 'invalid', 'missing', 'updated']
+
+
+def compact_sync_enabled() -> bool:
+    """READINGS_COMPACT_SYNC - the readings loop copies each day it loads into the compact layout"""
+    return bool(current_app.config.get('READINGS_COMPACT_SYNC', False))
+
+
+def _quoted(columns: list[str], alias: str = None) -> str:
+    return ', '.join(f'{alias + "." if alias else ""}"{c}"' for c in columns)
+
+
+def migrate_day(day: datetime.date) -> int:
+    """
+    Copy one day of hyd_reading_ht into the compact layout: the day's measures upserted into the dimension
+    (labels and notation fields refreshed where they have changed), the day's fact rows staged, then swapped in
+    at chunk level in one short transaction (the old fact chunk dropped - see _clear_day - and the staged day
+    inserted with one INSERT ... SELECT).
+    :return: fact rows written
+    """
+    source = readings_table_name(ReadingHydro)
+    dimension = readings_table_name(HydReadingMeasure)
+    fact = readings_table_name(ReadingHydroFact)
+    stage_name = 'hyd_reading_fact_stage'
+    start, end = day_bounds(day)
+    params = {'start': start, 'end': end}
+    set_list = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in ['measure', *MEASURE_COLUMNS])
+    where_list = ' OR '.join(f'm."{c}" IS DISTINCT FROM EXCLUDED."{c}"' for c in ['measure', *MEASURE_COLUMNS])
+    conn = db.engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO {dimension} AS m (measure, notation, {_quoted(MEASURE_COLUMNS)})
+                SELECT DISTINCT ON (r.notation) r.measure, r.notation, {_quoted(MEASURE_COLUMNS, 'r')}
+                  FROM {source} r
+                 WHERE r.r_datetime >= %(start)s AND r.r_datetime < %(end)s
+                 ORDER BY r.notation, r.r_datetime DESC
+                ON CONFLICT (notation) DO UPDATE SET {set_list}
+                WHERE {where_list}
+            """, params)
+            # pooled connections keep their session - a staging table left by a failed migration goes first
+            cur.execute(f"DROP TABLE IF EXISTS {stage_name}")
+            cur.execute(f"""
+                CREATE TEMP TABLE {stage_name} AS
+                SELECT m.measure_id, {_quoted(FACT_COLUMNS, 'r')}
+                  FROM {source} r
+                  JOIN {dimension} m ON m.notation = r.notation
+                 WHERE r.r_datetime >= %(start)s AND r.r_datetime < %(end)s
+            """, params)
+            rows = cur.rowcount
+        conn.commit()
+
+        _clear_day(conn, day, model=ReadingHydroFact)
+        with conn.cursor() as cur:
+            cur.execute(f"INSERT INTO {fact} (measure_id, {_quoted(FACT_COLUMNS)}) "
+                        f"SELECT measure_id, {_quoted(FACT_COLUMNS)} FROM {stage_name}")
+            cur.execute(f"DROP TABLE {stage_name}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return rows
+
+
+def migrate_to_compact(start_date: datetime.date, end_date: datetime.date) -> (int, int):
+    """
+    Fill the compact layout from hyd_reading_ht for a range of days (rerunnable - each day is replaced).
+    :return: (days migrated, fact rows written)
+    """
+    days = total = 0
+    current = start_date
+    while current <= end_date:
+        t0 = time.perf_counter()
+        try:
+            rows = migrate_day(current)
+        except Exception as e:
+            logger.exception(f"Compact readings: {current} not migrated: {e}")
+        else:
+            days += 1
+            total += rows
+            logger.info(f"Compact readings: {current} - {rows} rows in {time.perf_counter() - t0:.1f}s")
+        current += datetime.timedelta(days=1)
+    return days, total
+
+
+def _best_ms(conn, sql: str, params: dict, repeat: int) -> float:
+    best = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        conn.execute(text(sql), params).fetchall()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def benchmark_compact(start_date: datetime.date,
+                      end_date: datetime.date,
+                      samples: int = 20,
+                      repeat: int = 3
+                     ) -> dict:
+    """
+    Storage and scan times of a range of days in hyd_reading_ht and in the compact layout (through hyd_reading_v,
+    as existing queries would read it). The days must have been migrated (see migrate_to_compact).
+    :param samples: measures range-scanned
+    :param repeat: runs of each query (the best is reported - warm cache)
+    """
+    start, _ = day_bounds(start_date)
+    _, end = day_bounds(end_date)
+    legacy = readings_table_name(ReadingHydro)
+    params = {'start': start, 'end': end}
+    with db.engine.connect() as conn:
+        notations = [row.notation for row in conn.execute(text(f"""
+            SELECT notation FROM {legacy}
+             WHERE r_datetime >= :start AND r_datetime < :start + interval '1 day'
+             GROUP BY notation ORDER BY random() LIMIT :samples
+        """), {'start': start, 'samples': samples})]
+
+        result = {'days': (end_date - start_date).days + 1, 'measures': len(notations)}
+        for name, table in (('legacy', legacy), ('compact', COMPAT_VIEW)):
+            scans = [_best_ms(conn, f"SELECT count(*), avg(value) FROM {table} "
+                                    f"WHERE notation = :notation AND r_datetime >= :start AND r_datetime < :end",
+                              {**params, 'notation': notation}, repeat)
+                     for notation in notations]
+            result[name] = {
+                'rows': conn.execute(text(f"SELECT count(*) FROM {table} "
+                                          f"WHERE r_datetime >= :start AND r_datetime < :end"), params).scalar(),
+                'measure_scan_median_ms': round(statistics.median(scans), 2) if scans else None,
+                'full_scan_ms': round(_best_ms(conn, f"SELECT count(*), avg(value), count(DISTINCT quality) FROM {table} "
+                                                     f"WHERE r_datetime >= :start AND r_datetime < :end",
+                                               params, repeat), 1),
+            }
+
+    result['legacy'].update(footprint(start, end, model=ReadingHydro))
+    result['compact'].update(footprint(start, end, model=ReadingHydroFact))
+    dimension_mb = db.session.execute(text("SELECT pg_total_relation_size(CAST(:t AS regclass))"),
+                                      {'t': readings_table_name(HydReadingMeasure)}).scalar() / 2**20
+    result['compact']['dimension_mb'] = round(dimension_mb, 2)
+    if result['compact']['mb']:
+        result['size_ratio'] = round(result['legacy']['mb'] / (result['compact']['mb'] + dimension_mb), 1)
+    return result
@@ -0,0 +1,233 @@
+# app/floodreadings/services/readings_compression.py
+# TimescaleDB native compression of the readings hypertable: segmented by notation, ordered by r_datetime,
+# with a policy that leaves the days re-fetched by the daily refresh (get-hydrology-readings-data-latest) uncompressed
+
+import datetime
+import statistics
+import time
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import db
+from ..models import ReadingHydro
+from .readings_copy import readings_table_name, day_bounds
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# annotate the proxy so the IDE knows its real type
+from werkzeug.local import LocalProxy
+current_app: LocalProxy
+
+COMPRESS_SEGMENTBY = 'notation'
+COMPRESS_ORDERBY = 'r_datetime'
+
+
+def refresh_window_days() -> int:
+    """Days before the last reading that the daily refresh reloads (INGEST_REFRESH_DAYS)"""
+    return current_app.config.get('INGEST_REFRESH_DAYS', 14)
+
+
+def compress_after_days() -> int:
+    """Age (days) after which chunks are compressed (COMPRESS_AFTER_DAYS, default a week past the refresh window)"""
+    return current_app.config.get('COMPRESS_AFTER_DAYS') or refresh_window_days() + 7
+
+
+def _hypertable(model=ReadingHydro) -> (str, str):
+    table = model.__table__
+    return table.schema or 'public', table.name
+
+
+def _set_compression_options(conn, table_name: str):
+    conn.execute(text(f"ALTER TABLE {table_name} SET (timescaledb.compress, "
+                      f"timescaledb.compress_segmentby = '{COMPRESS_SEGMENTBY}', "
+                      f"timescaledb.compress_orderby = '{COMPRESS_ORDERBY}')"))
+
+
+def enable_compression(after_days: int = None, model=ReadingHydro) -> int:
+    """
+    Turn on compression (segmentby notation, orderby r_datetime) and (re)create the compression policy.
+    :param after_days: compress chunks older than this many days (default compress_after_days())
+    :return: the compress_after used, in days
+    """
+    after_days = after_days or compress_after_days()
+    if after_days <= refresh_window_days():
+        raise ValueError(f"compress after {after_days} days would compress days the daily refresh still rewrites "
+                         f"(INGEST_REFRESH_DAYS = {refresh_window_days()})")
+    table_name = readings_table_name(model)
+    with db.engine.begin() as conn:
+        _set_compression_options(conn, table_name)
+        conn.execute(text("SELECT remove_compression_policy(CAST(:t AS regclass), if_exists => TRUE)"), {'t': table_name})
+        conn.execute(text("SELECT add_compression_policy(CAST(:t AS regclass), make_interval(days => :days))"),
+                     {'t': table_name, 'days': after_days})
+    logger.info(f"Compression policy on {table_name}: chunks older than {after_days} days")
+    return after_days
+
+
+def disable_compression_policy(model=ReadingHydro):
+    """Stop compressing new chunks (chunks already compressed stay compressed)"""
+    table_name = readings_table_name(model)
+    with db.engine.begin() as conn:
+        conn.execute(text("SELECT remove_compression_policy(CAST(:t AS regclass), if_exists => TRUE)"), {'t': table_name})
+    logger.info(f"Compression policy on {table_name} removed")
+
+
+def _chunks(conn, start: datetime.datetime = None, end: datetime.datetime = None,
+            compressed: bool = None, model=ReadingHydro) -> list[str]:
+    """Qualified names of the chunks overlapping [start, end), optionally only (un)compressed ones"""
+    schema, name = _hypertable(model)
+    sql = """
+        SELECT format('%I.%I', chunk_schema, chunk_name) AS chunk
+          FROM timescaledb_information.chunks
+         WHERE hypertable_schema = :schema AND hypertable_name = :name
+           AND (CAST(:start AS timestamptz) IS NULL OR range_end > :start)
+           AND (CAST(:end AS timestamptz) IS NULL OR range_start < :end)
+           AND (CAST(:compressed AS boolean) IS NULL OR is_compressed = :compressed)
+         ORDER BY range_start
+    """
+    rows = conn.execute(text(sql), {'schema': schema, 'name': name, 'start': start, 'end': end,
+                                    'compressed': compressed}).fetchall()
+    return [row.chunk for row in rows]
+
+
+def compress_chunks(start: datetime.datetime = None, end: datetime.datetime = None, model=ReadingHydro) -> int:
+    """
+    Compress the uncompressed chunks overlapping [start, end) now, one transaction each
+    (end defaults to the policy's cut-off, so the refresh window is left alone).
+    :return: chunks compressed
+    """
+    if end is None:
+        end = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=compress_after_days())
+    with db.engine.connect() as conn:
+        chunks = _chunks(conn, start, end, compressed=False, model=model)
+    for chunk in chunks:
+        with db.engine.begin() as conn:
+            conn.execute(text("SELECT compress_chunk(CAST(:c AS regclass), if_not_compressed => TRUE)"), {'c': chunk})
+        logger.debug(f"Compressed {chunk}")
+    logger.info(f"Compressed {len(chunks)} chunks of {readings_table_name(model)}")
+    return len(chunks)
+
+
+def decompress_chunks(start: datetime.datetime = None, end: datetime.datetime = None, model=ReadingHydro) -> int:
+    """Decompress the compressed chunks overlapping [start, end). :return: chunks decompressed"""
+    with db.engine.connect() as conn:
+        chunks = _chunks(conn, start, end, compressed=True, model=model)
+    for chunk in chunks:
+        with db.engine.begin() as conn:
+            conn.execute(text("SELECT decompress_chunk(CAST(:c AS regclass), if_compressed => TRUE)"), {'c': chunk})
+    return len(chunks)
+
+
+def decompress_day(day: datetime.date, model=ReadingHydro) -> int:
+    """
+    Make a day writable row by row again before it is upserted or diffed into: decompress its chunk if the
+    policy has compressed it (an old day re-downloaded with --force-replace, or a refresh run after a long gap).
+    The policy compresses it again once it is due.
+    :return: chunks decompressed (0 without TimescaleDB)
+    """
+    try:
+        decompressed = decompress_chunks(*day_bounds(day), model=model)
+    except Exception as e:
+        logger.debug(f"decompress_day({day}) skipped: {e}")
+        return 0
+    if decompressed:
+        logger.info(f"Decompressed {decompressed} chunk(s) of {day} for loading")
+    return decompressed
+
+
+def footprint(start: datetime.datetime, end: datetime.datetime, model=ReadingHydro) -> dict:
+    """On-disk size of the chunks overlapping [start, end) - compressed chunks at their compressed size"""
+    table_name = readings_table_name(model)
+    with db.engine.connect() as conn:
+        chunks = _chunks(conn, start, end, model=model)
+        if not chunks:
+            return {'chunks': 0, 'compressed': 0, 'mb': 0.0}
+        sql = """
+            SELECT count(*) AS chunks,
+                   count(*) FILTER (WHERE s.compression_status = 'Compressed') AS compressed,
+                   coalesce(sum(CASE WHEN s.compression_status = 'Compressed'
+                                     THEN s.after_compression_total_bytes ELSE d.total_bytes END), 0) AS total_bytes
+              FROM chunks_detailed_size(CAST(:t AS regclass)) d
+              LEFT JOIN chunk_compression_stats(CAST(:t AS regclass)) s
+                ON s.chunk_schema = d.chunk_schema AND s.chunk_name = d.chunk_name
+             WHERE format('%I.%I', d.chunk_schema, d.chunk_name) = ANY(:chunks)
+        """
+        row = conn.execute(text(sql), {'t': table_name, 'chunks': chunks}).one()
+    return {'chunks': row.chunks, 'compressed': row.compressed, 'mb': round(row.total_bytes / 2**20, 1)}
+
+
+def _sample_notations(start: datetime.datetime, samples: int, model=ReadingHydro) -> list[str]:
+    """Notations with readings on the first day of the range"""
+    sql = f"""
+        SELECT notation FROM {readings_table_name(model)}
+         WHERE r_datetime >= :start AND r_datetime < :start + interval '1 day'
+         GROUP BY notation ORDER BY random() LIMIT :samples
+    """
+    with db.engine.connect() as conn:
+        return [row.notation for row in conn.execute(text(sql), {'start': start, 'samples': samples})]
+
+
+def time_range_scans(notations: list[str], start: datetime.datetime, end: datetime.datetime,
+                     repeat: int = 3, model=ReadingHydro) -> dict:
+    """Per-measure range scans over [start, end) - the best of `repeat` runs of each, in ms"""
+    sql = text(f"""
+        SELECT count(*), avg(value) FROM {readings_table_name(model)}
+         WHERE notation = :notation AND r_datetime >= :start AND r_datetime < :end
+    """)
+    timings = []
+    rows = 0
+    with db.engine.connect() as conn:
+        for notation in notations:
+            best = None
+            for _ in range(max(1, repeat)):
+                t0 = time.perf_counter()
+                count, _avg = conn.execute(sql, {'notation': notation, 'start': start, 'end': end}).one()
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best * 1000)
+            rows += count
+    if not timings:
+        return {'scans': 0}
+    return {
+        'scans': len(timings),
+        'rows': rows,
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'total_ms': round(sum(timings), 1),
+    }
+
+
+def benchmark_compression(start_date: datetime.date,
+                          end_date: datetime.date,
+                          samples: int = 20,
+                          repeat: int = 3,
+                          restore: bool = False,
+                          model=ReadingHydro
+                         ) -> dict:
+    """
+    Disk footprint and per-measure range-scan times of a range of days, uncompressed and then compressed.
+    The days are decompressed first if need be, and left compressed unless restore is set.
+    :param samples: measures (notations) scanned
+    :param repeat: runs of each scan (the best is reported - warm cache)
+    """
+    start, _ = day_bounds(start_date)
+    _, end = day_bounds(end_date)
+    with db.engine.begin() as conn:
+        _set_compression_options(conn, readings_table_name(model))
+    decompress_chunks(start, end, model=model)
+    notations = _sample_notations(start, samples, model=model)
+
+    result = {'days': (end_date - start_date).days + 1, 'measures': len(notations)}
+    result['before'] = {**footprint(start, end, model=model),
+                        **time_range_scans(notations, start, end, repeat=repeat, model=model)}
+    t0 = time.perf_counter()
+    compress_chunks(start, end, model=model)
+    result['compress_s'] = round(time.perf_counter() - t0, 1)
+    result['after'] = {**footprint(start, end, model=model),
+                       **time_range_scans(notations, start, end, repeat=repeat, model=model)}
+    if result['after'].get('mb'):
+        result['ratio'] = round(result['before']['mb'] / result['after']['mb'], 1)
+    if restore:
+        decompress_chunks(start, end, model=model)
+    return result
@@ -0,0 +1,452 @@
+# app/floodreadings/services/readings_copy.py
+# Bulk load of transformed readings into the hypertable with PostgreSQL COPY FROM STDIN
+
+import datetime
+import io
+import time
+from contextlib import nullcontext
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from app import db
+from app.utils import get_db_budget
+from ..models import ReadingHydro
+from .readings_transform import transform_readings_chunk, parse_datetime_column, READING_COLUMNS
+from .ingest_checkpoint import IngestCancelled, cancelled
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# 'created' takes the column default and 'updated' is only ever set by the upsert path
+COPY_COLUMNS = [c for c in READING_COLUMNS if c != 'updated']
+
+# Conflict key and the columns refreshed by an upsert (most frequently changed first, as in insert_chunk)
+UPSERT_KEY = ['measure', 'r_datetime']
+UPSERT_FIELDS = ['quality', 'completeness', 'qcode', 'value', 'valid', 'invalid', 'missing']
+
+
+def readings_table_name(model=ReadingHydro) -> str:
+    """Schema qualified table name of a model, e.g. production.hyd_reading_ht"""
+    table = model.__table__
+    return f'{table.schema}.{table.name}' if table.schema else table.name
+
+
+def copy_sql(table_name: str, columns: list[str] = None) -> str:
+    """COPY statement matching the csv written by ReadingsCopyStream (unquoted empty field = NULL)"""
+    columns = columns or COPY_COLUMNS
+    col_list = ', '.join(f'"{c}"' for c in columns)
+    return f"COPY {table_name} ({col_list}) FROM STDIN WITH (FORMAT csv, HEADER false)"
+
+
+class ReadingsCopyStream(io.RawIOBase):
+    """
+    Read-only file object for cursor.copy_expert().
+    Source rows are transformed a chunk at a time as the server asks for data, and written out as csv text,
+    so a whole day never exists as Python row dicts (or as one big csv string).
+    """
+    def __init__(self, df: pd.DataFrame, chunk_size: int = 50000,
+                 stn_labels: dict|None = None, ea_datasource: str = 'EA',
+                 columns: list[str] = None,
+                 transform_pool = None,
+                 stop_event = None):
+        """
+        :param transform_pool: TransformPool (see readings_procpool) - transform and render the csv in worker
+                               processes, a few chunks ahead of the server, instead of in this thread
+        :param stop_event: threading.Event - once set, the next read ends the data early and sets cancelled
+                           (raising from read() would surface from the driver as a failed COPY - the caller
+                           rolls back instead, see copy_dataframe)
+        """
+        super().__init__()
+        self.df = df
+        self.chunk_size = chunk_size
+        self.stn_labels = stn_labels
+        self.ea_datasource = ea_datasource
+        self.columns = columns or COPY_COLUMNS
+        self.transform_pool = transform_pool
+        self.stop_event = stop_event
+        self.status_counter = Counter()
+        self.rows = 0
+        self.cancelled = False
+        self._chunks = self._iter_chunks()
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def _iter_chunks(self):
+        """csv bytes of each transformed chunk, in order"""
+        source_chunks = (self.df.iloc[i:i + self.chunk_size] for i in range(0, len(self.df), self.chunk_size))
+        if self.transform_pool is not None:
+            for data, value_status, rows in self.transform_pool.imap_csv(source_chunks, self.ea_datasource, self.columns):
+                self.status_counter.update(value_status)
+                self.rows += rows
+                yield data
+            return
+        for chunk_df in source_chunks:
+            frame, value_status = transform_readings_chunk(chunk_df, stn_labels=self.stn_labels, ea_datasource=self.ea_datasource)
+            self.status_counter.update(value_status)
+            self.rows += len(frame)
+            yield frame[self.columns].to_csv(header=False, index=False).encode('utf-8')
+
+    def read(self, size: int = -1) -> bytes:
+        if self.cancelled or cancelled(self.stop_event):
+            self.cancelled = True
+            return b''
+        while size < 0 or len(self._buffer) < size:
+            data = next(self._chunks, None)
+            if data is None:
+                break
+            self._buffer += data
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def copy_dataframe(engine, df: pd.DataFrame,
+                   table_name: str = None,
+                   chunk_size: int = 50000,
+                   stn_labels: dict|None = None,
+                   ea_datasource: str = 'EA',
+                   db_budget = None,
+                   transform_pool = None,
+                   stop_event = None,
+                   checkpoint = None,
+                   row_range: tuple[int, int] = None
+                  ) -> (Counter, int):
+    """
+    COPY one slice of source readings into the readings table on its own connection (one transaction).
+    :param db_budget: ConcurrencyBudget to hold a slot from while the connection is in use
+    :param transform_pool: TransformPool to transform the rows in (None = in this thread)
+    :param stop_event: abandon (roll back) the slice with IngestCancelled once this is set
+    :param checkpoint: DayCheckpoint - the slice's row_range is recorded in the same transaction as its rows
+    :return: (Counter of parse_float_safe status codes, rows copied)
+    """
+    if cancelled(stop_event):
+        raise IngestCancelled()
+    stream = ReadingsCopyStream(df, chunk_size=chunk_size, stn_labels=stn_labels, ea_datasource=ea_datasource,
+                                transform_pool=transform_pool, stop_event=stop_event)
+    with db_budget.slot() if db_budget else nullcontext():
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert(copy_sql(table_name or readings_table_name()), stream, size=1024 * 1024)
+            if stream.cancelled:
+                conn.rollback()     # the data ended early - don't commit the part of the slice sent
+                raise IngestCancelled()
+            if checkpoint is not None:
+                with conn.cursor() as cur:
+                    checkpoint.record_with_cursor(cur, *row_range, stream.status_counter, {'copied': stream.rows})
+            conn.commit()
+            if checkpoint is not None:
+                checkpoint.mark_done(*row_range)
+        except IngestCancelled:
+            raise
+        except Exception as e:
+            conn.rollback()
+            if stream.cancelled or cancelled(stop_event):
+                # ending part way through a csv row makes the server reject the COPY - still a cancellation
+                raise IngestCancelled() from e
+            raise
+        finally:
+            conn.close()
+    return stream.status_counter, stream.rows
+
+
+def copy_insert(df: pd.DataFrame,
+                ea_datasource: str = 'EA',
+                stn_labels: dict|None = None,
+                chunk_size: int = 50000,
+                connections: int = 2,
+                worker_id: int = 0,
+                transform_pool = None,
+                slice_rows: int = 200000,
+                checkpoint = None,
+                stop_event = None
+               ) -> (Counter, Counter):
+    """
+    Bulk load a whole day with COPY FROM STDIN, in slices of at most slice_rows rows (a transaction each)
+    over a few connections.
+    Only suitable where the day is not already in the table (as for bulk_load in threaded_insert).
+    :param checkpoint: DayCheckpoint - only its pending rows are loaded, and each slice is recorded with its rows
+    :param stop_event: threading.Event - no new slice starts (and a running one is rolled back) once it is set
+    :return: (status summary, action summary) - the action summary includes 'copied' and 'rows/sec'
+                                                (and 'cancelled' rows if stopped)
+    """
+    logmark = f"(T{worker_id}):f{ea_datasource[-10:].replace('-', '')}"
+    ranges = checkpoint.pending_ranges() if checkpoint is not None else [(0, len(df))]
+    pending_rows = sum(end - start for start, end in ranges)
+    connections = max(1, min(connections, -(-pending_rows // chunk_size) if pending_rows else 1))
+    slice_size = max(1, min(slice_rows, -(-pending_rows // connections) if pending_rows else 1))
+    slices = [(i, min(i + slice_size, end)) for start, end in ranges for i in range(start, end, slice_size)]
+    logger.info(f'{logmark}: COPY {pending_rows} rows in {len(slices)} slice(s) over {connections} connection(s)')
+
+    engine = db.engine   # resolved here, while in the app context
+    db_budget = get_db_budget()
+    total_status = Counter()
+    total_insupd = Counter()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(copy_dataframe, engine, df.iloc[start:end], None, chunk_size, stn_labels,
+                                   ea_datasource, db_budget, transform_pool, stop_event,
+                                   checkpoint=checkpoint, row_range=(start, end))
+                   for start, end in slices]
+        for (start, end), future in zip(slices, futures):
+            try:
+                status, rows = future.result()
+                total_status.update(status)
+                total_insupd['copied'] += rows
+            except IngestCancelled:
+                total_insupd['cancelled'] += end - start
+            except Exception as e:
+                logger.exception(f"{logmark}: COPY rows {start}-{end} failed with error: {e}")
+                total_insupd['failed'] += end - start
+    elapsed = time.perf_counter() - t0
+    total_insupd['rows/sec'] = int(total_insupd['copied'] / elapsed) if elapsed > 0 else 0
+    return total_status, total_insupd
+
+
+def merge_sql(table_name: str, stage_name: str) -> str:
+    """
+    Set-based upsert of a staging table into the readings table, returning only the inserted/updated counts.
+    Rows are only rewritten where one of the UPSERT_FIELDS has actually changed.
+    """
+    col_list = ', '.join(f'"{c}"' for c in COPY_COLUMNS)
+    key_list = ', '.join(UPSERT_KEY)
+    set_list = ',\n                '.join(f'{c} = EXCLUDED.{c}' for c in UPSERT_FIELDS)
+    where_list = '\n               OR '.join(f'r.{c} IS DISTINCT FROM EXCLUDED.{c}' for c in UPSERT_FIELDS)
+    return f"""
+        WITH upserted AS (
+            INSERT INTO {table_name} AS r ({col_list})
+            SELECT DISTINCT ON ({key_list}) {col_list}
+              FROM {stage_name}
+             ORDER BY {key_list}
+            ON CONFLICT ({key_list}) DO UPDATE SET
+                {set_list},
+                updated = now()
+            WHERE {where_list}
+            RETURNING (r.xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted
+    """
+
+
+def merge_insert(df: pd.DataFrame,
+                 ea_datasource: str = 'EA',
+                 stn_labels: dict|None = None,
+                 chunk_size: int = 50000,
+                 worker_id: int = 0,
+                 transform_pool = None
+                ) -> (Counter, Counter):
+    """
+    Insert/update a day of readings set-based: COPY the day into a temporary (unlogged) staging table,
+    then upsert it into the readings table with one statement, all in one transaction.
+    :return: (status summary, action summary) - the action summary has inserted, updated, unchanged and rows/sec
+    """
+    logmark = f"(T{worker_id}):f{ea_datasource[-10:].replace('-', '')}"
+    table_name = readings_table_name()
+    stage_name = 'hyd_reading_stage'
+    stream = ReadingsCopyStream(df, chunk_size=chunk_size, stn_labels=stn_labels, ea_datasource=ea_datasource,
+                                transform_pool=transform_pool)
+    insupd_counter = Counter()
+
+    t0 = time.perf_counter()
+    with get_db_budget().slot():
+        conn = db.engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE TEMP TABLE {stage_name} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP")
+                cur.copy_expert(copy_sql(stage_name), stream, size=1024 * 1024)
+                cur.execute(merge_sql(table_name, stage_name))
+                inserted, updated = cur.fetchone()
+            conn.commit()
+            insupd_counter['inserted'] = inserted
+            insupd_counter['updated'] = updated
+            insupd_counter['unchanged'] = stream.rows - inserted - updated
+        except Exception as e:
+            conn.rollback()
+            logger.exception(f"{logmark}: staged upsert failed with error: {e}")
+            insupd_counter['failed'] = len(df)
+        finally:
+            conn.close()
+    elapsed = time.perf_counter() - t0
+    insupd_counter['rows/sec'] = int(stream.rows / elapsed) if elapsed > 0 else 0
+    return stream.status_counter, insupd_counter
+
+
+def delete_readings_keys(keys: pd.DataFrame, worker_id: int = 0, ea_datasource: str = 'EA') -> int:
+    """
+    Delete the readings with the given keys set-based: COPY the keys into a temporary table, then one DELETE ... USING.
+    :param keys: 'measure' and 'dateTime' (source strings) of the rows to delete
+    :return: rows deleted
+    """
+    if keys.empty:
+        return 0
+    logmark = f"(T{worker_id}):f{ea_datasource[-10:].replace('-', '')}"
+    table_name = readings_table_name()
+    stage_name = 'hyd_reading_delete'
+    frame = pd.DataFrame({'measure': keys['measure'].to_numpy(),
+                          'r_datetime': parse_datetime_column(keys['dateTime']).to_numpy()})
+    data = io.BytesIO(frame.to_csv(header=False, index=False).encode('utf-8'))
+
+    with get_db_budget().slot():
+        conn = db.engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"CREATE TEMP TABLE {stage_name} (measure TEXT, r_datetime TIMESTAMPTZ) ON COMMIT DROP")
+                cur.copy_expert(copy_sql(stage_name, ['measure', 'r_datetime']), data)
+                cur.execute(f"""
+                    DELETE FROM {table_name} r
+                     USING {stage_name} d
+                     WHERE r.measure = d.measure
+                       AND r.r_datetime = d.r_datetime
+                """)
+                deleted = cur.rowcount
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.exception(f"{logmark}: staged delete failed with error: {e}")
+            raise
+        finally:
+            conn.close()
+    return deleted
+
+
+def day_bounds(day: datetime.date) -> (datetime.datetime, datetime.datetime):
+    """[start, end) of a UTC day - the range of its hypertable chunk (1 day chunk_time_interval)"""
+    start = datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+    return start, start + datetime.timedelta(days=1)
+
+
+def _clear_day(conn, day: datetime.date, model=ReadingHydro) -> (str, int):
+    """
+    Empty one day of the readings hypertable, in conn's open transaction, by dropping the chunks that hold it
+    (a metadata operation - no dead tuples to vacuum).
+    If those chunks also hold readings of other days (a chunk_time_interval not aligned to UTC days), the other
+    days' readings are set aside first (writers of the chunks are locked out meanwhile) and put back afterwards.
+    Only a plain table (no TimescaleDB) has the day's rows deleted.
+    Dropping a chunk takes an ACCESS EXCLUSIVE lock on it, held to the end of the transaction - queries touching
+    the day wait until then, so keep the rest of the transaction short (see replace_day).
+    The day is the UTC day (day_bounds), not the session time zone's day.
+    :return: ('drop_chunks', chunks dropped) or ('delete', rows deleted)
+    """
+    table = model.__table__
+    table_name = readings_table_name(model)
+    start, end = day_bounds(day)
+    chunks = None
+    with conn.cursor() as cur:
+        try:
+            cur.execute("""
+                SELECT chunk_schema, chunk_name, range_start, range_end
+                  FROM timescaledb_information.chunks
+                 WHERE hypertable_schema = %s AND hypertable_name = %s
+                   AND range_start < %s AND range_end > %s
+            """, (table.schema or 'public', table.name, end, start))
+            chunks = cur.fetchall()
+        except Exception as e:
+            logger.debug(f"Chunk lookup for {day} failed ({e}) - deleting rows instead")
+            conn.rollback()
+
+        if chunks is None:
+            cur.execute(f"DELETE FROM {table_name} WHERE r_datetime >= %s AND r_datetime < %s", (start, end))
+            return 'delete', cur.rowcount
+        if not chunks:
+            return 'drop_chunks', 0
+
+        window_start = min(chunk[2] for chunk in chunks)
+        window_end = max(chunk[3] for chunk in chunks)
+        kept = 0
+        if window_start < start or window_end > end:
+            chunk_list = ', '.join(f'{schema}.{name}' for schema, name, _, _ in chunks)
+            cur.execute(f"LOCK TABLE {chunk_list} IN EXCLUSIVE MODE")    # readers carry on, writers wait
+            cur.execute(f"CREATE TEMP TABLE hyd_reading_keep ON COMMIT DROP AS "
+                        f"SELECT * FROM {table_name} "
+                        f"WHERE r_datetime >= %s AND r_datetime < %s AND NOT (r_datetime >= %s AND r_datetime < %s)",
+                        (window_start, window_end, start, end))
+            kept = cur.rowcount
+        cur.execute("SELECT count(*) FROM drop_chunks(%s, older_than => %s, newer_than => %s)",
+                    (table_name, window_end, window_start))
+        dropped = cur.fetchone()[0]
+        if kept:
+            cur.execute(f"INSERT INTO {table_name} SELECT * FROM hyd_reading_keep")
+            logger.info(f"Kept {kept} readings of the days sharing {day}'s chunks")
+        return 'drop_chunks', dropped
+
+
+def clear_day(day: datetime.date) -> (str, int):
+    """Empty one day of the readings table (see _clear_day), committed. :return: (method, chunks or rows)"""
+    with get_db_budget().slot():
+        conn = db.engine.raw_connection()
+        try:
+            result = _clear_day(conn, day)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def replace_day(df: pd.DataFrame,
+                day: datetime.date,
+                ea_datasource: str = 'EA',
+                stn_labels: dict|None = None,
+                chunk_size: int = 50000,
+                worker_id: int = 0,
+                transform_pool = None
+               ) -> (Counter, Counter):
+    """
+    Replace a whole day of readings: the new day is built separately, then swapped in at chunk level.
+     1. transform and COPY the day into a temporary staging table (its own transaction - no lock on the readings
+        table, readers see the old day throughout)
+     2. in one short transaction, drop the day's chunk (see _clear_day) and insert the staged day in one
+        server-side INSERT ... SELECT - readers of that day wait only for this step
+    All of df must be readings for that UTC day (the original delete_for_date used the session time zone's day).
+    :return: (status summary, action summary) - the action summary has copied, dropped_chunks or deleted, rows/sec
+    """
+    logmark = f"(T{worker_id}):f{ea_datasource[-10:].replace('-', '')}"
+    table_name = readings_table_name()
+    stage_name = 'hyd_reading_replace'
+    col_list = ', '.join(f'"{c}"' for c in COPY_COLUMNS)
+    stream = ReadingsCopyStream(df, chunk_size=chunk_size, stn_labels=stn_labels, ea_datasource=ea_datasource,
+                                transform_pool=transform_pool)
+    insupd_counter = Counter()
+
+    t0 = time.perf_counter()
+    with get_db_budget().slot():
+        conn = db.engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                # pooled connections keep their session - a staging table left by a failed replace goes first
+                cur.execute(f"DROP TABLE IF EXISTS {stage_name}")
+                cur.execute(f"CREATE TEMP TABLE {stage_name} (LIKE {table_name} INCLUDING DEFAULTS)")
+                cur.copy_expert(copy_sql(stage_name), stream, size=1024 * 1024)
+            conn.commit()
+            t1 = time.perf_counter()
+
+            method, count = _clear_day(conn, day)
+            with conn.cursor() as cur:
+                cur.execute(f"INSERT INTO {table_name} ({col_list}) SELECT {col_list} FROM {stage_name}")
+                cur.execute(f"DROP TABLE {stage_name}")
+            conn.commit()
+            insupd_counter['dropped_chunks' if method == 'drop_chunks' else 'deleted'] = count
+            insupd_counter['copied'] = stream.rows
+            logger.info(f"{logmark}: replaced {day} ({method}, {count}) - staged in {t1 - t0:.1f}s, "
+                        f"swapped in {time.perf_counter() - t1:.1f}s")
+        except Exception as e:
+            conn.rollback()
+            logger.exception(f"{logmark}: day replace failed with error: {e}")
+            insupd_counter['failed'] = len(df)
+        finally:
+            conn.close()
+    elapsed = time.perf_counter() - t0
+    insupd_counter['rows/sec'] = int(stream.rows / elapsed) if elapsed > 0 else 0
+    return stream.status_counter, insupd_counter
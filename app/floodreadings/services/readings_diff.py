@@ -0,0 +1,92 @@
+# app/floodreadings/services/readings_diff.py
+# Incremental reload of a day: diff the re-downloaded day file against the previously archived one,
+# and apply only the inserted, changed and removed rows to the readings table
+
+import os
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from .readings_copy import merge_insert, delete_readings_keys, UPSERT_FIELDS
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# Identity of a reading in a day file, and the source columns whose change means an update
+DIFF_KEY = ['measure', 'dateTime']
+DIFF_FIELDS = UPSERT_FIELDS
+
+
+def previous_filepath(filepath: str) -> str:
+    """Where the previous copy of a day file is kept while it is re-downloaded - hydro-YYYY-MM-DD.prev.csv"""
+    root, ext = os.path.splitext(filepath)
+    return f'{root}.prev{ext}'
+
+
+def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """One 64-bit hash per row of the DIFF_FIELDS (so the comparison is one column, not seven)"""
+    fields = [name for name in DIFF_FIELDS if name in df.columns]
+    return pd.util.hash_pandas_object(df[fields], index=False).to_numpy()
+
+
+def diff_readings(old_df: pd.DataFrame, new_df: pd.DataFrame) -> (pd.DataFrame, pd.DataFrame, Counter):
+    """
+    Compare two versions of a day file by DIFF_KEY.
+    Both should be read the same way (see read_csv_day), so unchanged rows hash the same.
+    :return: (rows of new_df that are new or changed, DIFF_KEY of rows no longer in the file, counts)
+    """
+    old = pd.DataFrame({'measure': old_df['measure'].to_numpy(), 'dateTime': old_df['dateTime'].to_numpy(),
+                        '_hash': _row_hashes(old_df)}).drop_duplicates(DIFF_KEY, keep='last')
+    new = pd.DataFrame({'measure': new_df['measure'].to_numpy(), 'dateTime': new_df['dateTime'].to_numpy(),
+                        '_hash': _row_hashes(new_df), '_pos': np.arange(len(new_df))}).drop_duplicates(DIFF_KEY, keep='last')
+
+    merged = new.merge(old, on=DIFF_KEY, how='outer', suffixes=('', '_old'), indicator=True)
+    inserted = merged['_merge'] == 'left_only'
+    changed = (merged['_merge'] == 'both') & (merged['_hash'] != merged['_hash_old'])
+    removed = merged['_merge'] == 'right_only'
+
+    upserts = new_df.iloc[np.sort(merged.loc[inserted | changed, '_pos'].to_numpy().astype('int64'))]
+    removals = merged.loc[removed, DIFF_KEY].reset_index(drop=True)
+    counts = Counter({
+        'diff_inserted': int(inserted.sum()),
+        'diff_changed': int(changed.sum()),
+        'diff_removed': int(removed.sum()),
+        'diff_unchanged': int(((merged['_merge'] == 'both') & ~changed).sum()),
+    })
+    return upserts, removals, counts
+
+
+def apply_day_diff(old_df: pd.DataFrame,
+                   new_df: pd.DataFrame,
+                   ea_datasource: str = 'EA',
+                   stn_labels: dict|None = None,
+                   worker_id: int = 0,
+                   transform_pool = None
+                  ) -> (Counter, Counter):
+    """
+    Apply the difference between two versions of a day file to the readings table:
+    new and changed rows through the staged upsert (merge_insert), removed rows through a staged delete.
+    Only valid where the table holds exactly old_df for the day (see the ingest ledger).
+    :return: (status summary, action summary) - the action summary includes the diff_* counts and 'deleted'
+    """
+    logmark = f"(T{worker_id}):f{ea_datasource[-10:].replace('-', '')}"
+    t0 = time.perf_counter()
+    upserts, removals, diff_counts = diff_readings(old_df, new_df)
+    logger.info(f"{logmark}: diff against previous file: {dict(diff_counts)}")
+
+    status_summary, insupd_summary = Counter(), Counter()
+    if len(upserts):
+        status_summary, insupd_summary = merge_insert(upserts, ea_datasource=ea_datasource, stn_labels=stn_labels,
+                                                      worker_id=worker_id, transform_pool=transform_pool)
+    if len(removals):
+        try:
+            insupd_summary['deleted'] = delete_readings_keys(removals, worker_id=worker_id, ea_datasource=ea_datasource)
+        except Exception:
+            insupd_summary['failed'] += len(removals)
+
+    insupd_summary.update(diff_counts)
+    elapsed = time.perf_counter() - t0
+    insupd_summary['rows/sec'] = int(len(new_df) / elapsed) if elapsed > 0 else 0
+    return status_summary, insupd_summary
@@ -0,0 +1,164 @@
+# app/floodreadings/services/readings_procpool.py
+# Readings transform in a pool of worker processes - takes the CPU-bound stage off the GIL,
+# handing columnar (Arrow IPC) batches, or ready-made COPY csv, back to the loader threads
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+from .readings_transform import transform_readings_chunk, _to_object
+from .notation_registry import get_notation_registry
+
+try:
+    import pyarrow as pa
+except ImportError:   # optional dependency - without it batches are pickled
+    pa = None
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# Set in each worker process by _init_worker
+_worker_stn_labels = None
+
+
+def _init_worker(stn_labels: dict|None, notations: list[str]):
+    """Worker process start-up: station labels and a warm notation registry (parsed once per process)"""
+    global _worker_stn_labels
+    _worker_stn_labels = stn_labels
+    get_notation_registry().preload(notations)
+
+
+def frame_to_ipc(frame: pd.DataFrame):
+    """
+    DataFrame -> (Arrow IPC stream buffer, column dtypes) - column buffers, so no per-value pickling on the way
+    between processes. Without pyarrow, or for columns Arrow can't type, the frame itself is returned (and pickled).
+    """
+    if pa is None:
+        return frame
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return frame
+    if any(pa.types.is_timestamp(table.schema.field(name).type)
+           for name, dtype in frame.dtypes.items() if dtype == object):
+        return frame   # python datetimes with mixed (or no) utc offsets - Arrow would coerce them to one timezone
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue(), frame.dtypes.to_dict()
+
+
+def frame_from_ipc(payload) -> pd.DataFrame:
+    """Inverse of frame_to_ipc - object columns come back as python values with None for missing, as sent"""
+    if isinstance(payload, pd.DataFrame):
+        return payload
+    buffer, dtypes = payload
+    frame = pa.ipc.open_stream(buffer).read_all().to_pandas()
+    for name, dtype in dtypes.items():
+        if dtype == object:
+            frame[name] = _to_object(frame[name])
+        elif frame[name].dtype != dtype:
+            frame[name] = frame[name].astype(dtype)
+    return frame
+
+
+def _transform_task(payload, ea_datasource: str, csv_columns: list[str]|None) -> tuple:
+    """
+    Runs in a worker process.
+    :return: (Arrow IPC frame, or csv bytes if csv_columns is given, Counter of status codes, rows, cpu seconds)
+    """
+    t0 = time.process_time()
+    chunk_df = frame_from_ipc(payload)
+    frame, value_status = transform_readings_chunk(chunk_df, stn_labels=_worker_stn_labels, ea_datasource=ea_datasource)
+    if csv_columns:
+        result = frame[csv_columns].to_csv(header=False, index=False).encode('utf-8')
+    else:
+        result = frame_to_ipc(frame)
+    return result, value_status, len(frame), time.process_time() - t0
+
+
+class TransformPool:
+    """
+    transform_readings_chunk in a pool of worker processes, shared by every loader thread of an ingest run.
+    The station labels are fixed when the pool starts; each process parses the known notations once.
+    Use as a context manager (or call close()).
+    """
+    def __init__(self, processes: int = None, stn_labels: dict|None = None, notations: Iterable[str] = None):
+        """
+        :param processes: worker processes (default: the number of cpus)
+        :param stn_labels: station notation -> label
+        :param notations: notations to preload in each worker (default: those in this process' registry)
+        """
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        if notations is None:
+            notations = get_notation_registry().notations()
+        # spawn, not fork - the loader process has threads and open database connections
+        self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_init_worker,
+                                             initargs=(stn_labels, list(notations)))
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.rows = 0
+        self.cpu_seconds = 0.0
+        self.wait_seconds = 0.0
+        logger.info(f"Transform pool: {self.processes} worker processes"
+                    f"{'' if pa is not None else ' (pyarrow not installed - batches are pickled)'}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, chunk_df: pd.DataFrame, ea_datasource: str = 'EA', csv_columns: list[str] = None) -> Future:
+        return self._executor.submit(_transform_task, frame_to_ipc(chunk_df), ea_datasource, csv_columns)
+
+    def _result(self, future: Future) -> tuple:
+        t0 = time.perf_counter()
+        result, value_status, rows, cpu = future.result()
+        with self._lock:
+            self.wait_seconds += time.perf_counter() - t0
+            self.chunks += 1
+            self.rows += rows
+            self.cpu_seconds += cpu
+        return result, value_status, rows
+
+    def transform(self, chunk_df: pd.DataFrame, ea_datasource: str = 'EA') -> (pd.DataFrame, Counter):
+        """As transform_readings_chunk (the calling thread waits, without the GIL, for a worker process)"""
+        payload, value_status, _ = self._result(self.submit(chunk_df, ea_datasource))
+        return frame_from_ipc(payload), value_status
+
+    def imap_csv(self, chunks: Iterable[pd.DataFrame], ea_datasource: str, csv_columns: list[str],
+                 ahead: int = None) -> Iterator[tuple]:
+        """
+        Transform chunks to COPY csv in the worker processes, keeping up to `ahead` chunks in flight.
+        :return: (csv bytes, Counter of status codes, rows) per chunk, in order
+        """
+        ahead = max(1, ahead or self.processes)
+        pending = deque()
+        for chunk_df in chunks:
+            pending.append(self.submit(chunk_df, ea_datasource, csv_columns))
+            if len(pending) >= ahead:
+                yield self._result(pending.popleft())
+        while pending:
+            yield self._result(pending.popleft())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'processes': self.processes,
+                'chunks': self.chunks,
+                'rows': self.rows,
+                'cpu_s': round(self.cpu_seconds, 1),
+                'wait_s': round(self.wait_seconds, 1),
+            }
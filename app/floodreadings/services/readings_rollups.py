@@ -0,0 +1,87 @@
+# app/floodreadings/services/readings_rollups.py
+# Hourly and daily rollups of the readings per measure (TimescaleDB continuous aggregates, see
+# DDL/production/hyd_reading_rollup.sql) - refreshed for each day as it is loaded, and read for charts and analysis
+
+import datetime
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from app import db
+from .readings_copy import day_bounds
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# In refresh order - the daily rollup is built from the hourly one
+ROLLUP_VIEWS = {
+    'hourly': 'production.hyd_reading_hourly',
+    'daily': 'production.hyd_reading_daily',
+}
+
+# Refreshes of the same aggregate from several day workers would only queue on each other's locks in the database
+_refresh_lock = threading.Lock()
+
+
+def refresh_rollups(start_date: datetime.date, end_date: datetime.date = None) -> bool:
+    """
+    Refresh the rollups for whole days (UTC), hourly before daily.
+    :return: False if the refresh failed (e.g. the continuous aggregates don't exist) - the load itself is unaffected
+    """
+    start, _ = day_bounds(start_date)
+    _, end = day_bounds(end_date or start_date)
+    t0 = time.perf_counter()
+    try:
+        with _refresh_lock, db.engine.connect() as conn:
+            # refresh_continuous_aggregate can't run inside a transaction block
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            for view in ROLLUP_VIEWS.values():
+                conn.execute(text("CALL refresh_continuous_aggregate(CAST(:view AS regclass), "
+                                  "CAST(:start AS timestamptz), CAST(:end AS timestamptz))"),
+                             {'view': view, 'start': start, 'end': end})
+    except Exception as e:
+        logger.warning(f"Readings rollups not refreshed for {start_date} to {end_date or start_date}: {e}")
+        return False
+    logger.info(f"Readings rollups refreshed for {start_date}"
+                f"{f' to {end_date}' if end_date and end_date != start_date else ''} "
+                f"in {time.perf_counter() - t0:.1f}s")
+    return True
+
+
+def refresh_rollups_range(start_date: datetime.date, end_date: datetime.date, days_per_refresh: int = 31) -> int:
+    """
+    (Re)build the rollups for a range of days in batches - for the history loaded before the rollups existed.
+    :return: batches that failed
+    """
+    failed = 0
+    current = start_date
+    while current <= end_date:
+        batch_end = min(current + datetime.timedelta(days=days_per_refresh - 1), end_date)
+        if not refresh_rollups(current, batch_end):
+            failed += 1
+        current = batch_end + datetime.timedelta(days=1)
+    return failed
+
+
+def read_rollup(notations: list[str]|str,
+                start: datetime.datetime,
+                end: datetime.datetime,
+                granularity: str = 'daily'
+               ) -> pd.DataFrame:
+    """
+    Rollup rows of some measures over [start, end), ordered by notation and bucket.
+    :param granularity: 'hourly' or 'daily'
+    """
+    if granularity not in ROLLUP_VIEWS:
+        raise ValueError(f"granularity must be one of {list(ROLLUP_VIEWS)}")
+    if isinstance(notations, str):
+        notations = [notations]
+    sql = text(f"""
+        SELECT * FROM {ROLLUP_VIEWS[granularity]}
+         WHERE notation = ANY(:notations) AND bucket >= :start AND bucket < :end
+         ORDER BY notation, bucket
+    """)
+    with db.engine.connect() as conn:
+        return pd.read_sql(sql, conn, params={'notations': list(notations), 'start': start, 'end': end})
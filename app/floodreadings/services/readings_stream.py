@@ -0,0 +1,179 @@
+# app/floodreadings/services/readings_stream.py
+# Streaming download -> parse -> load of HYDROLOGY API day files, in bounded batches
+
+import io
+import os
+import threading
+from collections import Counter
+from queue import Queue
+from typing import Callable, Iterator
+
+import pandas as pd
+import requests
+from app.utils import ea_get, hydrology_root_url as ea_root_url
+
+from .readings_archive import (parquet_available, parquet_filepath, iter_parquet_day, iter_csv_day,
+                               convert_csv_to_parquet)
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+
+class TeeResponseReader(io.RawIOBase):
+    """
+    File object over a streamed HTTP response body that also archives every byte it reads to a local file.
+    pd.read_csv(chunksize=...) pulls from it, so parsing keeps pace with the download.
+    """
+    def __init__(self, response: requests.Response, archive_file, chunk_size: int = 1024 * 1024):
+        super().__init__()
+        self._content = response.iter_content(chunk_size=chunk_size)
+        self._archive_file = archive_file
+        self._buffer = b''
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._content)
+            except StopIteration:
+                return 0
+            self._archive_file.write(self._buffer)
+            self.bytes_read += len(self._buffer)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def hydrology_readings_filepath(datestr: str, save_basefolder: str = "readings_hydrology") -> str:
+    """Archive path of a day file - readings_hydrology/YYYY/hydro-YYYY-MM-DD.csv (the folder is created)"""
+    save_folder = os.path.join(save_basefolder, datestr[:4])
+    os.makedirs(save_folder, exist_ok=True)  # Ensure the folder exists
+    return os.path.join(save_folder, f'hydro-{datestr}.csv')
+
+
+def iter_hydrology_readings(datestr: str,
+                            save_basefolder: str = "readings_hydrology",
+                            force_replace: bool = False,
+                            batch_rows: int = 100000,
+                            archive_format: str = 'csv'
+                           ) -> Iterator[pd.DataFrame]:
+    """
+    Source readings for one day as DataFrame batches of at most batch_rows rows.
+    An existing (non-empty) archive file is read in batches, preferring the typed parquet file if there is one;
+    otherwise the day is downloaded and parsed as it arrives, while being archived to '<file>.part'
+    (renamed into place once the download completes, and converted to parquet if archive_format='parquet').
+    """
+    filepath = hydrology_readings_filepath(datestr, save_basefolder)
+    parquet_path = parquet_filepath(filepath)
+
+    if os.path.exists(parquet_path):
+        if force_replace:
+            os.remove(parquet_path)
+            logger.info(f"Removed existing file: {parquet_path}")
+        elif parquet_available():
+            logger.info(f"Using existing local file: {parquet_path}")
+            yield from iter_parquet_day(parquet_path, batch_rows=batch_rows)
+            return
+
+    if os.path.exists(filepath):
+        if force_replace or os.path.getsize(filepath) == 0:
+            os.remove(filepath)
+            logger.info(f"Removed existing file: {filepath}")
+        else:
+            logger.info(f"Using existing local file: {filepath}")
+            yield from iter_csv_day(filepath, batch_rows=batch_rows)
+            return
+
+    url = f'{ea_root_url}/data/readings.csv?_view=full&_limit=1000000&date={datestr}'
+    response = ea_get(url, stream=True, timeout=60)
+    if response.status_code != 200:
+        logger.warning(f'Response {response.status_code}: Failed to fetch data from {url}')
+        return
+    logger.info(f'Fetched {url} (streaming)')
+
+    partpath = f'{filepath}.part'
+    completed = False
+    try:
+        with open(partpath, 'wb') as f:
+            reader = io.BufferedReader(TeeResponseReader(response, f), buffer_size=1024 * 1024)
+            yield from iter_csv_day(reader, batch_rows=batch_rows)
+            completed = True
+    except pd.errors.EmptyDataError:
+        logger.warning(f"No data in response from {url}")
+    finally:
+        response.close()
+        if completed:
+            os.replace(partpath, filepath)
+            logger.info(f"Saved: {filepath}")
+            if archive_format == 'parquet':
+                convert_csv_to_parquet(filepath, replace=True)
+        elif os.path.exists(partpath):
+            os.remove(partpath)
+
+
+_END = object()
+
+def stream_hydrology_readings(datestr: str,
+                              load_batch: Callable[[pd.DataFrame], tuple],
+                              save_basefolder: str = "readings_hydrology",
+                              force_replace: bool = False,
+                              batch_rows: int = 100000,
+                              queue_depth: int = 2,
+                              archive_format: str = 'csv'
+                             ) -> tuple|None:
+    """
+    Download/parse a day on a background thread and load each batch as soon as it is ready.
+    At most queue_depth parsed batches wait for the loader, so memory stays flat whatever the day size.
+    :param load_batch: called with each batch, returns (status summary, action summary) - e.g. threaded_insert
+    :return: (total status summary, total action summary, rows) or None if no data was available
+    """
+    batches = Queue(maxsize=queue_depth)
+    stop = threading.Event()
+
+    def producer():
+        source = iter_hydrology_readings(datestr, save_basefolder=save_basefolder,
+                                         force_replace=force_replace, batch_rows=batch_rows,
+                                         archive_format=archive_format)
+        try:
+            for batch in source:
+                if stop.is_set():
+                    break
+                batches.put(batch)
+            batches.put(_END)
+        except Exception as e:
+            batches.put(e)
+        finally:
+            source.close()   # an abandoned download removes its .part file
+
+    thread = threading.Thread(target=producer, name=f'hydro-stream-{datestr}', daemon=True)
+    thread.start()
+
+    total_status = Counter()
+    total_insupd = Counter()
+    rows = 0
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _END:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            status, insupd = load_batch(batch)
+            total_status.update(status)
+            total_insupd.update({k: v for k, v in insupd.items() if k != 'rows/sec'})
+            rows += len(batch)
+    finally:
+        stop.set()
+        while thread.is_alive():
+            # unblock a producer waiting on a full queue
+            while not batches.empty():
+                batches.get_nowait()
+            thread.join(timeout=0.1)
+
+    if rows == 0:
+        return None
+    return total_status, total_insupd, rows
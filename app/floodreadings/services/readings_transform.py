@@ -0,0 +1,352 @@
+# app/floodreadings/services/readings_transform.py
+# Column-wise (whole chunk) transformation of HYDROLOGY API readings into ReadingHydro rows
+
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from dateutil.parser import parse
+
+from app.utils.utils_date import parse_datetime_column
+from app.utils.ea_client import hydrology_root_url as ea_root_url
+from .notation_registry import parse_notation, get_notation_registry   # noqa (parse_notation re-exported)
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+
+# Fields returned by parse_notation (parameter_name is never populated, but it is a ReadingHydro column)
+NOTATION_FIELDS = ['station_id', 'parameter_name', 'parameter', 'qualifier',
+                   'value_type', 'period_name', 'unit_name', 'observation_type']
+
+# Source (csv) columns passed straight through to the readings table
+QUALITY_FIELDS = ['completeness', 'quality', 'qcode', 'valid', 'invalid', 'missing']
+
+# Column order of a transformed chunk - the same keys as the original per-row reading dict (plus period)
+READING_COLUMNS = ['source', 'r_datetime', 'r_month', 'r_date',
+                   'measure', 'notation', 'label',
+                   'value',
+                   *QUALITY_FIELDS,
+                   'station_id', 'parameter_name', 'parameter', 'qualifier',
+                   'value_type', 'period_name', 'period', 'unit_name', 'observation_type',
+                   'updated']
+
+
+def parse_float_safe(val: str, min_val: float =-9999999.0, max_val:float =9999999.0) -> (float|None, int) :
+    try:
+        # Catch actual NaN objects (e.g., from pandas, float('nan'), numpy.nan)
+        if pd.isna(val):
+            return None, 1  # actual NaN detected
+
+        # Handle string "nan" explicitly
+        if isinstance(val, str):
+            val = val.strip()
+            if val.lower() == "nan":
+                return None, 2
+
+        f = float(val)
+        if math.isnan(f):
+            return None, 3  # float('nan') slipped through
+
+        # noinspection PyUnreachableCode
+        if 1==1:  #min_val <= f <= max_val:
+            return f, 0     # normal - the vast majority will return from here
+        else:
+            logger.error(f"Out-of-range value: {val}")
+            return None, 4  # Out-of-range value
+    except (TypeError, ValueError):
+        try:
+            if isinstance(val, str) and "|" in val:
+                val = val.split("|")[-1]  # get last part after '|'
+            else:
+                logger.error(f"Invalid float value: {val}")
+                return None, 5  # Invalid float value
+
+            f = float(val)
+            if min_val <= f <= max_val:
+                return f, 6    # split: normal
+            else:
+                logger.error(f"Out-of-range value: {val}")
+                return None, 7  # split: Out-of-range value
+        except (TypeError, ValueError):
+            logger.exception(f"Invalid float value: {val}")
+            return None, 8      # split: Out-of-range value
+
+
+def parse_period_safe(period_str) -> int:
+    """
+    Period column to int - missing, None/NaN or unparseable values are all set to 0.
+    Infinite values are 0 as well (the per-row code raised OverflowError on them and failed the chunk).
+    """
+    try:
+        # handle NaN or missing
+        if pd.isna(period_str):
+            return 0
+        return int(float(period_str))
+    except (ValueError, TypeError, OverflowError):
+        return 0
+
+
+def _column(chunk_df: pd.DataFrame, name: str, default=None) -> pd.Series:
+    """A source column, or a constant column (like row.get(name, default)) if the csv does not have it."""
+    if name in chunk_df.columns:
+        return chunk_df[name]
+    return pd.Series(default, index=chunk_df.index, dtype=object)
+
+
+def _to_object(series: pd.Series) -> pd.Series:
+    """Object column of python values with None for all missing (NaN/NaT) entries - ready for the db driver."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = pd.Series(np.asarray(series.dt.to_pydatetime(), dtype=object), index=series.index)
+    else:
+        series = series.astype(object)
+    return series.where(series.notna(), None)
+
+
+def parse_float_column(values: pd.Series, min_val: float =-9999999.0, max_val:float =9999999.0) -> (pd.Series, pd.Series):
+    """
+    Whole column equivalent of parse_float_safe().
+    The common cases (numbers, NaN, 'nan' and 'a|b' pairs) are resolved with column operations,
+    anything else goes through parse_float_safe() itself so the status codes (and log messages) are unchanged.
+    :return: (float values with NaN for None, int status codes)
+    """
+    result = pd.Series(np.nan, index=values.index, dtype='float64')
+    status = pd.Series(-1, index=values.index, dtype='int64')   # -1 = not yet resolved
+
+    missing = values.isna()
+    status[missing] = 1
+
+    text = values[~missing].astype(str).str.strip()
+    nan_text = text.str.lower() == 'nan'
+    status[nan_text[nan_text].index] = 2
+    text = text[~nan_text]
+
+    numbers = pd.to_numeric(text, errors='coerce').astype('float64')
+    ok = numbers.notna()
+    result[ok[ok].index] = numbers[ok]
+    status[ok[ok].index] = 0
+
+    # "a|b" values - the last part is the reading
+    rest = text[~ok]
+    piped = rest[rest.str.contains('|', regex=False)]
+    if len(piped):
+        tail = pd.to_numeric(piped.str.rsplit('|', n=1).str[-1], errors='coerce').astype('float64')
+        in_range = tail.between(min_val, max_val)
+        result[in_range[in_range].index] = tail[in_range]
+        status[in_range[in_range].index] = 6
+
+    # Anything left (out-of-range, invalid, '-nan' etc.) is rare - do it the slow way
+    unresolved = status[status == -1].index
+    for idx in unresolved:
+        val, code = parse_float_safe(values.at[idx], min_val=min_val, max_val=max_val)
+        result.at[idx] = np.nan if val is None else val
+        status.at[idx] = code
+
+    return result, status
+
+
+def parse_measure_column(measure: pd.Series, stn_labels: dict|None = None) -> dict:
+    """
+    Notation, parsed notation fields and station label for every row of a 'measure' column.
+    Each distinct measure is looked up once (in the shared notation registry), then broadcast back to the rows
+    by its factorized code.
+    :return: dict of column name -> object Series (notation, label and NOTATION_FIELDS)
+    """
+    codes, uniques = pd.factorize(measure)
+    registry = get_notation_registry()
+
+    fields = {name: [] for name in ['notation', 'label', *NOTATION_FIELDS]}
+    for m in uniques:
+        notation = m.replace(f'{ea_root_url}/id/measures/', '').strip() if isinstance(m, str) else None
+        parsed = registry.lookup(notation) or {}
+        fields['notation'].append(notation)
+        fields['label'].append(stn_labels.get(parsed.get('station_id')) if stn_labels else None)
+        for name in NOTATION_FIELDS:
+            fields[name].append(parsed.get(name))
+
+    # One extra trailing None so the missing-value code (-1) picks it up
+    return {name: pd.Series(np.array(vals + [None], dtype=object)[codes], index=measure.index, dtype=object)
+            for name, vals in fields.items()}
+
+
+def transform_readings_chunk(chunk_df: pd.DataFrame,
+                             stn_labels: dict|None = None,
+                             ea_datasource: str = 'EA'
+                            ) -> (pd.DataFrame, Counter):
+    """
+    Transform a chunk of source readings (as read from the EA csv) into ReadingHydro rows, a column at a time.
+    Gives the same rows as the original per-row loop in insert_chunk (see transform_readings_rowwise).
+    :param chunk_df: source readings (measure, date, dateTime, value, period and the quality columns),
+                     either all strings (csv) or typed (parquet archive, see readings_archive)
+    :param stn_labels: station notation -> label
+    :param ea_datasource: value for the 'source' column
+    :return: (DataFrame with READING_COLUMNS, Counter of parse_float_safe status codes)
+    """
+    r_datetime = parse_datetime_column(_column(chunk_df, 'dateTime'))
+    if pd.api.types.is_datetime64_any_dtype(r_datetime):
+        r_month = (r_datetime.dt.normalize() - pd.to_timedelta(r_datetime.dt.day - 1, unit='D')).dt.date
+    else:
+        r_month = r_datetime.map(lambda d: d.replace(day=1).date() if pd.notnull(d) else None)
+
+    if 'value_status' in chunk_df.columns:
+        # typed readings (parquet archive) - value already parsed
+        value, status = chunk_df['value'].astype('float64'), chunk_df['value_status'].astype('int64')
+    else:
+        value, status = parse_float_column(_column(chunk_df, 'value'))
+
+    period_raw = _column(chunk_df, 'period', 0)
+    period = pd.to_numeric(period_raw, errors='coerce')
+    period = period.where(np.isfinite(period), np.nan)
+    odd = period.isna() & period_raw.notna()
+    if odd.any():
+        period[odd] = period_raw[odd].map(parse_period_safe)
+    period = np.trunc(period.fillna(0)).astype('int64')
+
+    parsed = parse_measure_column(_column(chunk_df, 'measure', ''), stn_labels=stn_labels)
+
+    frame = pd.DataFrame({
+        'source': ea_datasource,
+        'r_datetime': _to_object(r_datetime),
+        'r_month': _to_object(r_month),
+        'r_date': _column(chunk_df, 'date'),
+        'measure': _column(chunk_df, 'measure', ''),
+        'notation': parsed['notation'],
+        'label': parsed['label'],
+        'value': _to_object(value),
+        **{name: _column(chunk_df, name) for name in QUALITY_FIELDS},
+        **{name: parsed[name] for name in NOTATION_FIELDS},
+        'period': period,
+        'updated': None,
+    }, index=chunk_df.index)[READING_COLUMNS]
+
+    status_counter = Counter({int(code): int(count) for code, count in status.value_counts().items()})
+    return frame, status_counter
+
+
+def readings_to_records(frame: pd.DataFrame) -> list[dict]:
+    """Transformed chunk -> list of reading dicts for the ORM insert paths."""
+    return frame.to_dict('records')
+
+
+def transform_readings_rowwise(chunk_df: pd.DataFrame,
+                               stn_labels: dict|None = None,
+                               ea_datasource: str = 'EA'
+                              ) -> (list[dict], Counter):
+    """
+    The original per-row transformation (iterrows) - kept as the reference for check_transform_parity.
+    Unchanged from insert_chunk, except that the period it computed is now returned in the reading dict.
+    """
+    status_counter = Counter()
+    readings = []
+    for _, row in chunk_df.iterrows():
+
+        dtm = row.get("dateTime")
+        if isinstance(dtm, str):  # a string (as it is when read from a csv file)
+            r_datetime = parse(dtm)
+        elif pd.notnull(dtm):
+            r_datetime = dtm  # already a datetime (as it is when read from a database table)
+        else:
+            r_datetime = None
+
+        r_month = r_datetime.replace(day=1).date() if r_datetime else None
+        #r_date  = r_datetime.date() if r_datetime else None
+
+        measure = row.get("measure", '')
+        notation = measure.replace(f'{ea_root_url}/id/measures/', '').strip() if isinstance(measure, str) else None
+
+        parsed = parse_notation(notation)
+        label = stn_labels.get(parsed.get("station_id")) if stn_labels else None
+
+        val, status = parse_float_safe(row.get("value"))
+        status_counter[status] += 1
+
+        # handles missing or None/NaN values in period column - sets all of these to 0
+        period_str = row.get("period", 0)
+        try:
+            # handle NaN or missing
+            if pd.isna(period_str):
+                period = 0
+            else:
+                period = int(float(period_str))
+        except (ValueError, TypeError):
+            period = 0
+
+        reading = {
+            'source' : ea_datasource,
+            'r_datetime' : r_datetime,
+            'r_month' : r_month,
+            'r_date' : row.get("date"),
+
+            'measure' : measure,
+            'notation' : notation,
+            'label' : label,
+
+            # Value
+            'value' : val,
+
+            # Data quality attributes
+            'completeness' : row.get("completeness"),
+            'quality' : row.get("quality"),
+            'qcode' : row.get("qcode"),
+            'valid' : row.get("valid"),
+            'invalid' : row.get("invalid"),
+            'missing' : row.get("missing"),
+
+            # Parsed "notation" fields (from "measure" in sources data)
+            'station_id': parsed.get("station_id") if parsed else None,
+            'parameter_name': parsed.get("parameter_name") if parsed else None,
+            'parameter': parsed.get("parameter") if parsed else None,
+            'qualifier': parsed.get("qualifier") if parsed else None,
+            'value_type': parsed.get("value_type") if parsed else None,
+            'period_name': parsed.get("period_name") if parsed else None,
+            'period': period,
+            'unit_name': parsed.get("unit_name") if parsed else None,
+            'observation_type': parsed.get("observation_type") if parsed else None,
+            'updated': None
+        }
+
+        readings.append(reading)
+    return readings, status_counter
+
+
+def _same_value(a, b) -> bool:
+    """Reading values are equal, treating None/NaN/NaT as the same 'missing' value."""
+    if pd.isna(a) or pd.isna(b):
+        return bool(pd.isna(a) and pd.isna(b))
+    return a == b
+
+
+def check_transform_parity(chunk_df: pd.DataFrame,
+                           stn_labels: dict|None = None,
+                           ea_datasource: str = 'EA',
+                           max_examples: int = 5,
+                           transform_pool = None
+                          ) -> dict:
+    """
+    Compare transform_readings_chunk with the original per-row transformation for one chunk.
+    :param transform_pool: run transform_readings_chunk in this TransformPool (checks the process hand-back too)
+    :return: dict with row count, mismatched row count, whether the status counts agree and some example mismatches
+    """
+    expected, expected_status = transform_readings_rowwise(chunk_df, stn_labels=stn_labels, ea_datasource=ea_datasource)
+    if transform_pool is not None:
+        frame, status = transform_pool.transform(chunk_df, ea_datasource=ea_datasource)
+    else:
+        frame, status = transform_readings_chunk(chunk_df, stn_labels=stn_labels, ea_datasource=ea_datasource)
+    actual = readings_to_records(frame)
+
+    mismatched = 0
+    examples = []
+    for row_num, (exp, act) in enumerate(zip(expected, actual)):
+        diffs = {k: (exp.get(k), act.get(k)) for k in READING_COLUMNS if not _same_value(exp.get(k), act.get(k))}
+        if diffs:
+            mismatched += 1
+            if len(examples) < max_examples:
+                examples.append({'row': row_num, 'diffs': diffs})
+
+    return {
+        'rows': len(chunk_df),
+        'mismatched_rows': mismatched + abs(len(expected) - len(actual)),
+        'status_match': expected_status == status,
+        'examples': examples,
+    }
@@ -1,7 +1,24 @@
-from flask import render_template
+from flask import render_template, Response, current_app, abort
 from app.main import bp
+from app.utils.metrics import get_metrics, read_metrics_file, CONTENT_TYPE
 
 
 @bp.route('/')
 def index():
     return render_template('index.html')
+
+
+@bp.route('/metrics')
+def metrics():
+    """This process's metrics in the Prometheus text exposition format"""
+    return Response(get_metrics().render(), content_type=CONTENT_TYPE)
+
+
+@bp.route('/metrics/ingest')
+def ingest_metrics():
+    """The metrics of the latest CLI loader run, as written to METRICS_FILE (404 if not configured or not written yet)"""
+    filepath = current_app.config.get('METRICS_FILE')
+    text = read_metrics_file(filepath) if filepath else None
+    if text is None:
+        abort(404)
+    return Response(text, content_type=CONTENT_TYPE)
@@ -1,4 +1,7 @@
 from . import logger
 from .validate_date import validate_date
 from .utils_geo import get_geoms
-from .utils_date import parse_date, parse_datetime
\ No newline at end of file
+from .utils_date import parse_date, parse_datetime, parse_datetime_column, get_datetime_parser
+from .ea_client import ea_get, get_ea_client, hydrology_root_url, floodmonitoring_root_url
+from .db_budget import get_db_budget, ConcurrencyBudget
+from .metrics import get_metrics, write_metrics_file
@@ -0,0 +1,97 @@
+# app/utils/db_budget.py
+# Process-wide budget of concurrent database connections for ingest work.
+# Day workers and their chunk threads all draw from the same budget, so nested thread pools
+# can't open more connections than the engine pool (or the server) can sustain.
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app
+
+from .metrics import get_metrics
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# annotate the proxy so the IDE knows its real type
+from werkzeug.local import LocalProxy
+current_app: LocalProxy
+
+slot_wait_seconds = get_metrics().histogram('ingest_db_slot_wait_seconds',
+                                            "Wait for a slot of the ingest database budget (pool wait)")
+slots_in_use = get_metrics().gauge('ingest_db_slots_in_use', "Ingest database budget slots held")
+slots_limit = get_metrics().gauge('ingest_db_slots_limit', "Size of the ingest database budget")
+
+
+class ConcurrencyBudget:
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak = 0
+        self.acquired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @contextmanager
+    def slot(self):
+        """Hold one database slot for the duration of the block (waits for a free one)"""
+        t0 = time.perf_counter()
+        self._semaphore.acquire()
+        wait = time.perf_counter() - t0
+        with self._lock:
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+            self.acquired += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        slot_wait_seconds.observe(wait)
+        slots_in_use.inc()
+        try:
+            yield wait
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            slots_in_use.dec()
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_use': self.in_use,
+                'peak': self.peak,
+                'acquired': self.acquired,
+                'wait_total_s': round(self.wait_total, 2),
+                'wait_mean_ms': round(1000 * self.wait_total / self.acquired, 1) if self.acquired else None,
+                'wait_max_s': round(self.wait_max, 2),
+            }
+
+
+def budget_limit_from_config(config) -> int:
+    """
+    INGEST_DB_CONCURRENCY, capped to what the engine pool can hand out (pool_size + max_overflow),
+    less INGEST_DB_RESERVE connections kept back for everything else in the process.
+    """
+    engine_options = config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    pool_capacity = engine_options.get('pool_size', 5) + engine_options.get('max_overflow', 10)
+    pool_capacity -= config.get('INGEST_DB_RESERVE', 0)
+    requested = config.get('INGEST_DB_CONCURRENCY') or pool_capacity
+    return max(1, min(requested, pool_capacity))
+
+
+_db_budget = None
+_db_budget_lock = threading.Lock()
+
+def get_db_budget() -> ConcurrencyBudget:
+    """The process-wide ingest budget (sized from the app config on first use, so needs an app context then)"""
+    global _db_budget
+    if _db_budget is None:
+        with _db_budget_lock:
+            if _db_budget is None:
+                _db_budget = ConcurrencyBudget(budget_limit_from_config(current_app.config))
+                slots_limit.set(_db_budget.limit)
+                logger.info(f"Ingest database budget: {_db_budget.limit} concurrent connections")
+    return _db_budget
@@ -0,0 +1,136 @@
+# app/utils/ea_client.py
+# Shared HTTP client for the Environment Agency APIs (hydrology and flood-monitoring)
+#  - one requests.Session per process: pooled keep-alive connections, gzip
+#  - retry with exponential backoff on connection errors and transient 5xx/429 responses
+#  - a per-host limit on concurrent requests
+#  - request timing histogram, errors and retries per host (in the metrics registry - see metrics.py)
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import get_metrics
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# Root URLs of the EA APIs - imported (as ea_root_url) by the modules that build request urls or strip them from ids
+hydrology_root_url = 'http://environment.data.gov.uk/hydrology'              # source data for extended history
+floodmonitoring_root_url = 'http://environment.data.gov.uk/flood-monitoring'  # original source data
+
+# Upper bounds (seconds) of the request timing histogram buckets (the last bucket is everything slower)
+TIMING_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+request_seconds = get_metrics().histogram('ea_request_seconds', "EA API request time, up to the response headers",
+                                          ('host',), buckets=TIMING_BUCKETS)
+request_errors = get_metrics().counter('ea_request_errors_total', "EA API requests failed or answered with a 4xx/5xx",
+                                       ('host',))
+request_retries = get_metrics().counter('ea_request_retries_total', "EA API retries (connection errors, 429 and 5xx)",
+                                        ('host',))
+
+
+class EAClient:
+    def __init__(self,
+                 pool_maxsize: int = 32,
+                 per_host_limit: int = 8,
+                 retries: int = 5,
+                 backoff_factor: float = 1.0,
+                 timeout: float|tuple = (10, 120)
+                ):
+        """
+        :param pool_maxsize: keep-alive connections kept per host
+        :param per_host_limit: maximum concurrent requests to any one host
+        :param retries: retries for connection errors and 429/5xx responses
+        :param backoff_factor: retry sleep is backoff_factor * 2**(retry - 1) seconds
+        :param timeout: default (connect, read) timeout for every request
+        """
+        self.timeout = timeout
+        self.per_host_limit = per_host_limit
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset({'GET', 'HEAD'}),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)   # the last response is returned (callers check status_code)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'User-Agent': 'floodWatch3',
+        })
+
+        self._lock = threading.Lock()
+        self._host_limits: dict[str, threading.BoundedSemaphore] = {}
+
+    def _host_limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_limits[host]
+
+    @staticmethod
+    def _record(host: str, elapsed: float, response: requests.Response|None):
+        request_seconds.observe(elapsed, host=host)
+        if response is None or response.status_code >= 400:
+            request_errors.inc(host=host)
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)   # urllib3's Retry, with its history
+        if retries is not None and retries.history:
+            request_retries.inc(len(retries.history), host=host)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        requests.get() through the shared session. The per-host limit covers the request up to the response
+        headers (a streamed body is read afterwards, outside the limit).
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        response = None
+        t0 = time.perf_counter()
+        with self._host_limit(host):
+            try:
+                response = self.session.get(url, **kwargs)
+                return response
+            finally:
+                self._record(host, time.perf_counter() - t0, response)
+
+    def timing_summary(self) -> dict:
+        """Per host: request count, errors, retries, mean seconds and the timing histogram ({'<=0.1': n, ..., '>300': n})"""
+        labels = [f'<={b}' for b in TIMING_BUCKETS] + [f'>{TIMING_BUCKETS[-1]}']
+        errors = request_errors.totals()
+        retries = request_retries.totals()
+        return {
+            host: {
+                'count': t['count'],
+                'errors': errors.get(host, 0),
+                'retries': retries.get(host, 0),
+                'mean_s': round(t['sum'] / t['count'], 3) if t['count'] else None,
+                'histogram': {label: n for label, n in zip(labels, t['buckets']) if n},
+            }
+            for host, t in request_seconds.series().items()
+        }
+
+
+_ea_client = None
+_ea_client_lock = threading.Lock()
+
+def get_ea_client() -> EAClient:
+    """The process-wide EA client (created on first use)"""
+    global _ea_client
+    if _ea_client is None:
+        with _ea_client_lock:
+            if _ea_client is None:
+                _ea_client = EAClient()
+    return _ea_client
+
+
+def ea_get(url: str, **kwargs) -> requests.Response:
+    """GET an EA API url through the shared client - a drop-in for requests.get()"""
+    return get_ea_client().get(url, **kwargs)
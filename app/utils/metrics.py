@@ -0,0 +1,221 @@
+# app/utils/metrics.py
+# In-process metrics: labelled counters, gauges and histograms, rendered in the Prometheus text exposition format.
+#  - served by the web app on /metrics
+#  - written to METRICS_FILE at the end of a CLI loader run (for the node_exporter textfile collector),
+#    and the latest file served by the web app on /metrics/ingest
+# Each process has its own registry, so a CLI run's metrics are only seen through its file - scrape /metrics/ingest
+# (or the textfile collector) as well as /metrics. They are separate endpoints because both processes register
+# metrics of the same names, which can't be repeated in one exposition.
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# Upper bounds (seconds) of the default histogram buckets (the +Inf bucket is added on rendering)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames) or any(name not in labels for name in self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels_text(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+    def samples(self):
+        """(name suffix, label text, value) of every series"""
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield '', self._labels_text(key), value
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{self.name}{suffix}{labels} {_format(value)}' for suffix, labels, value in self.samples()]
+        return '\n'.join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError(f"{self.name}: counters only go up")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def totals(self) -> dict:
+        """label values (a tuple, or the value for a single label) -> count"""
+        with self._lock:
+            return {key[0] if len(key) == 1 else key: value for key, value in self._values.items()}
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(self.buckets) + 1)}
+            series['count'] += 1
+            series['sum'] += value
+            series['buckets'][bisect_left(self.buckets, value)] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the block"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def series(self) -> dict:
+        """label values (a tuple, or the value for a single label) -> copy of {'count', 'sum', 'buckets'}"""
+        with self._lock:
+            return {key[0] if len(key) == 1 else key: {**series, 'buckets': list(series['buckets'])}
+                    for key, series in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, {**series, 'buckets': list(series['buckets'])}) for key, series in self._values.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), series['buckets']):
+                cumulative += n
+                yield '_bucket', self._labels_text(key, (('le', _format(bound)),)), cumulative
+            yield '_sum', self._labels_text(key), series['sum']
+            yield '_count', self._labels_text(key), series['count']
+
+
+class MetricsRegistry:
+    """The metrics of one process, by name. Asking again for a metric returns the one already registered."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, cls, name: str, documentation: str, labelnames: tuple, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind} with labels {metric.labelnames}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> _Metric|None:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+    def clear(self):
+        """Reset every series (the metrics stay registered)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+_metrics_registry = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    """The process-wide metrics registry"""
+    return _metrics_registry
+
+
+def write_metrics_file(filepath: str) -> str:
+    """
+    Write the current metrics to filepath (via a temporary file and a rename, so a collector never reads half a file).
+    :return: filepath
+    """
+    folder = os.path.dirname(filepath)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = f'{filepath}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(get_metrics().render())
+    os.replace(tmp_path, filepath)
+    logger.info(f"Metrics written to {filepath}")
+    return filepath
+
+
+def read_metrics_file(filepath: str) -> str|None:
+    """The metrics last written by write_metrics_file to filepath (None if there is no such file)"""
+    try:
+        with open(filepath, encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
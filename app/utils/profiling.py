@@ -0,0 +1,203 @@
+# app/utils/profiling.py
+# Whole-run profiling of the CLI loaders (flask <command> --profile, or FLOODWATCH_PROFILE=1):
+#  - cProfile of the main thread and of every thread started during the run (thread pools included)
+#  - wall and cpu time, peak RSS and, optionally, the top allocation sites (tracemalloc - slows the run)
+# written to a timestamped directory, with a short top-N summary logged at the end.
+# Worker processes (TransformPool) are not profiled - their cpu time is in the run's child cpu time.
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource          # POSIX only
+except ImportError:
+    resource = None
+
+import logging
+logger = logging.getLogger('floodWatch3')
+
+# Highest peak RSS (MB) seen before a reset_peak_rss() - the kernel's own high-water mark restarts on a reset
+_peak_before_reset = 0.0
+
+
+def current_rss_mb() -> float|None:
+    """Resident set size of this process now (Linux), in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb(children: bool = False) -> float|None:
+    """Peak resident set size of this process (or of its largest finished child process), in MB"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    peak = round(usage.ru_maxrss / 1024, 1)   # kB on Linux
+    return peak if children else max(peak, _peak_before_reset)
+
+
+def reset_peak_rss() -> bool:
+    """Restart the peak RSS high-water mark from the current RSS (Linux only) - so peaks can be taken per step"""
+    global _peak_before_reset
+    _peak_before_reset = max(_peak_before_reset, peak_rss_since_reset_mb() or 0.0)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_since_reset_mb() -> float|None:
+    """VmHWM - the peak RSS since the last reset_peak_rss() (or since the start), in MB (Linux)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return peak_rss_mb()
+
+
+def _cpu_times() -> dict:
+    if resource is None:
+        return {}
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {'user_s': own.ru_utime, 'system_s': own.ru_stime,
+            'children_user_s': children.ru_utime, 'children_system_s': children.ru_stime}
+
+
+class RunProfiler:
+    """Profile everything between start() and stop() - see profile_run()"""
+    def __init__(self, name: str, output_root: str = 'profiles', top: int = 20, trace_memory: bool = False):
+        """
+        :param name: run name (the command) - part of the output directory name
+        :param output_root: the run's directory is created under here, as YYYYmmdd-HHMMSS-<name>
+        :param top: functions listed in the summary
+        :param trace_memory: also trace python allocations (tracemalloc) - slower, but shows where memory goes
+        """
+        self.name = name
+        self.top = top
+        self.trace_memory = trace_memory
+        self.folder = os.path.join(output_root, f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}")
+        self._lock = threading.Lock()
+        self._main = cProfile.Profile()
+        self._threads: list[tuple[str, cProfile.Profile]] = []
+
+    def _start_thread(self, frame, event, arg):
+        # installed by threading.setprofile - runs once at the start of each new thread and replaces itself
+        # with a profiler of that thread
+        profile = cProfile.Profile()
+        with self._lock:
+            self._threads.append((threading.current_thread().name, profile))
+        profile.enable()
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+        if self.trace_memory:
+            tracemalloc.start(10)
+        self._t0 = time.perf_counter()
+        self._cpu0 = _cpu_times()
+        threading.setprofile(self._start_thread)
+        self._main.enable()
+        logger.info(f"Profiling {self.name} into {self.folder}")
+
+    def stop(self) -> dict:
+        """Stop profiling, write the profile files and log the summary. :return: the run summary"""
+        self._main.disable()
+        threading.setprofile(None)
+        wall = time.perf_counter() - self._t0
+        cpu1 = _cpu_times()
+
+        stats = pstats.Stats(self._main)
+        threads = [{'thread': 'MainThread', 'seconds': round(stats.total_tt, 2), 'calls': stats.total_calls}]
+        with self._lock:
+            thread_profiles = list(self._threads)
+        for thread_name, profile in thread_profiles:
+            thread_stats = pstats.Stats(profile)   # a finished thread's profiler just stops collecting
+            threads.append({'thread': thread_name, 'seconds': round(thread_stats.total_tt, 2),
+                            'calls': thread_stats.total_calls})
+            stats.add(thread_stats)
+        threads.sort(key=lambda t: t['seconds'], reverse=True)
+        stats.dump_stats(os.path.join(self.folder, 'profile.prof'))   # all threads (snakeviz, pstats, ...)
+
+        summary = {
+            'name': self.name,
+            'wall_s': round(wall, 2),
+            **{k: round(cpu1[k] - self._cpu0.get(k, 0), 2) for k in cpu1},
+            'peak_rss_mb': peak_rss_mb(),
+            'children_peak_rss_mb': peak_rss_mb(children=True),
+            'threads': len(threads),
+        }
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            summary['traced_peak_mb'] = round(traced_peak / 2**20, 1)
+            summary['allocations'] = [{'where': str(stat.traceback[0]), 'mb': round(stat.size / 2**20, 2),
+                                       'count': stat.count}
+                                      for stat in snapshot.statistics('lineno')[:self.top]]
+
+        with open(os.path.join(self.folder, 'run.json'), 'w') as f:
+            json.dump({**summary, 'per_thread': threads}, f, indent=2)
+        with open(os.path.join(self.folder, 'summary.txt'), 'w') as f:
+            f.write(self._report(stats, summary, threads, self.top))
+
+        logger.info(f"Profile of {self.name}: {summary['wall_s']}s wall, {summary.get('user_s')}s user cpu, "
+                    f"peak RSS {summary['peak_rss_mb']} MB, {summary['threads']} threads - {self.folder}")
+        logger.info(f"Top {min(self.top, 10)} functions by own time:\n"
+                    f"{self._top_functions(stats, 'tottime', min(self.top, 10))}")
+        return summary
+
+    @staticmethod
+    def _top_functions(stats: pstats.Stats, sort: str, top: int) -> str:
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats(sort).print_stats(top)
+        # keep just the table (pstats prints a header of totals and the ordering first)
+        lines = out.getvalue().splitlines()
+        start = next((i for i, line in enumerate(lines) if line.lstrip().startswith('ncalls')), 0)
+        return '\n'.join(line for line in lines[start:] if line.strip())
+
+    def _report(self, stats: pstats.Stats, summary: dict, threads: list[dict], top: int) -> str:
+        lines = [f'{key}: {value}' for key, value in summary.items() if key != 'allocations']
+        lines += ['', f'Threads (top {top} by profiled time):']
+        lines += [f"  {t['seconds']:>10.2f}s {t['calls']:>12} calls  {t['thread']}" for t in threads[:top]]
+        if 'allocations' in summary:
+            lines += ['', 'Allocations (live at the end, by line):']
+            lines += [f"  {a['mb']:>10.2f} MB {a['count']:>10}  {a['where']}" for a in summary['allocations']]
+        lines += ['', 'By own time:', self._top_functions(stats, 'tottime', top)]
+        lines += ['', 'By cumulative time:', self._top_functions(stats, 'cumulative', top)]
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def profile_run(name: str, enabled: bool = True, **kwargs):
+    """
+    Profile the block (see RunProfiler for the arguments) - yields the RunProfiler, or None when not enabled,
+    so it can wrap a command unconditionally
+    """
+    if not enabled:
+        yield None
+        return
+    profiler = RunProfiler(name, **kwargs)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        try:
+            profiler.stop()
+        except Exception as e:
+            logger.exception(f"Profile of {name} not written: {e}")
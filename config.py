@@ -15,6 +15,33 @@ class Config:
         "pool_recycle": 1800,      # Avoid stale connections (optional)
     }
 
+    # Readings ingest: total concurrent db connections across all day workers and their chunk threads
+    # (capped to pool_size + max_overflow - INGEST_DB_RESERVE, see app/utils/db_budget.py)
+    INGEST_DB_CONCURRENCY = 32
+    INGEST_DB_RESERVE = 8          # connections kept back for the web app / other sessions
+
+    # Days before the last reading re-fetched by get-hydrology-readings-data-latest - these stay uncompressed:
+    # the compression policy only compresses chunks older than COMPRESS_AFTER_DAYS (see readings_compression.py)
+    INGEST_REFRESH_DAYS = 14
+    COMPRESS_AFTER_DAYS = 21
+
+    # Copy each loaded day into the compact readings layout (hyd_reading_measure + hyd_reading_fact).
+    # A shadow copy: loads still write hyd_reading_ht in full, so this adds the compact layout's storage
+    # (it saves space only once readers use hyd_reading_v and hyd_reading_ht is retired)
+    READINGS_COMPACT_SYNC = False
+
+    # Ingest metrics (Prometheus text format) written here at the end of each readings loader run,
+    # e.g. into the node_exporter textfile collector directory. The web app serves its own on /metrics and the
+    # latest of this file on /metrics/ingest (use an absolute path - the CLI and the web app may run from elsewhere)
+    METRICS_FILE = os.environ.get('FLOODWATCH_METRICS_FILE')
+
+    # Profile the CLI loaders without --profile on the command line (see app/utils/profiling.py):
+    # FLOODWATCH_PROFILE=1 (or =memory to also trace allocations); each run gets a timestamped directory here
+    PROFILE_LOADERS = os.environ.get('FLOODWATCH_PROFILE', '').lower() not in ('', '0', 'false', 'no')
+    PROFILE_MEMORY = os.environ.get('FLOODWATCH_PROFILE', '').lower() == 'memory'
+    PROFILE_DIR = os.environ.get('FLOODWATCH_PROFILE_DIR', os.path.join(basedir, 'profiles'))
+    PROFILE_TOP = 20
+
 class DevelopmentConfig(Config):
     DEBUG = True
     #DEBUG = False
@@ -0,0 +1,43 @@
+# tests/test_readings_transform.py
+# Parity of the column-wise readings transform with the original per-row code, on a small archived day file
+# (the same comparison as flask check-hydrology-transform, without a database or an archive)
+
+import os
+
+import pytest
+
+from app.floodreadings.services.readings_archive import read_csv_day
+from app.floodreadings.services.readings_transform import (check_transform_parity, transform_readings_chunk,
+                                                           transform_readings_rowwise, readings_to_records)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'hydro-2024-01-01.csv')
+
+STN_LABELS = {
+    'E01591A': 'River Test at Broadlands',
+    'ac462a74-4fe2-41d7-a35b-e51ffd6c9a0f': 'Kingston',
+}
+
+
+@pytest.fixture
+def day_df():
+    return read_csv_day(FIXTURE)
+
+
+@pytest.mark.parametrize('stn_labels', [None, STN_LABELS])
+def test_transform_matches_rowwise(day_df, stn_labels):
+    result = check_transform_parity(day_df, stn_labels=stn_labels, ea_datasource='hydro-2024-01-01')
+    assert result['rows'] == len(day_df)
+    assert result['mismatched_rows'] == 0, result['examples']
+    assert result['status_match']
+
+
+def test_transform_values(day_df):
+    frame, status = transform_readings_chunk(day_df, stn_labels=STN_LABELS, ea_datasource='hydro-2024-01-01')
+    records = readings_to_records(frame)
+    expected, expected_status = transform_readings_rowwise(day_df, stn_labels=STN_LABELS,
+                                                           ea_datasource='hydro-2024-01-01')
+    assert status == expected_status
+    assert [r['label'] for r in records] == [r['label'] for r in expected]
+    assert [r['period'] for r in records] == [900, 900, 900, 0, 900, 900, 0, 21600, 21600, 86400]
+    assert records[4]['value'] == pytest.approx(1.236)      # 'a|b' pair - the last part
+    assert records[2]['value'] is None and records[3]['value'] is None